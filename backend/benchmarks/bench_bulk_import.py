@@ -0,0 +1,67 @@
+# Import N ogłoszeń z 2 kategoriami każde: POST /ads + 2x POST /ad_categories na ogłoszenie
+# vs jedno POST /ads/bulk (JSON) vs POST /ads/bulk w trybie NDJSON.
+# Uruchomienie (z katalogu backend):  python benchmarks/bench_bulk_import.py --ads 2000
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp.name, 'bench.db')}"
+# jeden klient z jednego adresu - limity zapytań zafałszowałyby pomiar
+os.environ.setdefault("RATE_LIMIT_BACKEND", "none")
+
+from fastapi.testclient import TestClient
+import main
+
+
+def ad_payload(i):
+    return {"ad_title": f"Ogłoszenie {i}", "bp_id": 1, "description": "opis", "images": [], "price": "10",
+            "address": "Kraków", "post_date": "2024-01-01", "due_date": "2024-02-01"}
+
+
+def per_item(client, count):
+    for i in range(count):
+        ad = client.post("/ads", json=ad_payload(i)).json()
+        for category_id in (1, 2):
+            client.post("/ad_categories", json={"ad_id": ad["ad_id"], "category_id": category_id})
+
+
+def bulk_json(client, count):
+    response = client.post("/ads/bulk", json=[{**ad_payload(i), "category_ids": [1, 2]} for i in range(count)])
+    assert response.json()["created"] == count
+
+
+def bulk_ndjson(client, count):
+    body = b"\n".join(json.dumps({**ad_payload(i), "category_ids": [1, 2]}).encode() for i in range(count))
+    response = client.post("/ads/bulk", content=body, headers={"Content-Type": "application/x-ndjson"})
+    assert response.headers["X-Bulk-Created"] == str(count)
+
+
+def run_benchmark():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ads", type=int, default=2000)
+    args = parser.parse_args()
+
+    with TestClient(main.app) as client:
+        client.post("/register", json={"email": "bench@example.com", "first_name": "a", "last_name": "b",
+                                       "password": "bench"})
+        client.post("/businesses", json={"user_id": 1, "bp_name": "Firma", "address": "Kraków", "phone": "1"})
+        client.post("/categories", json={"category_name": "A"})
+        client.post("/categories", json={"category_name": "B"})
+
+        timings = {}
+        for name, func in (("per item", per_item), ("bulk JSON", bulk_json), ("bulk NDJSON", bulk_ndjson)):
+            start = time.perf_counter()
+            func(client, args.ads)
+            timings[name] = time.perf_counter() - start
+
+    for name, seconds in timings.items():
+        print(f"{name:12s} {seconds * 1000:9.0f} ms  {args.ads / seconds:8.0f} ads/s")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,98 @@
+# Usuwanie dużego konta: dawne pętle ORM vs kaskada zbiorczymi DELETE.
+# Uruchomienie (z katalogu backend):  python benchmarks/bench_cascade.py --ads 1000 5000
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+from sqlmodel import SQLModel, Session, create_engine, select
+from database.models import User, BusinessProfile, Ad, AdCategory, Reviews
+from database import cascade, search as ad_search
+from database.ratings import rebuild_ratings
+
+
+def fill(engine, ads, businesses, reviews_per_ad):
+    now = datetime.utcnow()
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO user (user_id, first_name, last_name, email, hashed_password, role, created_at) "
+            "VALUES (1, 'a', 'b', 'bench@example.com', 'x', 'business_owner', ?)", (now,))
+        conn.exec_driver_sql("INSERT INTO categories (category_id, category_name, created_at) VALUES (1, 'a', ?), (2, 'b', ?)",
+                             (now, now))
+        conn.exec_driver_sql(
+            "INSERT INTO businessprofile (bp_id, user_id, bp_name, address, phone, created_at) VALUES (?, 1, 'bp', 'x', '0', ?)",
+            [(bp_id, now) for bp_id in range(1, businesses + 1)])
+        conn.exec_driver_sql(
+            "INSERT INTO ad (ad_id, ad_title, bp_id, description, images, price, address, post_date, due_date, status, "
+            "created_at) VALUES (?, 'ad', ?, 'd', '[]', '1', 'x', '2024-01-01', '2024-12-31', 1, ?)",
+            [(ad_id, ad_id % businesses + 1, now) for ad_id in range(1, ads + 1)])
+        conn.exec_driver_sql(
+            "INSERT INTO adcategory (ad_id, category_id, created_at) VALUES (?, ?, ?)",
+            [(ad_id, category_id, now) for ad_id in range(1, ads + 1) for category_id in (1, 2)])
+        conn.exec_driver_sql(
+            "INSERT INTO reviews (ad_id, title, description, rating) VALUES (?, 't', 'd', 4)",
+            [(ad_id,) for ad_id in range(1, ads + 1) for _ in range(reviews_per_ad)])
+    ad_search.create_search_index(engine)
+    with Session(engine) as session:
+        rebuild_ratings(session)
+
+
+def legacy_delete_user(session, user_id):
+    # the per-row loops main.py used before the set-based cascade
+    db_user = session.get(User, user_id)
+    bps = session.exec(select(BusinessProfile).where(BusinessProfile.user_id == user_id)).all()
+    for bp in bps:
+        ads = session.exec(select(Ad).where(Ad.bp_id == bp.bp_id)).all()
+        for ad in ads:
+            for ad_category in session.exec(select(AdCategory).where(AdCategory.ad_id == ad.ad_id)).all():
+                session.delete(ad_category)
+            for ad_review in session.exec(select(Reviews).where(Reviews.ad_id == ad.ad_id)).all():
+                session.delete(ad_review)
+            session.delete(ad)
+        session.delete(bp)
+    session.delete(db_user)
+    session.commit()
+
+
+def bulk_delete_user(session, user_id):
+    cascade.delete_user(session, user_id)
+    session.commit()
+
+
+def measure(delete, ads, businesses, reviews_per_ad):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        fill(engine, ads, businesses, reviews_per_ad)
+        statements = []
+        event.listen(engine, "before_cursor_execute", lambda *args: statements.append(1))
+        with Session(engine) as session:
+            start = time.perf_counter()
+            delete(session, 1)
+            elapsed = time.perf_counter() - start
+            assert session.exec(select(Ad)).first() is None
+        engine.dispose()
+        return len(statements), elapsed * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ads", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--businesses", type=int, default=10)
+    parser.add_argument("--reviews-per-ad", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'ads':>7} {'mode':<8} {'statements':>11} {'ms':>10}")
+    for ads in args.ads:
+        for name, delete in (("legacy", legacy_delete_user), ("bulk", bulk_delete_user)):
+            count, ms = measure(delete, ads, args.businesses, args.reviews_per_ad)
+            print(f"{ads:>7} {name:<8} {count:>11} {ms:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# GET /ads?lat=&lon=&radius_km= na N ogłoszeniach rozrzuconych po Polsce:
+# R*Tree (ad_geo) vs indeks (lat, lon) vs pełny skan bez indeksów.
+# Uruchomienie (z katalogu backend):  python benchmarks/bench_geo.py --ads 200000
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp.name, 'bench.db')}"
+# jeden klient z jednego adresu - limity zapytań zafałszowałyby pomiar
+os.environ.setdefault("RATE_LIMIT_BACKEND", "none")
+
+from fastapi.testclient import TestClient
+from sqlalchemy import insert, text
+import main
+from database import geo
+from database.models import Ad
+
+QUERIES = [(50.06, 19.94, 5), (52.23, 21.01, 10), (51.11, 17.03, 25)]
+
+
+def seed(count):
+    random.seed(1)
+    rows = [
+        {"ad_title": f"Ogłoszenie {i}", "bp_id": 1, "images": [], "price": "10", "address": "-",
+         "post_date": "2024-01-01", "due_date": "2024-02-01", "status": True,
+         "lat": random.uniform(49.0, 54.8), "lon": random.uniform(14.1, 24.1)}
+        for i in range(count)
+    ]
+    with main.engine.begin() as conn:
+        conn.execute(insert(Ad), rows)
+    geo.rebuild_geo_index(main.engine)
+
+
+def measure(client, repeats=20):
+    start = time.perf_counter()
+    found = 0
+    for _ in range(repeats):
+        for lat, lon, radius in QUERIES:
+            found = len(client.get(f"/ads?lat={lat}&lon={lon}&radius_km={radius}&limit=1000&fields=ad_id,lat,lon").json())
+    return (time.perf_counter() - start) / (repeats * len(QUERIES)), found
+
+
+def run_benchmark():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ads", type=int, default=200000)
+    args = parser.parse_args()
+
+    with TestClient(main.app) as client:
+        client.post("/register", json={"email": "bench@example.com", "first_name": "a", "last_name": "b",
+                                       "password": "bench"})
+        client.post("/businesses", json={"user_id": 1, "bp_name": "Firma", "address": "Kraków", "phone": "1"})
+        seed(args.ads)
+
+        timings = {"R*Tree": measure(client)}
+        geo.rtree_enabled = False
+        timings["indeks (lat, lon)"] = measure(client)
+        with main.engine.begin() as conn:
+            conn.execute(text("DROP INDEX ix_ad_lat_lon"))
+        timings["pełny skan"] = measure(client)
+
+    for name, (seconds, found) in timings.items():
+        print(f"{name:18s} {seconds * 1000:8.2f} ms/zapytanie  (ostatnie: {found} wyników)")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,52 @@
+# Przepustowość GET /me z pamięcią podręczną użytkowników i bez niej.
+# Uruchomienie (z katalogu backend):  python benchmarks/bench_me.py --requests 2000
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp.name, 'bench.db')}"
+# jeden klient z jednego adresu - limity zapytań zafałszowałyby pomiar
+os.environ.setdefault("RATE_LIMIT_BACKEND", "none")
+
+from fastapi.testclient import TestClient
+import main
+import security
+
+
+def run(client, headers, requests):
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = client.get("/me", headers=headers)
+        assert response.status_code == 200
+    return requests / (time.perf_counter() - start)
+
+
+def run_benchmark():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    with TestClient(main.app) as client:
+        client.post("/register", json={"email": "bench@example.com", "first_name": "a", "last_name": "b",
+                                       "password": "bench"})
+        token = client.post("/login", json={"email": "bench@example.com", "password": "bench"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        size = security.user_cache.maxsize
+        security.user_cache.maxsize = 0
+        security.user_cache.clear()
+        uncached = run(client, headers, args.requests)
+
+        security.user_cache.maxsize = size
+        cached = run(client, headers, args.requests)
+
+    print(f"/me without cache: {uncached:8.0f} req/s")
+    print(f"/me with cache:    {cached:8.0f} req/s")
+
+
+if __name__ == "__main__":
+    run_benchmark()
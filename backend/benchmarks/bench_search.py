@@ -0,0 +1,107 @@
+# Porównanie wyszukiwania ogłoszeń: ILIKE '%term%' vs indeks FTS5.
+# Uruchomienie (z katalogu backend):  python benchmarks/bench_search.py --sizes 10000 100000 1000000
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import or_
+from sqlmodel import SQLModel, Session, create_engine, select, col
+from database.models import Ad
+from database import search as ad_search
+
+WORDS = [
+    "kwiaty", "naprawa", "rowerów", "fryzjer", "łódź", "kraków", "dostawa", "tort", "pizza",
+    "malowanie", "mieszkań", "księgowość", "hydraulik", "elektryk", "ogród", "sprzątanie",
+    "korepetycje", "matematyka", "mechanik", "samochodów", "zdjęcia", "ślub", "wesele", "catering",
+]
+QUERIES = ["kwiaty", "napr", "łódź", "ślub wesele", "hydraulik kraków"]
+
+
+def vocabulary(rnd, size=20000):
+    letters = "abcdefghijklmnoprstuwyząćęłńóśźż"
+    return ["".join(rnd.choices(letters, k=rnd.randint(4, 10))) for _ in range(size)]
+
+
+def sentence(rnd, filler, length):
+    # słowa z WORDS pojawiają się rzadko, żeby zapytania były selektywne
+    return " ".join(rnd.choice(WORDS) if rnd.random() < 0.02 else rnd.choice(filler) for _ in range(length))
+
+
+def fill(engine, size):
+    rnd = random.Random(size)
+    filler = vocabulary(rnd)
+    now = datetime.utcnow()
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO user (user_id, first_name, last_name, email, hashed_password, role, created_at) "
+            "VALUES (1, 'a', 'b', 'bench@example.com', 'x', 'business_owner', ?)", (now,))
+        conn.exec_driver_sql(
+            "INSERT INTO businessprofile (bp_id, user_id, bp_name, address, phone, created_at) "
+            "VALUES (1, 1, 'bench', 'x', '0', ?)", (now,))
+        batch = []
+        for i in range(size):
+            title = sentence(rnd, filler, 4)
+            description = sentence(rnd, filler, 30)
+            batch.append((title, description, "[]", "100", "x", "2024-01-01", "2024-12-31", 1, now))
+            if len(batch) == 10000:
+                _insert(conn, batch)
+                batch = []
+        if batch:
+            _insert(conn, batch)
+
+
+def _insert(conn, batch):
+    conn.exec_driver_sql(
+        "INSERT INTO ad (ad_title, bp_id, description, images, price, address, post_date, due_date, "
+        "status, created_at) VALUES (?, 1, ?, ?, ?, ?, ?, ?, ?, ?)", batch)
+
+
+def ilike_query(term):
+    pattern = f"%{term}%"
+    return select(Ad.ad_id).where(or_(col(Ad.ad_title).ilike(pattern), col(Ad.description).ilike(pattern)))
+
+
+def fts_query(term):
+    matches = ad_search.search_subquery(term)
+    return (select(Ad.ad_id).join(matches, col(Ad.ad_id) == matches.c.ad_id)
+            .order_by(matches.c.rank, col(Ad.ad_id)))
+
+
+def timed(session, statement, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        session.exec(statement).all()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'ads':>9} {'query':<18} {'ilike ms':>10} {'fts ms':>10}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+            fill(engine, size)
+            ad_search.create_search_index(engine)
+            with Session(engine) as session:
+                for term in QUERIES:
+                    ilike_ms = timed(session, ilike_query(term), args.repeat)
+                    fts_ms = timed(session, fts_query(term), args.repeat)
+                    print(f"{size:>9} {term:<18} {ilike_ms:>10.2f} {fts_ms:>10.2f}")
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# Serializacja listy 10k ogłoszeń: obiekty ORM + jsonable_encoder (poprzednia ścieżka)
+# vs wiersze z kursora kodowane od razu do JSON (serialization.encode_rows).
+# Uruchomienie (z katalogu backend):  python benchmarks/bench_serialization.py --rows 10000
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp.name, 'bench.db')}"
+# jeden klient z jednego adresu - limity zapytań zafałszowałyby pomiar
+os.environ.setdefault("RATE_LIMIT_BACKEND", "none")
+os.environ.setdefault("PAGE_SIZE_MAX", "100000")
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+import main
+import serialization
+from database.database import engine
+from database.models import User, BusinessProfile, Ad
+
+
+def seed(rows):
+    with Session(engine) as session:
+        session.add(User(first_name="a", last_name="b", email="bench@example.com", hashed_password="x",
+                         role="business_owner"))
+        session.add(BusinessProfile(user_id=1, bp_name="Firma", address="Kraków", phone="1"))
+        session.commit()
+        session.bulk_insert_mappings(Ad, [
+            {"ad_title": f"Ogłoszenie {i}", "bp_id": 1, "description": "opis " * 20,
+             "images": [f"https://example.com/{i}.jpg"], "price": "10", "address": "Kraków",
+             "post_date": "2024-01-01", "due_date": "2024-02-01", "status": True, "created_at": datetime.utcnow()}
+            for i in range(rows)
+        ])
+        session.commit()
+
+
+def best_of(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000)
+    return min(times)
+
+
+def run_benchmark():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with TestClient(main.app) as client:
+        seed(args.rows)
+        columns = list(Ad.__table__.columns)
+        names = [c.name for c in columns]
+
+        def orm_path():
+            with Session(engine) as session:
+                ads = session.exec(select(Ad)).all()
+                return json.dumps(jsonable_encoder(ads)).encode()
+
+        def rows_path():
+            with Session(engine) as session:
+                return serialization.encode_rows(session.execute(select(*columns)).all(), names)
+
+        def endpoint():
+            response = client.get(f"/ads?limit={args.rows}")
+            assert response.status_code == 200 and len(response.json()) == args.rows
+
+        orm = best_of(orm_path, args.repeat)
+        rows = best_of(rows_path, args.repeat)
+        http = best_of(endpoint, args.repeat)
+
+    encoder = "orjson" if serialization.orjson is not None else "json (orjson not installed)"
+    print(f"{args.rows} ads, encoder: {encoder}")
+    print(f"ORM objects + jsonable_encoder: {orm:8.1f} ms")
+    print(f"rows + encode_rows:             {rows:8.1f} ms")
+    print(f"GET /ads?limit={args.rows} end to end: {http:8.1f} ms")
+
+
+if __name__ == "__main__":
+    run_benchmark()
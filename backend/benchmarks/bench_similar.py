@@ -0,0 +1,64 @@
+# GET /ads/{ad_id}/similar na N syntetycznych ogłoszeniach (seed.py): opóźnienia
+# p50/p95/p99 bez cache odpowiedzi i czas pełnego przeliczenia indeksu (rebuild_similar).
+# Uruchomienie (z katalogu backend):  python benchmarks/bench_similar.py --ads 100000
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp.name, 'bench.db')}"
+os.environ["RESPONSE_CACHE_BACKEND"] = "none"
+os.environ.setdefault("RATE_LIMIT_BACKEND", "none")
+os.environ.setdefault("AD_EXPIRY_INTERVAL_SECONDS", "0")
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+import main
+import seed
+from database import similar
+from database.models import Ad
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run_benchmark():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ads", type=int, default=100000)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=6)
+    args = parser.parse_args()
+
+    with TestClient(main.app) as client:
+        start = time.perf_counter()
+        with Session(main.engine) as session:
+            seed.seed(session, users=max(args.ads // 50, 10), businesses=max(args.ads // 20, 10), ads=args.ads,
+                      reviews=0)
+        print(f"seed: {args.ads} ogłoszeń w {time.perf_counter() - start:.1f} s")
+
+        start = time.perf_counter()
+        with Session(main.engine) as session:
+            similar.rebuild_similar(session)
+            visible = session.exec(select(Ad.ad_id).where(Ad.status == True, Ad.expired_at == None)).all()
+        print(f"rebuild_similar: {time.perf_counter() - start:.1f} s")
+
+        random.seed(1)
+        timings, found = [], 0
+        for ad_id in random.choices(visible, k=args.requests):
+            start = time.perf_counter()
+            response = client.get(f"/ads/{ad_id}/similar?limit={args.limit}")
+            timings.append((time.perf_counter() - start) * 1000)
+            found += len(response.json())
+
+    timings.sort()
+    print(f"/ads/{{ad_id}}/similar: p50 {percentile(timings, 0.5):.2f} ms, p95 {percentile(timings, 0.95):.2f} ms, "
+          f"p99 {percentile(timings, 0.99):.2f} ms  (średnio {found / len(timings):.1f} wyników)")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,174 @@
+# Wiele równoczesnych klientów na endpointach odczytu: dawna ścieżka (sync Session -
+# w wątku z puli albo blokująco w pętli zdarzeń) vs AsyncSession. Startuje lokalny serwer
+# uvicorn na tymczasowej bazie, bez cache odpowiedzi i użytkowników, więc każde żądanie idzie do bazy.
+# Uruchomienie (z katalogu backend):  python benchmarks/load_concurrency.py --clients 500 --seconds 10
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (nazwa, dawny endpoint, obecny endpoint)
+SCENARIOS = [
+    ("GET /me", "/bench/before/me", "/me"),
+    ("GET /ads?limit=20", "/bench/before/ads?limit=20", "/ads?limit=20"),
+    ("GET /ads/{id}", "/bench/before/ads/{id}", "/ads/{id}"),
+]
+
+
+def serve(port, ads):
+    # proces serwera: aplikacja z main plus kopie endpointów sprzed przejścia na AsyncSession
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(BACKEND_DIR)
+    import uvicorn
+    from fastapi import Depends, HTTPException, Response
+    from sqlalchemy import insert
+    from sqlmodel import Session, select
+    import main
+    import security
+    from database.database import get_session
+    from database.models import Ad, User
+    from pagination import PageParams, page_params, paginate
+
+    async def blocking_current_user(claims: security.TokenClaims = Depends(security.get_token_claims),
+                                    session: Session = Depends(get_session)):
+        # tak wyglądało get_current_user: async, ale session.get blokuje pętlę zdarzeń
+        user = session.get(User, claims.user_id)
+        if user is None:
+            raise HTTPException(status_code=401)
+        return user
+
+    @main.app.get("/bench/before/me")
+    async def before_me(user: User = Depends(blocking_current_user)):
+        return main.UserRead.model_validate(user)
+
+    @main.app.get("/bench/before/ads")
+    def before_ads(response: Response, page: PageParams = Depends(page_params),
+                   session: Session = Depends(get_session)):
+        return paginate(session, select(Ad), Ad, page, response, sort_options=main.AD_SORT_OPTIONS,
+                        default_sort="created_at", transform=main.ad_list_item, schema=main.AdRead)
+
+    @main.app.get("/bench/before/ads/{ad_id}")
+    def before_ad(ad_id: int, session: Session = Depends(get_session)):
+        ad = session.get(Ad, ad_id)
+        if not ad:
+            raise HTTPException(status_code=404)
+        return main.ad_list_item(main.AdRead.model_validate(ad).model_dump())
+
+    main.create_db_and_tables()
+    with Session(main.engine) as session:
+        if session.exec(select(Ad)).first() is None:
+            rows = [
+                {"ad_title": f"Ogłoszenie {i}", "bp_id": 1, "images": [], "price": f"{i % 500} zł",
+                 "address": "Kraków", "post_date": "2024-01-01", "due_date": "2099-01-01", "status": True}
+                for i in range(ads)
+            ]
+            session.execute(insert(Ad), rows)
+            session.commit()
+    uvicorn.run(main.app, port=port, log_level="warning")
+
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+async def wait_for(client, url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            await client.get(url)
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+async def load(client, path, clients, seconds, headers, ads):
+    latencies = []
+    errors = 0
+    stop = time.perf_counter() + seconds
+
+    async def worker(n):
+        nonlocal errors
+        i = n
+        while time.perf_counter() < stop:
+            i += clients
+            start = time.perf_counter()
+            try:
+                response = await client.get(path.format(id=i % ads + 1), headers=headers)
+                ok = response.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append((time.perf_counter() - start) * 1000)
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(clients)))
+    return len(latencies) / (time.perf_counter() - start), latencies, errors
+
+
+async def run(base, args):
+    limits = httpx.Limits(max_connections=args.clients, max_keepalive_connections=args.clients)
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=120) as client:
+        await wait_for(client, "/categories")
+        await client.post("/register", json={"email": "load@example.com", "first_name": "a", "last_name": "b",
+                                             "password": "load"})
+        await client.post("/businesses", json={"user_id": 1, "bp_name": "Firma", "address": "Kraków",
+                                               "phone": "1"})
+        token = (await client.post("/login", json={"email": "load@example.com", "password": "load"})).json()
+        headers = {"Authorization": f"Bearer {token['access_token']}"}
+
+        print(f"{args.clients} klientów, {args.seconds:g} s na pomiar, THREADPOOL_WORKERS={args.threadpool}")
+        for name, before, after in SCENARIOS:
+            for label, path in (("przed", before), ("po", after)):
+                await load(client, path, args.clients, 1, headers, args.ads)  # rozgrzewka
+                rate, latencies, errors = await load(client, path, args.clients, args.seconds, headers, args.ads)
+                print(f"{name:20} {label:5} {rate:8.0f} req/s   p50 {statistics.median(latencies):7.1f} ms   "
+                      f"p95 {percentile(latencies, 95):7.1f} ms   p99 {percentile(latencies, 99):7.1f} ms   "
+                      f"błędy {errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--ads", type=int, default=10000)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--threadpool", type=int, default=40)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.port, args.ads)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'load.db')}", LOG_LEVEL="WARNING",
+                   RESPONSE_CACHE_BACKEND="none", USER_CACHE_SIZE="0", METRICS_SLOW_REQUEST_MS="1e9",
+                   AD_EXPIRY_INTERVAL_SECONDS="0", RATE_LIMIT_BACKEND="none",
+                   THREADPOOL_WORKERS=str(args.threadpool))
+        server = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--serve", "--port", str(args.port), "--ads", str(args.ads)],
+            cwd=BACKEND_DIR, env=env,
+        )
+        try:
+            asyncio.run(run(f"http://127.0.0.1:{args.port}", args))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
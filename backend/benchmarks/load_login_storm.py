@@ -0,0 +1,104 @@
+# "Burza logowań": przepustowość /login i opóźnienia niezwiązanego endpointu (GET /categories)
+# w tym samym czasie. Startuje lokalny serwer uvicorn na tymczasowej bazie.
+# Uruchomienie (z katalogu backend):  python benchmarks/load_login_storm.py --clients 64 --seconds 10
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def request(url, payload=None):
+    data = json.dumps(payload).encode() if payload is not None else None
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=60) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def wait_for(url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            request(url)
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    base = f"http://127.0.0.1:{args.port}"
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'load.db')}", LOG_LEVEL="WARNING",
+                   RATE_LIMIT_BACKEND="none")
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--log-level", "warning"],
+            cwd=BACKEND_DIR, env=env,
+        )
+        try:
+            wait_for(base + "/categories")
+            request(base + "/register", {"email": "storm@example.com", "first_name": "a", "last_name": "b",
+                                         "password": "storm"})
+
+            stop = time.time() + args.seconds
+            statuses = []
+            probe_latencies = []
+            lock = threading.Lock()
+
+            def login_client():
+                while time.time() < stop:
+                    status = request(base + "/login", {"email": "storm@example.com", "password": "storm"})
+                    with lock:
+                        statuses.append(status)
+
+            def probe():
+                while time.time() < stop:
+                    start = time.perf_counter()
+                    request(base + "/categories")
+                    probe_latencies.append((time.perf_counter() - start) * 1000)
+                    time.sleep(0.02)
+
+            threads = [threading.Thread(target=login_client) for _ in range(args.clients)]
+            threads.append(threading.Thread(target=probe))
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            server.terminate()
+            server.wait()
+
+    ok = statuses.count(200)
+    rejected = sum(1 for status in statuses if status in (429, 503))
+    print(f"login: {ok / args.seconds:.1f} ok/s, {rejected} rejected (429/503), {len(statuses)} total")
+    print(f"GET /categories during storm: p50 {statistics.median(probe_latencies):.1f} ms, "
+          f"p99 {percentile(probe_latencies, 99):.1f} ms ({len(probe_latencies)} requests)")
+
+
+if __name__ == "__main__":
+    main()
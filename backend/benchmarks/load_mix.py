@@ -0,0 +1,318 @@
+# Ruch jak z frontendu na zasianej bazie (manage.py seed): strona główna z wyszukiwaniem,
+# strona ogłoszenia, profil firmy, logowanie i dodanie opinii, w proporcjach z PAGES.
+# Startuje lokalny serwer uvicorn; wynik to req/s i p50/p95/p99 dla każdej trasy.
+# --save zapisuje wynik jako baseline (JSON), --compare porównuje z zapisanym baseline
+# i kończy się kodem 1, jeśli któraś trasa jest wolniejsza o więcej niż --tolerance.
+# Uruchomienie (z katalogu backend):
+#   python benchmarks/load_mix.py --ads 200000 --clients 50 --seconds 30 --save benchmarks/baselines/moj.json
+#   python benchmarks/load_mix.py --ads 200000 --clients 50 --seconds 30 --compare benchmarks/baselines/moj.json
+# Duża baza raz zasiana i używana wielokrotnie:  --database /tmp/load.db (seed tylko gdy plik nie istnieje;
+# opinie z testu zostają w bazie)
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from bisect import bisect
+from datetime import datetime
+
+import httpx
+from sqlalchemy import create_engine, text
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SEARCH_TERMS = ["trawy", "malowanie", "okien", "korepetycje", "przeprowadzki", "tort", "opon", "laptop",
+                "psów", "miód", "masaż", "catering"]
+SEED_PASSWORD = "seed"  # seed.SEED_PASSWORD
+
+
+class Stats:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+        self.recording = False
+
+    def record(self, route: str, elapsed_ms: float, ok: bool):
+        if not self.recording:
+            return
+        if ok:
+            self.latencies.setdefault(route, []).append(elapsed_ms)
+        else:
+            self.errors[route] = self.errors.get(route, 0) + 1
+
+
+class VirtualUser:
+    def __init__(self, client: httpx.AsyncClient, data: dict, stats: Stats, rng: random.Random):
+        self.client = client
+        self.data = data
+        self.stats = stats
+        self.rng = rng
+
+    async def request(self, method: str, route: str, url: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            response, ok = None, False
+        self.stats.record(f"{method} {route}", (time.perf_counter() - start) * 1000, ok)
+        return response if ok else None
+
+    def popular_ad(self) -> tuple[int, int]:
+        # (ad_id, bp_id), popular ads much more often - like links shared around
+        ads, weights = self.data["ads"], self.data["ad_weights"]
+        return ads[bisect(weights, self.rng.random() * weights[-1])]
+
+    async def home_page(self):
+        # HomePage: kategorie, liczniki kategorii i feed (czasem z wyszukiwaniem albo kategorią)
+        params = {}
+        if self.rng.random() < 0.3:
+            params["search"] = self.rng.choice(SEARCH_TERMS)
+        await self.request("GET", "/categories", "/categories")
+        await self.request("GET", "/categories/facets", "/categories/facets", params=params)
+        if self.rng.random() < 0.3:
+            params["category_id"] = self.rng.choice(self.data["categories"])
+        await self.request("GET", "/feed", "/feed", params=params)
+
+    async def ad_page(self):
+        # AdPage: ogłoszenie, firma i opinie
+        ad_id, bp_id = self.popular_ad()
+        await self.request("GET", "/ads/{ad_id}", f"/ads/{ad_id}")
+        await self.request("GET", "/businesses/{bp_id}", f"/businesses/{bp_id}")
+        await self.request("GET", "/reviews/ad/{ad_id}", f"/reviews/ad/{ad_id}")
+
+    async def business_page(self):
+        # BusinessProfilePage: firma, właściciel i ogłoszenia firmy
+        _, bp_id = self.popular_ad()
+        business = await self.request("GET", "/businesses/{bp_id}", f"/businesses/{bp_id}")
+        if business is not None:
+            user_id = business.json()["user_id"]
+            await self.request("GET", "/users/{user_id}", f"/users/{user_id}")
+        await self.request("GET", "/businesses/{bp_id}/ads", f"/businesses/{bp_id}/ads")
+
+    async def login(self):
+        # LoginPage: logowanie i /me
+        email = f"user{self.rng.choice(self.data['users'])}@seed.example.com"
+        response = await self.request("POST", "/login", "/login", json={"email": email, "password": SEED_PASSWORD})
+        if response is not None:
+            token = response.json()["access_token"]
+            await self.request("GET", "/me", "/me", headers={"Authorization": f"Bearer {token}"})
+
+    async def post_review(self):
+        # AdPage: dodanie opinii i odświeżenie listy opinii
+        ad_id, _ = self.popular_ad()
+        await self.request("POST", "/reviews", "/reviews", json={
+            "ad_id": ad_id, "title": "Test obciążeniowy", "description": "Opinia z load_mix.py",
+            "rating": float(self.rng.randint(1, 5)),
+        })
+        await self.request("GET", "/reviews/ad/{ad_id}", f"/reviews/ad/{ad_id}")
+
+
+# (strona, waga)
+PAGES = [
+    (VirtualUser.home_page, 40),
+    (VirtualUser.ad_page, 30),
+    (VirtualUser.business_page, 15),
+    (VirtualUser.login, 10),
+    (VirtualUser.post_review, 5),
+]
+
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def load_ids(database_url: str, random_seed: int) -> dict:
+    # id-s used by the virtual users, read straight from the seeded database
+    engine = create_engine(database_url)
+    with engine.connect() as conn:
+        ads = conn.execute(text(
+            "SELECT ad_id, bp_id FROM ad WHERE status = 1 AND expired_at IS NULL ORDER BY ad_id"
+        )).tuples().all()
+        users = conn.execute(text(
+            "SELECT user_id FROM \"user\" WHERE email LIKE '%@seed.example.com'"
+        )).scalars().all()
+        categories = conn.execute(text("SELECT category_id FROM categories")).scalars().all()
+    engine.dispose()
+    if not ads or not users:
+        raise SystemExit("the database has no seeded ads/users - run manage.py seed first")
+    ads = list(ads)
+    random.Random(random_seed).shuffle(ads)
+    ad_weights = list(itertools.accumulate(1 / rank for rank in range(1, len(ads) + 1)))
+    return {"ads": ads, "ad_weights": ad_weights, "users": list(users), "categories": list(categories)}
+
+
+async def wait_for(client, url, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            await client.get(url)
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+async def run_load(base: str, data: dict, args) -> tuple[Stats, float]:
+    stats = Stats()
+    pages, weights = zip(*PAGES)
+    limits = httpx.Limits(max_connections=args.clients, max_keepalive_connections=args.clients)
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=120) as client:
+        await wait_for(client, "/categories")
+
+        async def virtual_user(n: int, stop: float):
+            rng = random.Random(args.random_seed * 1000 + n)
+            user = VirtualUser(client, data, stats, rng)
+            while time.perf_counter() < stop:
+                await rng.choices(pages, weights)[0](user)
+                if args.think_ms:
+                    await asyncio.sleep(rng.expovariate(1000 / args.think_ms))
+
+        start = time.perf_counter()
+        warmup_end = start + args.warmup
+        stop = warmup_end + args.seconds
+        users = [asyncio.create_task(virtual_user(n, stop)) for n in range(args.clients)]
+        await asyncio.sleep(max(0.0, warmup_end - time.perf_counter()))
+        stats.recording = True
+        measured_from = time.perf_counter()
+        await asyncio.gather(*users)
+        return stats, time.perf_counter() - measured_from
+
+
+def summarize(stats: Stats, elapsed: float) -> dict:
+    routes = {}
+    for route in sorted(stats.latencies.keys() | stats.errors.keys()):
+        latencies = stats.latencies.get(route, [])
+        routes[route] = {
+            "count": len(latencies),
+            "rps": round(len(latencies) / elapsed, 2),
+            "p50_ms": round(statistics.median(latencies), 2) if latencies else None,
+            "p95_ms": round(percentile(latencies, 95), 2) if latencies else None,
+            "p99_ms": round(percentile(latencies, 99), 2) if latencies else None,
+            "errors": stats.errors.get(route, 0),
+        }
+    every = [value for values in stats.latencies.values() for value in values]
+    total = {
+        "count": len(every),
+        "rps": round(len(every) / elapsed, 2),
+        "p50_ms": round(statistics.median(every), 2) if every else None,
+        "p95_ms": round(percentile(every, 95), 2) if every else None,
+        "p99_ms": round(percentile(every, 99), 2) if every else None,
+        "errors": sum(stats.errors.values()),
+    }
+    return {"routes": routes, "total": total}
+
+
+def print_table(summary: dict):
+    print(f"{'trasa':32} {'n':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'błędy':>6}")
+    for route, row in list(summary["routes"].items()) + [("RAZEM", summary["total"])]:
+        cells = [f"{row[key]:8.1f}" if row[key] is not None else f"{'-':>8}" for key in ("p50_ms", "p95_ms", "p99_ms")]
+        print(f"{route:32} {row['count']:7d} {row['rps']:8.1f} {' '.join(cells)} {row['errors']:6d}")
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(summary: dict, baseline: dict, tolerance: float) -> int:
+    # a route regressed when p95 grew or throughput dropped by more than tolerance
+    print(f"\nporównanie z baseline {baseline.get('commit') or '?'} z {baseline.get('created_at', '?')}:")
+    regressions = 0
+    for route, row in summary["routes"].items():
+        before = baseline["routes"].get(route)
+        if not before or not before["p95_ms"] or not row["p95_ms"]:
+            continue
+        p95_change = row["p95_ms"] / before["p95_ms"] - 1
+        rps_change = row["rps"] / before["rps"] - 1 if before["rps"] else 0.0
+        regressed = p95_change > tolerance or rps_change < -tolerance
+        regressions += regressed
+        print(f"{route:32} p95 {before['p95_ms']:8.1f} -> {row['p95_ms']:8.1f} ms ({p95_change:+.0%})   "
+              f"req/s {before['rps']:7.1f} -> {row['rps']:7.1f} ({rps_change:+.0%})"
+              f"{'   REGRESJA' if regressed else ''}")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--think-ms", type=float, default=0, help="średnia przerwa między stronami")
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--database", help="plik SQLite; zasiany, jeśli nie istnieje (domyślnie tymczasowy)")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--businesses", type=int, default=2000)
+    parser.add_argument("--ads", type=int, default=20000)
+    parser.add_argument("--reviews", type=int, default=50000)
+    parser.add_argument("--random-seed", type=int, default=1)
+    parser.add_argument("--no-cache", action="store_true", help="bez cache odpowiedzi (RESPONSE_CACHE_BACKEND=none)")
+    parser.add_argument("--save", help="zapisz wynik jako baseline JSON")
+    parser.add_argument("--compare", help="porównaj z baseline JSON")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.abspath(args.database) if args.database else os.path.join(tmp, "load.db")
+        database_url = f"sqlite:///{path}"
+        env = dict(os.environ, DATABASE_URL=database_url, LOG_LEVEL="WARNING", METRICS_SLOW_REQUEST_MS="1e9",
+                   AD_EXPIRY_INTERVAL_SECONDS="0", RATE_LIMIT_BACKEND="none")
+        if args.no_cache:
+            env["RESPONSE_CACHE_BACKEND"] = "none"
+
+        if not os.path.exists(path):
+            subprocess.run([sys.executable, "manage.py", "seed", "--users", str(args.users),
+                            "--businesses", str(args.businesses), "--ads", str(args.ads),
+                            "--reviews", str(args.reviews), "--random-seed", str(args.random_seed)],
+                           cwd=BACKEND_DIR, env=env, check=True, stdout=subprocess.DEVNULL)
+        data = load_ids(database_url, args.random_seed)
+
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--log-level", "warning"],
+            cwd=BACKEND_DIR, env=env,
+        )
+        try:
+            stats, elapsed = asyncio.run(run_load(f"http://127.0.0.1:{args.port}", data, args))
+        finally:
+            server.terminate()
+            server.wait()
+
+    summary = summarize(stats, elapsed)
+    print(f"{args.clients} klientów, {args.seconds:g} s, {len(data['ads'])} widocznych ogłoszeń")
+    print_table(summary)
+
+    result = {
+        "commit": git_commit(),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "params": {name: getattr(args, name) for name in ("clients", "seconds", "think_ms", "users", "businesses",
+                                                          "ads", "reviews", "random_seed", "no_cache")},
+        **summary,
+    }
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        print(f"\nzapisano {args.save}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("params") != result["params"]:
+            print(f"\nuwaga: inne parametry niż w baseline: {baseline.get('params')}")
+        return compare(summary, baseline, args.tolerance)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,243 @@
+import json
+import logging
+import tempfile
+
+from decouple import config
+from fastapi import HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import Session
+from starlette.concurrency import run_in_threadpool
+from database.database import engine
+from database.models import Ad, AdCategory, BusinessProfile, Categories
+from database import ad_fields, changes, facets, geo, search, similar
+from schemas import AdImport, AdCategoryImport
+import cache
+import images
+
+logger = logging.getLogger(__name__)
+
+# Zapisy wsadowe: najpierw walidujemy każdy element (schemat + powiązane wiersze,
+# jedno zapytanie na rodzaj powiązania), potem poprawne są wstawiane przez
+# executemany w transakcjach po BULK_CHUNK_SIZE elementów. Wynik jest osobno dla każdego.
+BULK_CHUNK_SIZE = config("BULK_CHUNK_SIZE", cast=int, default=500)
+# większe importy muszą iść w trybie NDJSON (Content-Type: application/x-ndjson)
+BULK_MAX_ITEMS = config("BULK_MAX_ITEMS", cast=int, default=10000)
+
+NDJSON = "application/x-ndjson"
+
+
+def _chunks(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _error(index: int, errors: list) -> dict:
+    return {"index": index, "status": "error", "errors": errors}
+
+
+def _validate(schema, items: list, start_index: int, results: dict) -> list:
+    # linie NDJSON przychodzą jako surowe bajty - niepoprawny JSON to błąd walidacji tego elementu
+    valid = []
+    for index, raw in enumerate(items, start_index):
+        try:
+            if isinstance(raw, bytes):
+                valid.append((index, schema.model_validate_json(raw)))
+            else:
+                valid.append((index, schema.model_validate(raw)))
+        except ValidationError as e:
+            results[index] = _error(index, [{"loc": list(err["loc"]), "msg": err["msg"]} for err in e.errors()])
+    return valid
+
+
+def _existing(session: Session, column, values) -> set:
+    found = set()
+    for chunk in _chunks(sorted(values), BULK_CHUNK_SIZE):
+        found.update(session.execute(select(column).where(column.in_(chunk))).scalars())
+    return found
+
+
+def _ordered(results: dict) -> list:
+    return [results[index] for index in sorted(results)]
+
+
+def import_ads(items: list, start_index: int = 0) -> list[dict]:
+    results = {}
+    valid = _validate(AdImport, items, start_index, results)
+
+    with Session(engine) as session:
+        bp_ids = _existing(session, BusinessProfile.bp_id, {ad.bp_id for _, ad in valid})
+        category_ids = _existing(session, Categories.category_id, {c for _, ad in valid for c in ad.category_ids})
+
+    checked = []
+    for index, ad in valid:
+        errors = []
+        if ad.bp_id not in bp_ids:
+            errors.append({"loc": ["bp_id"], "msg": "Firma nie istnieje"})
+        missing = sorted(set(ad.category_ids) - category_ids)
+        if missing:
+            errors.append({"loc": ["category_ids"], "msg": f"Nieznane kategorie: {missing}"})
+        if errors:
+            results[index] = _error(index, errors)
+        else:
+            checked.append((index, ad))
+
+    for chunk in _chunks(checked, BULK_CHUNK_SIZE):
+        with Session(engine) as session:
+            bp_points = geo.business_points(session, {ad.bp_id for _, ad in chunk})
+            rows, inserted = [], []
+            for index, ad in chunk:
+                try:
+                    ad_images = images.normalize_images(session, ad.images)
+                except HTTPException as e:
+                    results[index] = _error(index, [{"loc": ["images"], "msg": e.detail}])
+                    continue
+                row = ad.model_dump(exclude={"category_ids"})
+                row.update(ad_fields.typed_values(ad.price, ad.post_date, ad.due_date))
+                if row["lat"] is None or row["lon"] is None:
+                    # jak zdarzenia w database/geo.py - adres ogłoszenia, potem firmy
+                    row["lat"], row["lon"] = geo.geocode(ad.address) or bp_points.get(ad.bp_id, (None, None))
+                # jak w POST /ads - nowe ogłoszenia czekają na akceptację
+                rows.append({**row, "images": ad_images, "status": False})
+                inserted.append((index, ad))
+            if not rows:
+                continue
+
+            try:
+                ad_ids = session.execute(
+                    insert(Ad).returning(Ad.ad_id, sort_by_parameter_order=True), rows
+                ).scalars().all()
+                links = [
+                    {"ad_id": ad_id, "category_id": category_id}
+                    for ad_id, (_, ad) in zip(ad_ids, inserted)
+                    for category_id in dict.fromkeys(ad.category_ids)
+                ]
+                if links:
+                    session.execute(insert(AdCategory), links)
+                search.index_ads(session, [(ad_id, ad.ad_title, ad.description)
+                                           for ad_id, (_, ad) in zip(ad_ids, inserted)])
+                geo.index_ads(session, [(ad_id, row["lat"], row["lon"]) for ad_id, row in zip(ad_ids, rows)])
+                similar.index_ads(session, [(ad_id, ad.ad_title, ad.description, dict.fromkeys(ad.category_ids))
+                                            for ad_id, (_, ad) in zip(ad_ids, inserted)])
+                changes.record(session, "ad", "create", ad_ids)
+                session.commit()
+            except SQLAlchemyError as e:
+                session.rollback()
+                logger.warning("Bulk ad insert failed: %s", e)
+                for index, _ in inserted:
+                    results[index] = _error(index, [{"loc": [], "msg": "Błąd zapisu do bazy"}])
+                continue
+
+        for ad_id, (index, _) in zip(ad_ids, inserted):
+            results[index] = {"index": index, "status": "created", "ad_id": ad_id}
+        cache.invalidate(*{cache.business_tag(ad.bp_id) for _, ad in inserted})
+
+    return _ordered(results)
+
+
+def import_ad_categories(items: list, start_index: int = 0) -> list[dict]:
+    results = {}
+    valid = _validate(AdCategoryImport, items, start_index, results)
+
+    with Session(engine) as session:
+        ad_ids = _existing(session, Ad.ad_id, {link.ad_id for _, link in valid})
+        category_ids = _existing(session, Categories.category_id, {link.category_id for _, link in valid})
+        existing_links = set()
+        for chunk in _chunks(sorted(ad_ids), BULK_CHUNK_SIZE):
+            existing_links.update(session.execute(
+                select(AdCategory.ad_id, AdCategory.category_id).where(AdCategory.ad_id.in_(chunk))
+            ).tuples())
+
+    checked = []
+    for index, link in valid:
+        errors = []
+        if link.ad_id not in ad_ids:
+            errors.append({"loc": ["ad_id"], "msg": "Ogłoszenie nie istnieje"})
+        if link.category_id not in category_ids:
+            errors.append({"loc": ["category_id"], "msg": "Kategoria nie istnieje"})
+        if not errors and (link.ad_id, link.category_id) in existing_links:
+            errors.append({"loc": [], "msg": "Powiązanie już istnieje"})
+        if errors:
+            results[index] = _error(index, errors)
+        else:
+            existing_links.add((link.ad_id, link.category_id))
+            checked.append((index, link))
+
+    for chunk in _chunks(checked, BULK_CHUNK_SIZE):
+        with Session(engine) as session:
+            try:
+                session.execute(insert(AdCategory), [link.model_dump() for _, link in chunk])
+                facets.add_links(session, [(link.ad_id, link.category_id) for _, link in chunk])
+                similar.reindex_ads(session, {link.ad_id for _, link in chunk})
+                session.commit()
+            except SQLAlchemyError as e:
+                session.rollback()
+                logger.warning("Bulk ad category insert failed: %s", e)
+                for index, _ in chunk:
+                    results[index] = _error(index, [{"loc": [], "msg": "Błąd zapisu do bazy"}])
+                continue
+        for index, link in chunk:
+            results[index] = {"index": index, "status": "created", **link.model_dump()}
+        # ogłoszenie i jego lista "podobnych" pokazują kategorie
+        cache.invalidate(*{cache.ad_tag(link.ad_id) for _, link in chunk})
+
+    return _ordered(results)
+
+
+async def _ndjson_lines(request: Request):
+    # przesłany plik nigdy nie jest w całości w pamięci, tylko po BULK_CHUNK_SIZE linii naraz
+    buffer = b""
+    chunk = []
+    async for data in request.stream():
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                chunk.append(line)
+            if len(chunk) >= BULK_CHUNK_SIZE:
+                yield chunk
+                chunk = []
+    if buffer.strip():
+        chunk.append(buffer)
+    if chunk:
+        yield chunk
+
+
+async def handle_bulk(request: Request, import_func):
+    if request.headers.get("content-type", "").startswith(NDJSON):
+        # wyniki idą do pliku tymczasowego (w pamięci do 1 MB) i wracają strumieniowo jako NDJSON
+        output = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+        counts = {"created": 0, "error": 0}
+        index = 0
+        async for lines in _ndjson_lines(request):
+            for result in await run_in_threadpool(import_func, lines, index):
+                counts[result["status"]] += 1
+                output.write(json.dumps(result, ensure_ascii=False).encode() + b"\n")
+            index += len(lines)
+        output.seek(0)
+
+        def read():
+            with output:
+                while data := output.read(64 * 1024):
+                    yield data
+
+        headers = {"X-Bulk-Created": str(counts["created"]), "X-Bulk-Failed": str(counts["error"])}
+        return StreamingResponse(read(), media_type=NDJSON, headers=headers)
+
+    try:
+        items = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Nieprawidłowy JSON")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Oczekiwano listy elementów")
+    if len(items) > BULK_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Maksymalnie {BULK_MAX_ITEMS} elementów, większe importy wysyłaj jako {NDJSON}"
+        )
+
+    results = await run_in_threadpool(import_func, items)
+    created = sum(1 for result in results if result["status"] == "created")
+    return {"created": created, "failed": len(results) - created, "results": results}
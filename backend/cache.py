@@ -0,0 +1,221 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from decouple import config
+from fastapi import Request
+
+logger = logging.getLogger(__name__)
+
+# memory (domyślnie), redis albo none
+RESPONSE_CACHE_BACKEND = config("RESPONSE_CACHE_BACKEND", default="memory")
+RESPONSE_CACHE_SIZE = config("RESPONSE_CACHE_SIZE", cast=int, default=2048)
+RESPONSE_CACHE_TTL = config("RESPONSE_CACHE_TTL", cast=float, default=60)
+REDIS_URL = config("REDIS_URL", default="redis://localhost:6379/0")
+REDIS_KEY_PREFIX = config("REDIS_KEY_PREFIX", default="bitehack:cache:")
+
+# Odpowiedzi GET w cache są oznaczone tagami encji, które zawierają (ad:ID, bp:ID,
+# categories); handlery zapisu unieważniają tagi, których dotykają, a TTL ogranicza
+# tylko nieaktualność po zmianach zrobionych poza API.
+
+
+def ad_tag(ad_id) -> str:
+    return f"ad:{ad_id}"
+
+
+def business_tag(bp_id) -> str:
+    return f"bp:{bp_id}"
+
+
+CATEGORIES_TAG = "categories"
+
+
+def request_key(request: Request) -> str:
+    # ścieżka + posortowane parametry, więc ?limit=10&sort=x i ?sort=x&limit=10 to ten sam wpis
+    query = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    return f"{request.url.path}?{query}"
+
+
+class CacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def incr(self, name: str, amount: int = 1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+class NullCache:
+    backend = "none"
+
+    def __init__(self):
+        self.stats = CacheStats()
+
+    def get(self, key: str):
+        self.stats.incr("misses")
+        return None
+
+    def set(self, key: str, value, tags: Iterable[str] = ()):
+        pass
+
+    def invalidate(self, *tags: str):
+        pass
+
+    def clear(self):
+        pass
+
+    def size(self) -> int:
+        return 0
+
+
+class MemoryCache(NullCache):
+    # LRU z TTL, osobny w każdym procesie; tagi wskazują klucze zapisane pod nimi
+    backend = "memory"
+
+    def __init__(self, maxsize: int, ttl: float):
+        super().__init__()
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._tags: dict[str, set] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.stats.incr("misses")
+                return None
+            self._entries.move_to_end(key)
+        self.stats.incr("hits")
+        return entry[0]
+
+    def set(self, key: str, value, tags: Iterable[str] = ()):
+        if self.maxsize <= 0:
+            return
+        tags = tuple(tags)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic() + self.ttl, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+                self.stats.incr("evictions")
+
+    def _remove(self, key: str):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def invalidate(self, *tags: str):
+        with self._lock:
+            keys = set().union(*(self._tags.get(tag, ()) for tag in tags))
+            for key in keys:
+                self._remove(key)
+        if keys:
+            self.stats.incr("invalidations", len(keys))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def size(self) -> int:
+        return len(self._entries)
+
+
+class RedisCache(NullCache):
+    # Wspólny dla workerów. `client` to cokolwiek z metodami get/set/sadd/smembers/
+    # expire/delete z redis-py, więc testy mogą podać zamiennik w pamięci.
+    # Wartości trzymamy jako JSON; usuwanie nadmiaru zostawiamy Redisowi (maxmemory-policy).
+    backend = "redis"
+
+    def __init__(self, client, ttl: float, prefix: str = REDIS_KEY_PREFIX):
+        super().__init__()
+        self.client = client
+        self.ttl = max(1, int(ttl))
+        self.prefix = prefix
+
+    def _tag_key(self, tag: str) -> str:
+        return f"{self.prefix}tag:{tag}"
+
+    def get(self, key: str):
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            self.stats.incr("misses")
+            return None
+        self.stats.incr("hits")
+        return json.loads(raw)
+
+    def set(self, key: str, value, tags: Iterable[str] = ()):
+        self.client.set(self.prefix + key, json.dumps(value), ex=self.ttl)
+        for tag in tags:
+            self.client.sadd(self._tag_key(tag), self.prefix + key)
+            # zbiór tagu żyje trochę dłużej niż jego wpisy, nieaktualne klucze nie szkodzą
+            self.client.expire(self._tag_key(tag), self.ttl * 2)
+
+    def invalidate(self, *tags: str):
+        keys = set()
+        for tag in tags:
+            keys.update(self.client.smembers(self._tag_key(tag)) or ())
+        if keys:
+            self.client.delete(*keys)
+            self.stats.incr("invalidations", len(keys))
+        self.client.delete(*[self._tag_key(tag) for tag in tags])
+
+    def clear(self):
+        # tylko nasz prefiks, baza Redisa może być współdzielona
+        for key in self.client.scan_iter(match=self.prefix + "*"):
+            self.client.delete(key)
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+def create_cache(backend: str = RESPONSE_CACHE_BACKEND):
+    if backend == "none":
+        return NullCache()
+    if backend == "redis":
+        try:
+            import redis
+        except ImportError:
+            logger.warning("RESPONSE_CACHE_BACKEND=redis but the redis package is missing, using memory cache")
+        else:
+            return RedisCache(redis.Redis.from_url(REDIS_URL), RESPONSE_CACHE_TTL)
+    return MemoryCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
+
+
+response_cache = create_cache()
+
+
+def invalidate(*tags: str):
+    response_cache.invalidate(*tags)
+
+
+def stats() -> dict:
+    return {"backend": response_cache.backend, "size": response_cache.size(), **response_cache.stats.as_dict()}
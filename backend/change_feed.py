@@ -0,0 +1,177 @@
+import asyncio
+import logging
+
+from decouple import config
+from sqlmodel.ext.asyncio.session import AsyncSession
+from database.database import get_async_engine
+from database import changes
+from serialization import dumps
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Server-sent events dla GET /changes/stream. Jedno zadanie na proces czyta nowe
+# wiersze ChangeEvent (zaraz po lokalnym commicie, który jakieś zapisał, patrz
+# database/changes.py, oraz co CHANGES_POLL_INTERVAL sekund dla commitów innych
+# workerów), koduje każde zdarzenie raz i wkłada ramkę do ograniczonej kolejki
+# każdego subskrybenta. Bezczynny subskrybent to asyncio.Queue i wstrzymany
+# generator - bez wątku, bez połączenia z bazą i bez własnego odpytywania.
+# Subskrybent, który zostanie w tyle o CHANGES_SUBSCRIBER_QUEUE zdarzeń, jest rozłączany;
+# EventSource łączy się ponownie z Last-Event-ID i nadrabia z dziennika.
+
+CHANGES_POLL_INTERVAL = config("CHANGES_POLL_INTERVAL", cast=float, default=1.0)
+CHANGES_POLL_BATCH = config("CHANGES_POLL_BATCH", cast=int, default=500)
+CHANGES_SUBSCRIBER_QUEUE = config("CHANGES_SUBSCRIBER_QUEUE", cast=int, default=1000)
+CHANGES_HEARTBEAT_SECONDS = config("CHANGES_HEARTBEAT_SECONDS", cast=float, default=15)
+# strumienie kończą się po tym czasie (EventSource łączy się ponownie), żeby proxy i load balancery widziały ich rotację
+CHANGES_STREAM_MAX_SECONDS = config("CHANGES_STREAM_MAX_SECONDS", cast=float, default=600)
+# nadrabianie przy połączeniu; klient bardziej w tyle dostaje "reset" i wczytuje listy od nowa
+CHANGES_STREAM_BACKLOG = config("CHANGES_STREAM_BACKLOG", cast=int, default=5000)
+# opóźnienie ponownego połączenia sugerowane EventSource, w milisekundach
+CHANGES_RETRY_MS = config("CHANGES_RETRY_MS", cast=int, default=3000)
+
+HEARTBEAT = b": ping\n\n"
+RESET = b"event: reset\ndata: {}\n\n"
+
+subscribers = metrics.Gauge("change_feed_subscribers", "Open change feed streams")
+dropped = metrics.Counter("change_feed_dropped_total", "Change feed streams closed because the client fell behind")
+metrics.collectors.append(lambda: subscribers.render() + dropped.render())
+
+
+def frame(change) -> bytes:
+    # zdarzenia bez nazwy, żeby trafiały do EventSource.onmessage
+    return b"id: %d\ndata: %s\n\n" % (change.seq, dumps(changes.as_dict(change)))
+
+
+async def _read(statement):
+    async with AsyncSession(get_async_engine()) as session:
+        return (await session.execute(statement)).all()
+
+
+async def load_since(since: int, limit: int):
+    # (zdarzenia po `since`, najwyżej limit; czy sięgają wstecz do `since`)
+    oldest, latest = (await _read(changes.bounds_statement()))[0]
+    if changes.missed(since, oldest, latest):
+        return [], False
+    return [change for change, in await _read(changes.since_statement(since, limit))], True
+
+
+class Subscriber:
+    def __init__(self):
+        self.queue = asyncio.Queue(CHANGES_SUBSCRIBER_QUEUE)
+        self.overflowed = False
+
+    def push(self, seq: int, data: bytes):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait((seq, data))
+        except asyncio.QueueFull:
+            # zdarzenia z kolejki jeszcze dochodzą, potem strumień się kończy
+            self.overflowed = True
+            dropped.inc()
+
+
+class ChangeFeed:
+    def __init__(self):
+        self.last_seq = 0
+        self._subscribers: set[Subscriber] = set()
+        self._loop = None
+        self._wakeup = None
+        self._task = None
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self.last_seq = (await _read(changes.latest_statement()))[0][0] or 0
+        changes.listeners.append(self.notify)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.notify in changes.listeners:
+            changes.listeners.remove(self.notify)
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._loop = None
+
+    def notify(self):
+        # wołane z wątku, który akurat commitował
+        loop = self._loop
+        if loop is None:
+            return
+        try:
+            loop.call_soon_threadsafe(self._wakeup.set)
+        except RuntimeError:
+            # pętla jest już zamknięta (wyłączanie)
+            pass
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), CHANGES_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self._poll()
+            except Exception:
+                logger.exception("Błąd odczytu zmian")
+
+    async def _poll(self):
+        if not self._subscribers:
+            # nie ma komu wysłać - zapamiętujemy tylko, gdzie kończy się dziennik
+            self.last_seq = (await _read(changes.latest_statement()))[0][0] or self.last_seq
+            return
+        while True:
+            batch = [change for change, in await _read(changes.since_statement(self.last_seq, CHANGES_POLL_BATCH))]
+            for change in batch:
+                data = frame(change)
+                for subscriber in tuple(self._subscribers):
+                    subscriber.push(change.seq, data)
+            if batch:
+                self.last_seq = batch[-1].seq
+            if len(batch) < CHANGES_POLL_BATCH:
+                return
+
+    async def stream(self, since: int | None):
+        # since: ostatni seq, który widział klient (Last-Event-ID); None - tylko nowe zdarzenia
+        subscriber = Subscriber()
+        # rejestrujemy przed odczytem zaległych, żeby nie zgubić niczego zacommitowanego w międzyczasie
+        self._subscribers.add(subscriber)
+        subscribers.inc()
+        try:
+            yield b"retry: %d\n\n" % CHANGES_RETRY_MS
+            sent = self.last_seq
+            if since is not None:
+                backlog, complete = await load_since(since, CHANGES_STREAM_BACKLOG)
+                if not complete or len(backlog) == CHANGES_STREAM_BACKLOG:
+                    yield RESET
+                    return
+                sent = since
+                for change in backlog:
+                    yield frame(change)
+                    sent = change.seq
+
+            deadline = self._loop.time() + CHANGES_STREAM_MAX_SECONDS
+            while True:
+                timeout = min(CHANGES_HEARTBEAT_SECONDS, deadline - self._loop.time())
+                if timeout <= 0:
+                    return
+                try:
+                    seq, data = await asyncio.wait_for(subscriber.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    yield HEARTBEAT
+                    continue
+                # odczyt zaległych mógł je już zwrócić
+                if seq > sent:
+                    yield data
+                    sent = seq
+                if subscriber.overflowed and subscriber.queue.empty():
+                    return
+        finally:
+            self._subscribers.discard(subscriber)
+            subscribers.dec()
+
+
+feed = ChangeFeed()
@@ -0,0 +1,132 @@
+from sqlalchemy import case, func
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from database.models import Ad, AdCategory, AdRating, BusinessProfile, BusinessRating, Categories
+from database import ratings
+from pagination import encode_cursor
+from schemas import AdRead, BusinessRead
+import images
+
+# Panel właściciela (GET /users/{user_id}/dashboard): firmy użytkownika z ocenami
+# i liczbą ogłoszeń w każdym stanie, a dla każdej firmy jej najnowsze ogłoszenia
+# z kategoriami i ocenami. Zawsze te same kilka zapytań - żadnego na firmę
+# ani na ogłoszenie - niezależnie od liczby firm i ogłoszeń właściciela.
+# Dalsze ogłoszenia firmy są pod
+# /businesses/{bp_id}/ads?sort=-created_at&cursor=<next_cursor>.
+
+AD_STATES = ("active", "pending", "rejected", "expired")
+DASHBOARD_SORT = "-created_at"
+
+# te same reguły co facets.visible() i moderation.pending()
+_state = case(
+    (col(Ad.expired_at).is_not(None), "expired"),
+    (Ad.status == True, "active"),
+    (col(Ad.rejected_at).is_not(None), "rejected"),
+    else_="pending",
+)
+
+
+def ad_state(ad: Ad) -> str:
+    if ad.expired_at is not None:
+        return "expired"
+    if ad.status:
+        return "active"
+    return "rejected" if ad.rejected_at is not None else "pending"
+
+
+def _owned_ads(user_id: int):
+    return col(Ad.bp_id).in_(select(BusinessProfile.bp_id).where(BusinessProfile.user_id == user_id))
+
+
+async def _businesses(session: AsyncSession, user_id: int) -> list:
+    rows = (await session.exec(
+        select(BusinessProfile, BusinessRating)
+        .outerjoin(BusinessRating, col(BusinessRating.bp_id) == col(BusinessProfile.bp_id))
+        .where(BusinessProfile.user_id == user_id)
+        .order_by(col(BusinessProfile.bp_id))
+    )).all()
+    return list(rows)
+
+
+async def _ad_counts(session: AsyncSession, user_id: int) -> dict:
+    rows = (await session.exec(
+        select(Ad.bp_id, _state, func.count()).where(_owned_ads(user_id)).group_by(Ad.bp_id, _state)
+    )).all()
+    counts = {}
+    for bp_id, state, count in rows:
+        counts.setdefault(bp_id, dict.fromkeys(AD_STATES, 0))[state] = count
+    return counts
+
+
+async def _newest_ads(session: AsyncSession, user_id: int, per_business: int) -> list:
+    # jedno zapytanie z funkcją okna: per_business + 1 najnowszych ogłoszeń każdej firmy (+1 mówi, czy jest więcej)
+    ranked = (
+        select(Ad.ad_id, func.row_number().over(
+            partition_by=Ad.bp_id, order_by=(col(Ad.created_at).desc(), col(Ad.ad_id).desc())
+        ).label("position"))
+        .where(_owned_ads(user_id))
+        .subquery()
+    )
+    rows = (await session.exec(
+        select(Ad, AdRating, ranked.c.position)
+        .join(ranked, ranked.c.ad_id == col(Ad.ad_id))
+        .outerjoin(AdRating, col(AdRating.ad_id) == col(Ad.ad_id))
+        .where(ranked.c.position <= per_business + 1)
+        .order_by(col(Ad.bp_id), ranked.c.position)
+    )).all()
+    return list(rows)
+
+
+async def categories_by_ad(session: AsyncSession, ad_ids: list[int]) -> dict:
+    if not ad_ids:
+        return {}
+    rows = (await session.exec(
+        select(AdCategory.ad_id, Categories.category_id, Categories.category_name)
+        .join(Categories, col(Categories.category_id) == col(AdCategory.category_id))
+        .where(col(AdCategory.ad_id).in_(ad_ids))
+        .order_by(col(Categories.category_name))
+    )).all()
+    by_ad = {}
+    for ad_id, category_id, category_name in rows:
+        by_ad.setdefault(ad_id, []).append({"category_id": category_id, "category_name": category_name})
+    return by_ad
+
+
+def _ad_item(ad: Ad, aggregate, categories: list) -> dict:
+    item = AdRead.model_validate(ad).model_dump()
+    item["images"] = images.thumbnail_urls(item["images"])
+    item["state"] = ad_state(ad)
+    item["categories"] = categories
+    item["rating"] = ratings.summary(aggregate)
+    return item
+
+
+async def load_dashboard(session: AsyncSession, user_id: int, per_business: int) -> list[dict]:
+    businesses = await _businesses(session, user_id)
+    if not businesses:
+        return []
+    counts = await _ad_counts(session, user_id)
+    ad_rows = await _newest_ads(session, user_id, per_business)
+    categories = await categories_by_ad(session, [ad.ad_id for ad, _, position in ad_rows if position <= per_business])
+
+    ads_by_business = {}
+    for ad, aggregate, position in ad_rows:
+        ads_by_business.setdefault(ad.bp_id, []).append((ad, aggregate, position))
+
+    result = []
+    for business, aggregate in businesses:
+        rows = ads_by_business.get(business.bp_id, [])
+        page = [row for row in rows if row[2] <= per_business]
+        next_cursor = None
+        if len(rows) > per_business:
+            last = page[-1][0]
+            next_cursor = encode_cursor(DASHBOARD_SORT, [last.created_at, last.ad_id])
+        ad_counts = counts.get(business.bp_id, dict.fromkeys(AD_STATES, 0))
+        result.append({
+            **BusinessRead.model_validate(business).model_dump(),
+            "rating": ratings.summary(aggregate),
+            "ad_counts": {**ad_counts, "total": sum(ad_counts.values())},
+            "ads": [_ad_item(ad, ad_rating, categories.get(ad.ad_id, [])) for ad, ad_rating, _ in page],
+            "next_cursor": next_cursor,
+        })
+    return result
@@ -0,0 +1,109 @@
+import re
+from datetime import date, datetime
+
+from sqlalchemy import event, inspect, or_, select, update
+from sqlmodel import col
+from database.models import Ad
+from database import changes, facets
+
+# Typowane kopie tekstowych Ad.price / post_date / due_date. Tekst zostaje taki,
+# jak wpisała go firma ("120 zł/h + 100 zł za plan"), i to on jest zwracany przez API;
+# price_amount (w groszach), price_currency, post_on i due_on są z niego parsowane
+# przy każdym zapisie, więc filtry po cenie, sortowanie "wkrótce się kończy" i
+# wygaszanie działają w SQL na zaindeksowanych kolumnach.
+
+_AMOUNT_RE = re.compile(r"(\d{1,3}(?:[ \u00a0]\d{3})+|\d+)(?:[.,](\d{1,2}))?")
+_CURRENCIES = (("€", "EUR"), ("eur", "EUR"), ("$", "USD"), ("usd", "USD"))
+DEFAULT_CURRENCY = "PLN"
+
+_BULK = {"synchronize_session": False}
+
+
+def parse_price(value) -> tuple[int | None, str | None]:
+    # pierwsza kwota w tekście, np. "5 zł/kg (buraki), 3 zł/kg (marchew)" -> (500, "PLN")
+    if value is None:
+        return None, None
+    if isinstance(value, (int, float)):
+        return round(value * 100), DEFAULT_CURRENCY
+    match = _AMOUNT_RE.search(value)
+    if not match:
+        return None, None
+    whole, fraction = match.groups()
+    amount = int(re.sub(r"\D", "", whole)) * 100 + int((fraction or "0").ljust(2, "0"))
+    lowered = value.lower()
+    currency = next((code for sign, code in _CURRENCIES if sign in lowered), DEFAULT_CURRENCY)
+    return amount, currency
+
+
+def parse_date(value) -> date | None:
+    # 2026-02-05 (formularz wysyła daty ISO), także 05.02.2026
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if not value:
+        return None
+    value = value.strip()
+    for fmt, length in (("%Y-%m-%d", 10), ("%d.%m.%Y", 10)):
+        try:
+            return datetime.strptime(value[:length], fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def typed_values(price, post_date, due_date) -> dict:
+    price_amount, price_currency = parse_price(price)
+    return {
+        "price_amount": price_amount,
+        "price_currency": price_currency,
+        "post_on": parse_date(post_date),
+        "due_on": parse_date(due_date),
+    }
+
+
+def active(today: date | None = None):
+    # zatwierdzone i nie po due_date (także zanim expire_ads zadziała dla dzisiejszej daty)
+    today = today or date.today()
+    return [
+        Ad.status == True,
+        col(Ad.expired_at).is_(None),
+        or_(col(Ad.due_on).is_(None), col(Ad.due_on) >= today),
+    ]
+
+
+def expire_ads(session, today: date | None = None) -> list[tuple[int, int]]:
+    # jeden UPDATE dla wszystkich ogłoszeń po due_date; zwraca (ad_id, bp_id) wygaszonych
+    today = today or date.today()
+    due = [col(Ad.expired_at).is_(None), col(Ad.due_on) < today]
+    facets.remove_ads(session, select(Ad.ad_id).where(*due))
+    expired = session.execute(
+        update(Ad)
+        .where(*due)
+        .values(expired_at=datetime.utcnow())
+        .returning(Ad.ad_id, Ad.bp_id),
+        execution_options=_BULK,
+    ).tuples().all()
+    changes.record(session, "ad", "update", [ad_id for ad_id, _ in expired])
+    session.commit()
+    return list(expired)
+
+
+@event.listens_for(Ad, "before_insert")
+def _parse_new_ad(mapper, connection, target):
+    for name, value in typed_values(target.price, target.post_date, target.due_date).items():
+        setattr(target, name, value)
+
+
+@event.listens_for(Ad, "before_update")
+def _parse_ad(mapper, connection, target):
+    state = inspect(target)
+    if state.attrs.price.history.has_changes():
+        target.price_amount, target.price_currency = parse_price(target.price)
+    if state.attrs.post_date.history.has_changes():
+        target.post_on = parse_date(target.post_date)
+    if state.attrs.due_date.history.has_changes():
+        target.due_on = parse_date(target.due_date)
+        # nowy due_date w przyszłości przywraca wygaszone ogłoszenie
+        if target.due_on is None or target.due_on >= date.today():
+            target.expired_at = None
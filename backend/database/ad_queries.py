@@ -0,0 +1,69 @@
+from typing import Optional
+
+from sqlalchemy import false, or_
+from sqlalchemy.orm import joinedload, selectinload
+from sqlmodel import select, col
+from database.models import Ad, AdCategory, AdRating
+from database import search as ad_search
+from database import ad_fields, geo
+
+# Zapytania list ogłoszeń wspólne dla handlerów z main.py i sprawdzania planów w
+# database/query_plans.py, żeby `manage.py explain` oglądało to, co wykonuje API.
+
+# price / due_date sortują po typowanych kolumnach (database/ad_fields.py)
+AD_SORT_OPTIONS = {"created_at": Ad.created_at, "price": Ad.price_amount, "due_date": Ad.due_on}
+
+
+def filter_ads(statement, search: Optional[str], category_id: Optional[int], near: Optional[tuple] = None,
+               min_price: Optional[float] = None, max_price: Optional[float] = None, active_only: bool = False):
+    # zwraca (zapytanie, opcje sortowania, domyślne sortowanie)
+    sort_options = dict(AD_SORT_OPTIONS)
+    default_sort = None
+
+    # ceny w złotych, w bazie w groszach
+    if min_price is not None:
+        statement = statement.where(col(Ad.price_amount) >= round(min_price * 100))
+    if max_price is not None:
+        statement = statement.where(col(Ad.price_amount) <= round(max_price * 100))
+    if active_only:
+        statement = statement.where(*ad_fields.active())
+
+    if search and ad_search.fts_enabled:
+        matches = ad_search.search_subquery(search)
+        if matches is None:
+            return statement.where(false()), sort_options, default_sort
+        statement = statement.join(matches, col(Ad.ad_id) == matches.c.ad_id)
+        # najlepsze dopasowania najpierw
+        sort_options["rank"] = matches.c.rank
+        default_sort = "rank"
+    elif search:
+        search_filter = f"%{search}%"
+        statement = statement.where(
+            or_(
+                col(Ad.ad_title).ilike(search_filter),
+                col(Ad.description).ilike(search_filter)
+            )
+        )
+
+    if category_id:
+        statement = statement.join(AdCategory).where(AdCategory.category_id == category_id)
+
+    if near:
+        # near = (lat, lon, radius_km); najbliższe najpierw
+        clauses, distance2 = geo.near(*near)
+        statement = statement.where(*clauses)
+        sort_options["distance"] = distance2
+        default_sort = "distance"
+
+    return statement, sort_options, default_sort
+
+
+def feed_statement():
+    # GET /feed: zatwierdzone ogłoszenia przed due_date (także zanim zadziała expire_ads)
+    # razem z firmą, kategoriami i oceną
+    return (
+        select(Ad, AdRating.rating_sum, AdRating.rating_count)
+        .outerjoin(AdRating, col(AdRating.ad_id) == col(Ad.ad_id))
+        .where(*ad_fields.active())
+        .options(joinedload(Ad.business_profile), selectinload(Ad.ad_category))
+    )
@@ -0,0 +1,73 @@
+import time
+
+from decouple import config
+from sqlalchemy import delete
+from sqlmodel import Session, select
+from database.models import User, BusinessProfile, Ad, AdCategory, Reviews
+from database import changes, facets, geo, ratings, search, similar
+
+# Kaskady zbiorowe: stała liczba zapytań DELETE ... WHERE ad_id IN (podzapytanie)
+# niezależnie od tego, ile ogłoszeń i opinii ma właściciel.
+
+DELETE_BATCH_SIZE = config("DELETE_BATCH_SIZE", cast=int, default=500)
+
+_BULK = {"synchronize_session": False}
+
+
+def delete_ads(session: Session, ad_ids):
+    # ad_ids: lista id albo select() je zwracający; wykonywany, zanim znikną wiersze Ad
+    changes.record_deletes(session, "review", select(Reviews.review_id).where(Reviews.ad_id.in_(ad_ids)))
+    changes.record_deletes(session, "ad", select(Ad.ad_id).where(Ad.ad_id.in_(ad_ids)))
+    ratings.drop_ad_ratings(session, ad_ids)
+    facets.remove_ads(session, ad_ids)
+    search.unindex_ads(session, ad_ids)
+    geo.unindex_ads(session, ad_ids)
+    similar.unindex_ads(session, ad_ids)
+    session.execute(delete(AdCategory).where(AdCategory.ad_id.in_(ad_ids)), execution_options=_BULK)
+    session.execute(delete(Reviews).where(Reviews.ad_id.in_(ad_ids)), execution_options=_BULK)
+    session.execute(delete(Ad).where(Ad.ad_id.in_(ad_ids)), execution_options=_BULK)
+
+
+def delete_businesses(session: Session, bp_ids):
+    ad_ids = select(Ad.ad_id).where(Ad.bp_id.in_(bp_ids))
+    changes.record_deletes(session, "review", select(Reviews.review_id).where(Reviews.ad_id.in_(ad_ids)))
+    changes.record_deletes(session, "ad", ad_ids)
+    ratings.drop_business_ratings(session, bp_ids)
+    facets.remove_ads(session, ad_ids)
+    search.unindex_ads(session, ad_ids)
+    geo.unindex_ads(session, ad_ids)
+    similar.unindex_ads(session, ad_ids)
+    session.execute(delete(AdCategory).where(AdCategory.ad_id.in_(ad_ids)), execution_options=_BULK)
+    session.execute(delete(Reviews).where(Reviews.ad_id.in_(ad_ids)), execution_options=_BULK)
+    session.execute(delete(Ad).where(Ad.bp_id.in_(bp_ids)), execution_options=_BULK)
+    session.execute(delete(BusinessProfile).where(BusinessProfile.bp_id.in_(bp_ids)), execution_options=_BULK)
+
+
+def delete_user(session: Session, user_id: int):
+    delete_businesses(session, select(BusinessProfile.bp_id).where(BusinessProfile.user_id == user_id))
+    changes.record_deletes(session, "user", select(User.user_id).where(User.user_id == user_id))
+    session.execute(delete(User).where(User.user_id == user_id), execution_options=_BULK)
+
+
+def delete_in_batches(engine, bp_ids: list[int], user_id: int | None = None,
+                      batch_size: int = DELETE_BATCH_SIZE, pause: float = 0.01):
+    # Tryb w tle dla bardzo dużych kont: ogłoszenia są usuwane porcjami, każda w
+    # osobnej krótkiej transakcji, żeby między porcjami inni mogli zapisywać do
+    # SQLite. Profile firm (i użytkownik) idą na końcu.
+    while True:
+        with Session(engine) as session:
+            chunk = session.exec(
+                select(Ad.ad_id).where(Ad.bp_id.in_(bp_ids)).limit(batch_size)
+            ).all()
+            if not chunk:
+                break
+            delete_ads(session, list(chunk))
+            session.commit()
+        time.sleep(pause)
+
+    with Session(engine) as session:
+        delete_businesses(session, bp_ids)
+        if user_id is not None:
+            changes.record_deletes(session, "user", select(User.user_id).where(User.user_id == user_id))
+            session.execute(delete(User).where(User.user_id == user_id), execution_options=_BULK)
+        session.commit()
@@ -0,0 +1,188 @@
+from datetime import datetime, timedelta
+
+from decouple import config
+from sqlalchemy import DateTime, delete, event, func, insert, inspect, literal, select, text
+from sqlalchemy.orm import Session as OrmSession, object_session
+from sqlmodel import Session, col
+from database.models import Ad, ChangeEvent, Reviews, User
+from schemas import AdRead, ReviewRead, UserRead
+
+# Dziennik zmian (GET /changes, GET /changes/stream): każde utworzenie / edycja /
+# zatwierdzenie / usunięcie ogłoszenia, użytkownika albo opinii dopisuje wiersz
+# ChangeEvent w tej samej transakcji co zapis, więc dziennik nigdy nie pokaże
+# wycofanej zmiany, a seq porządkuje zdarzenia w kolejności commitów (SQLite ma
+# jednego piszącego naraz; na PostgreSQL _lock_log szereguje transakcje dopisujące
+# do dziennika, inaczej transakcja z niższym seq mogłaby się zacommitować, gdy
+# czytelnik już ją minął). Zapisy przez ORM
+# rejestrują zdarzenia mappera niżej; zapisy zbiorowe (kaskady, moderacja,
+# wygaszanie, import) same wołają record / record_deletes. Po commicie, który
+# coś zapisał, wołane są funkcje z `listeners` (w wątku, który commitował) -
+# change_feed.py wysyła dzięki temu zdarzenia od razu, zamiast czekać na
+# następne odpytanie bazy.
+
+CHANGES_RETENTION_DAYS = config("CHANGES_RETENTION_DAYS", cast=int, default=7)
+
+# encja -> (tabela, klucz główny, co zwraca dla niej API)
+ENTITIES = {
+    "ad": (Ad, Ad.ad_id, AdRead),
+    "user": (User, User.user_id, UserRead),
+    "review": (Reviews, Reviews.review_id, ReviewRead),
+}
+# same dzierżawy moderacji i znaczniki czasu to nie zmiany, które ktoś śledzi
+IGNORED_ATTRIBUTES = {"claimed_by", "claim_expires_at", "updated_at"}
+
+listeners = []
+
+_PENDING = "changes_recorded"
+# klucz pg_advisory_xact_lock dziennika zmian
+_LOG_LOCK_KEY = 0x63686C67
+# id na jedno IN (...) - sporo poniżej limitu parametrów SQLite
+_IN_CHUNK_SIZE = 500
+
+
+def _snapshot(schema, row) -> dict:
+    return schema.model_validate(row).model_dump(mode="json")
+
+
+def _lock_log(conn):
+    # trzymana do końca transakcji; w jej obrębie można ją brać wielokrotnie
+    dialect = conn.get_bind().dialect if isinstance(conn, OrmSession) else conn.dialect
+    if dialect.name == "postgresql":
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _LOG_LOCK_KEY})
+
+
+def record(session: Session, entity: str, action: str, entity_ids):
+    # zapisy zbiorowe omijają zdarzenia mappera; wiersze są czytane ponownie po zapisie
+    table, key, schema = ENTITIES[entity]
+    columns = [column for column in table.__table__.columns if column.name in schema.model_fields]
+    ids = sorted(set(entity_ids))
+    now = datetime.utcnow()
+    for start in range(0, len(ids), _IN_CHUNK_SIZE):
+        rows = session.execute(
+            select(*columns).where(col(key).in_(ids[start:start + _IN_CHUNK_SIZE])).order_by(key)
+        ).mappings().all()
+        if rows:
+            _lock_log(session)
+            session.execute(insert(ChangeEvent), [
+                {"entity": entity, "entity_id": row[key.key], "action": action,
+                 "data": _snapshot(schema, dict(row)), "created_at": now}
+                for row in rows
+            ])
+    if ids:
+        session.info[_PENDING] = True
+
+
+def record_deletes(session: Session, entity: str, ids_select):
+    # ids_select: select() usuwanych id, wykonywany, zanim znikną wiersze
+    ids = ids_select.subquery()
+    id_column = list(ids.c)[0]
+    _lock_log(session)
+    session.execute(insert(ChangeEvent).from_select(
+        ["entity", "entity_id", "action", "created_at"],
+        select(literal(entity), id_column, literal("delete"), literal(datetime.utcnow(), DateTime))
+        .order_by(id_column),
+    ))
+    session.info[_PENDING] = True
+
+
+def since_statement(since: int, limit: int):
+    return select(ChangeEvent).where(ChangeEvent.seq > since).order_by(col(ChangeEvent.seq)).limit(limit)
+
+
+def bounds_statement():
+    # (najstarszy, najnowszy) seq, który jest jeszcze w dzienniku
+    return select(func.min(ChangeEvent.seq), func.max(ChangeEvent.seq))
+
+
+def latest_statement():
+    return select(func.max(ChangeEvent.seq))
+
+
+def missed(since: int, oldest: int | None, latest: int | None) -> bool:
+    # zdarzenia po `since` zostały już usunięte (albo klient widział inną bazę) -
+    # klient musi wczytać swoje listy od nowa
+    if latest is None:
+        return since > 0
+    return since + 1 < oldest or since > latest
+
+
+def as_dict(change: ChangeEvent) -> dict:
+    return {
+        "seq": change.seq,
+        "entity": change.entity,
+        "entity_id": change.entity_id,
+        "action": change.action,
+        "data": change.data,
+        "created_at": change.created_at,
+    }
+
+
+def prune_changes(session: Session) -> int:
+    # najnowsze zdarzenie zawsze zostaje, żeby `missed` wiedziało, jak daleko sięga dziennik
+    cutoff = datetime.utcnow() - timedelta(days=CHANGES_RETENTION_DAYS)
+    latest = select(func.max(ChangeEvent.seq)).scalar_subquery()
+    pruned = session.execute(
+        delete(ChangeEvent).where(col(ChangeEvent.created_at) < cutoff, col(ChangeEvent.seq) < latest)
+    ).rowcount
+    session.commit()
+    return pruned
+
+
+def _append(connection, target, entity: str, action: str):
+    _, key, schema = ENTITIES[entity]
+    _lock_log(connection)
+    connection.execute(insert(ChangeEvent).values(
+        entity=entity,
+        entity_id=getattr(target, key.key),
+        action=action,
+        data=None if action == "delete" else _snapshot(schema, target),
+        created_at=datetime.utcnow(),
+    ))
+    session = object_session(target)
+    if session is not None:
+        session.info[_PENDING] = True
+
+
+def _modified(target) -> bool:
+    # after_update wywołuje się też dla obiektów tylko oznaczonych jako zmienione
+    state = inspect(target)
+    return any(
+        state.attrs[prop.key].history.has_changes()
+        for prop in state.mapper.column_attrs
+        if prop.key not in IGNORED_ATTRIBUTES
+    )
+
+
+def _listen(model, entity: str):
+    @event.listens_for(model, "after_insert")
+    def _created(mapper, connection, target):
+        _append(connection, target, entity, "create")
+
+    @event.listens_for(model, "after_update")
+    def _updated(mapper, connection, target):
+        if not _modified(target):
+            return
+        action = "update"
+        if entity == "ad" and target.status and False in inspect(target).attrs.status.history.deleted:
+            action = "approve"
+        _append(connection, target, entity, action)
+
+    @event.listens_for(model, "after_delete")
+    def _deleted(mapper, connection, target):
+        _append(connection, target, entity, "delete")
+
+
+for _entity, (_model, _, _) in ENTITIES.items():
+    _listen(_model, _entity)
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _committed(session):
+    if session.info.pop(_PENDING, False):
+        for listener in list(listeners):
+            listener()
+
+
+@event.listens_for(OrmSession, "after_rollback")
+def _rolled_back(session):
+    session.info.pop(_PENDING, None)
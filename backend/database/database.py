@@ -1,15 +1,121 @@
+from decouple import config
+from sqlalchemy import event, inspect
+from sqlalchemy.engine import make_url
 from sqlmodel import SQLModel, create_engine, Session
+from database.search import create_search_index
+from database.geo import create_geo_index
+from database.ratings import rebuild_ratings
+from database.facets import rebuild_facets
+from database.similar import rebuild_similar
+from database.migrations import run_migrations
 
-DATABASE_URL = "sqlite:///database.db"
+DATABASE_URL = config("DATABASE_URL", default="sqlite:///database.db")
+DB_ECHO = config("DB_ECHO", cast=bool, default=False)
+DB_POOL_SIZE = config("DB_POOL_SIZE", cast=int, default=5)
+DB_MAX_OVERFLOW = config("DB_MAX_OVERFLOW", cast=int, default=10)
+DB_POOL_RECYCLE = config("DB_POOL_RECYCLE", cast=int, default=1800)
+DB_POOL_TIMEOUT = config("DB_POOL_TIMEOUT", cast=int, default=30)
+SQLITE_BUSY_TIMEOUT_MS = config("SQLITE_BUSY_TIMEOUT_MS", cast=int, default=5000)
+SQLITE_MMAP_SIZE = config("SQLITE_MMAP_SIZE", cast=int, default=256 * 1024 * 1024)
+# sqlite -> sqlite+aiosqlite, postgresql -> postgresql+asyncpg
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+
+def _engine_options(url: str) -> dict:
+    parsed = make_url(url)
+    options = {"echo": DB_ECHO, "pool_pre_ping": parsed.get_backend_name() != "sqlite"}
+    if parsed.get_backend_name() == "sqlite":
+        # sesje są używane z puli wątków FastAPI
+        options["connect_args"] = {"check_same_thread": False}
+        if parsed.database in (None, "", ":memory:"):
+            return options
+    options.update(
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_timeout=DB_POOL_TIMEOUT,
+    )
+    return options
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL pozwala czytać równolegle z jednym piszącym; NORMAL w trybie WAL jest trwałe
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.close()
+
+
+engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL))
+
+if engine.dialect.name == "sqlite":
+    event.listen(engine, "connect", _set_sqlite_pragmas)
 
-engine = create_engine(
-    DATABASE_URL,
-    echo=True
-)
 
 def create_db_and_tables():
+    existing_tables = set(inspect(engine).get_table_names())
     SQLModel.metadata.create_all(engine)
+    run_migrations(engine)
+    create_search_index(engine)
+    create_geo_index(engine)
+
+    if "adrating" not in existing_tables:
+        # pierwszy start z agregatami ocen - wypełniamy je z istniejących opinii
+        with Session(engine) as session:
+            rebuild_ratings(session)
+
+    if "categorycount" not in existing_tables:
+        with Session(engine) as session:
+            rebuild_facets(session)
+
+    if "adterm" not in existing_tables:
+        with Session(engine) as session:
+            rebuild_similar(session)
+
 
 def get_session():
     with Session(engine) as session:
-        yield session
\ No newline at end of file
+        yield session
+
+
+# Asynchroniczna ścieżka dla endpointów odczytu (aiosqlite / asyncpg), tworzona przy pierwszym użyciu.
+# Zapisy dalej idą przez synchroniczny engine z puli wątków FastAPI.
+_async_engine = None
+
+
+def async_database_url(url: str = DATABASE_URL) -> str:
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if parsed.get_driver_name() != parsed.get_dialect().driver or backend not in ASYNC_DRIVERS:
+        return url
+    return parsed.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+
+def get_async_engine():
+    global _async_engine
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        url = config("ASYNC_DATABASE_URL", default=async_database_url())
+        options = _engine_options(url)
+        options.pop("connect_args", None)
+        _async_engine = create_async_engine(url, **options)
+        if _async_engine.dialect.name == "sqlite":
+            event.listen(_async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+    return _async_engine
+
+
+async def get_async_session():
+    from sqlmodel.ext.asyncio.session import AsyncSession
+
+    async with AsyncSession(get_async_engine(), expire_on_commit=False) as session:
+        yield session
+
+
+async def dispose_async_engine():
+    global _async_engine
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
@@ -0,0 +1,159 @@
+from collections import Counter
+from datetime import date
+
+from sqlalchemy import delete, event, func, insert, inspect, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, col
+from database.models import Ad, AdCategory, Categories, CategoryCount
+
+# Liczby widocznych ogłoszeń (zatwierdzonych, niewygaszonych) w kategoriach dla /categories/facets.
+# Zapisy Ad i AdCategory przez ORM (handlery ogłoszeń, kategorii ogłoszeń i zatwierdzania)
+# aktualizują CategoryCount w zdarzeniach mappera niżej, w tej samej transakcji.
+# Zapisy zbiorowe (moderacja, wygaszanie, kaskady, import) same wołają add_ads /
+# remove_ads / add_links. rebuild_facets() przelicza wszystko od nowa.
+
+
+def visible():
+    return [Ad.status == True, col(Ad.expired_at).is_(None)]
+
+
+def _is_visible(status, expired_at) -> bool:
+    return bool(status) and expired_at is None
+
+
+UPSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+def _bump(conn, deltas: dict):
+    # jeden upsert dla wszystkich kategorii, niezależnie od liczby zmian
+    rows = [{"category_id": category_id, "ad_count": delta} for category_id, delta in deltas.items() if delta]
+    if not rows:
+        return
+    dialect = conn.get_bind().dialect if isinstance(conn, Session) else conn.dialect
+    statement = UPSERTS[dialect.name](CategoryCount).values(rows)
+    conn.execute(statement.on_conflict_do_update(
+        index_elements=[CategoryCount.category_id],
+        set_={"ad_count": CategoryCount.ad_count + statement.excluded.ad_count},
+    ))
+
+
+def _links_of_visible_ads(conn, ad_ids) -> dict:
+    rows = conn.execute(
+        select(AdCategory.category_id, func.count())
+        .join(Ad, col(Ad.ad_id) == col(AdCategory.ad_id))
+        .where(col(AdCategory.ad_id).in_(ad_ids), *visible())
+        .group_by(AdCategory.category_id)
+    ).tuples().all()
+    return dict(rows)
+
+
+def add_ads(session: Session, ad_ids):
+    # po tym, jak ogłoszenia stały się widoczne; ad_ids może być listą albo podzapytaniem
+    _bump(session, _links_of_visible_ads(session, ad_ids))
+
+
+def remove_ads(session: Session, ad_ids):
+    # zanim widoczne ogłoszenia zostaną ukryte albo usunięte
+    _bump(session, {category_id: -count for category_id, count in _links_of_visible_ads(session, ad_ids).items()})
+
+
+def add_links(session: Session, links: list[tuple[int, int]]):
+    # po masowym wstawieniu powiązań (ad_id, category_id)
+    ad_ids = {ad_id for ad_id, _ in links}
+    if not ad_ids:
+        return
+    shown = set(session.execute(select(Ad.ad_id).where(col(Ad.ad_id).in_(ad_ids), *visible())).scalars())
+    _bump(session, Counter(category_id for ad_id, category_id in links if ad_id in shown))
+
+
+def counts_statement():
+    return select(CategoryCount.category_id, CategoryCount.ad_count)
+
+
+def lagging_statement(today: date | None = None):
+    # widoczne ogłoszenia już po due_date, których expire_ads (co godzinę) jeszcze nie ukrył -
+    # odejmowane od liczników, żeby liczby od razu zgadzały się z ad_fields.active()
+    return (
+        select(AdCategory.category_id, func.count())
+        .join(Ad, col(Ad.ad_id) == col(AdCategory.ad_id))
+        .where(*visible(), col(Ad.due_on) < (today or date.today()))
+        .group_by(AdCategory.category_id)
+    )
+
+
+def category_counts(session: Session) -> dict:
+    return dict(session.execute(counts_statement()).tuples().all())
+
+
+def rebuild_facets(session: Session, repair: bool = True) -> list[int]:
+    # zwraca id kategorii, których licznik się rozjechał
+    actual = dict(session.execute(
+        select(AdCategory.category_id, func.count())
+        .join(Ad, col(Ad.ad_id) == col(AdCategory.ad_id))
+        .where(*visible())
+        .group_by(AdCategory.category_id)
+    ).tuples().all())
+    stored = {k: v for k, v in category_counts(session).items() if v}
+    drift = sorted(c for c in set(actual) | set(stored) if actual.get(c, 0) != stored.get(c, 0))
+    if repair:
+        session.execute(delete(CategoryCount))
+        if actual:
+            session.execute(insert(CategoryCount), [
+                {"category_id": category_id, "ad_count": count} for category_id, count in actual.items()
+            ])
+        session.commit()
+    return drift
+
+
+def _was_visible(state) -> bool:
+    # wartości sprzed tego flusha
+    def old(name):
+        history = state.attrs[name].history
+        return history.deleted[0] if history.deleted else getattr(state.object, name)
+    return _is_visible(old("status"), old("expired_at"))
+
+
+def _ad_visible(connection, ad_id) -> bool:
+    row = connection.execute(select(Ad.status, Ad.expired_at).where(Ad.ad_id == ad_id)).first()
+    return row is not None and _is_visible(*row)
+
+
+def _category_ids(connection, ad_id) -> list:
+    return list(connection.execute(select(AdCategory.category_id).where(AdCategory.ad_id == ad_id)).scalars())
+
+
+@event.listens_for(Ad, "after_update")
+def _ad_visibility_changed(mapper, connection, target):
+    was, now = _was_visible(inspect(target)), _is_visible(target.status, target.expired_at)
+    if was != now:
+        _bump(connection, {category_id: 1 if now else -1 for category_id in _category_ids(connection, target.ad_id)})
+
+
+@event.listens_for(Ad, "after_delete")
+def _ad_deleted(mapper, connection, target):
+    if _was_visible(inspect(target)):
+        _bump(connection, {category_id: -1 for category_id in _category_ids(connection, target.ad_id)})
+
+
+@event.listens_for(AdCategory, "after_insert")
+def _link_added(mapper, connection, target):
+    if _ad_visible(connection, target.ad_id):
+        _bump(connection, {target.category_id: 1})
+
+
+@event.listens_for(AdCategory, "after_update")
+def _link_moved(mapper, connection, target):
+    history = inspect(target).attrs.category_id.history
+    if history.deleted and _ad_visible(connection, target.ad_id):
+        _bump(connection, {history.deleted[0]: -1, target.category_id: 1})
+
+
+@event.listens_for(Categories, "after_delete")
+def _category_deleted(mapper, connection, target):
+    connection.execute(delete(CategoryCount).where(CategoryCount.category_id == target.category_id))
+
+
+@event.listens_for(AdCategory, "after_delete")
+def _link_removed(mapper, connection, target):
+    if _ad_visible(connection, target.ad_id):
+        _bump(connection, {target.category_id: -1})
@@ -0,0 +1,249 @@
+import csv
+import math
+import os
+import re
+
+from decouple import config
+from sqlalchemy import column, delete, event, inspect, select, table, text
+from sqlalchemy.exc import OperationalError
+from database.models import Ad, BusinessProfile
+from database.search import fold
+
+# "Ogłoszenia w pobliżu": adresy są geokodowane przy zapisie na podstawie lokalnego
+# skorowidza (najpierw prefiksy kodów pocztowych, potem nazwy miejscowości) do kolumn lat/lon.
+# Na SQLite współrzędne ogłoszeń trzymamy też w R*Tree (id == ad_id), aktualizowanym przez
+# zdarzenia mappera niżej, więc zapytanie o promień czyta tylko swój prostokąt.
+# Bez R*Tree prostokąt sprawdzamy na indeksie (lat, lon).
+
+GAZETTEER_PATH = config(
+    "GAZETTEER_PATH",
+    default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "gazetteer_pl.csv"),
+)
+GEO_DEFAULT_RADIUS_KM = config("GEO_DEFAULT_RADIUS_KM", cast=float, default=10)
+GEO_MAX_RADIUS_KM = config("GEO_MAX_RADIUS_KM", cast=float, default=300)
+
+RTREE_TABLE = "ad_geo"
+geo_table = table(RTREE_TABLE, column("id"), column("min_lat"), column("max_lat"), column("min_lon"), column("max_lon"))
+
+KM_PER_DEGREE_LAT = 110.574
+KM_PER_DEGREE_LON = 111.320
+EARTH_RADIUS_KM = 6371.0
+
+_POSTAL_RE = re.compile(r"\b(\d{2})-?(\d{3})\b")
+_WORD_RE = re.compile(r"[\w-]+")
+
+rtree_enabled = False
+_gazetteer = None
+
+
+def load_gazetteer(path: str = GAZETTEER_PATH) -> tuple[dict, list]:
+    # postal: prefiks ("30", "30-3", "30-376") -> punkt; cities: (znormalizowana nazwa, punkt), najdłuższe nazwy najpierw
+    postal, cities = {}, []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            point = (float(row["lat"]), float(row["lon"]))
+            if row["kind"] == "postal":
+                postal[row["key"]] = point
+            else:
+                cities.append((fold(row["key"]), point))
+    cities.sort(key=lambda city: len(city[0]), reverse=True)
+    return postal, cities
+
+
+def _get_gazetteer():
+    global _gazetteer
+    if _gazetteer is None:
+        _gazetteer = load_gazetteer()
+    return _gazetteer
+
+
+def geocode(address: str | None) -> tuple[float, float] | None:
+    if not address:
+        return None
+    postal, cities = _get_gazetteer()
+
+    match = _POSTAL_RE.search(address)
+    if match:
+        # wygrywa najdokładniejszy znany prefiks: 30-376, 30-37, 30-3, 30
+        code = f"{match.group(1)}-{match.group(2)}"
+        for length in (6, 5, 4):
+            if code[:length] in postal:
+                return postal[code[:length]]
+
+    folded = " " + " ".join(_WORD_RE.findall(fold(address))) + " "
+    for name, point in cities:
+        if f" {name} " in folded:
+            return point
+
+    if match and match.group(1) in postal:
+        return postal[match.group(1)]
+    return None
+
+
+def distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    # haversine - tylko dla zwróconych wierszy, samo zapytanie używa płaskiego przybliżenia niżej
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def bounding_box(lat: float, lon: float, radius_km: float) -> tuple[float, float, float, float]:
+    d_lat = radius_km / KM_PER_DEGREE_LAT
+    d_lon = radius_km / (KM_PER_DEGREE_LON * max(math.cos(math.radians(lat)), 0.01))
+    return lat - d_lat, lat + d_lat, lon - d_lon, lon + d_lon
+
+
+def near(lat: float, lon: float, radius_km: float):
+    # (warunki where, kwadrat odległości w km^2) dla ogłoszeń w promieniu radius_km od (lat, lon).
+    # Przybliżenie równoodległościowe - przy kilkuset km błąd jest dużo mniejszy niż 1%,
+    # a nie wymaga trygonometrii dla każdego wiersza, więc działa też na SQLite bez funkcji matematycznych.
+    min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius_km)
+    dy = (Ad.lat - lat) * KM_PER_DEGREE_LAT
+    dx = (Ad.lon - lon) * (KM_PER_DEGREE_LON * math.cos(math.radians(lat)))
+    distance2 = (dx * dx + dy * dy).label("distance2")
+
+    if rtree_enabled:
+        in_box = Ad.ad_id.in_(select(geo_table.c.id).where(
+            geo_table.c.max_lat >= min_lat, geo_table.c.min_lat <= max_lat,
+            geo_table.c.max_lon >= min_lon, geo_table.c.min_lon <= max_lon,
+        ))
+    else:
+        in_box = Ad.lat.between(min_lat, max_lat) & Ad.lon.between(min_lon, max_lon)
+    return [in_box, distance2 <= radius_km * radius_km], distance2
+
+
+def create_geo_index(engine):
+    global rtree_enabled
+    if engine.dialect.name != "sqlite":
+        rtree_enabled = False
+        return
+
+    with engine.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": RTREE_TABLE},
+        ).first()
+        try:
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {RTREE_TABLE} USING rtree(id, min_lat, max_lat, min_lon, max_lon)"
+            ))
+        except OperationalError:
+            # sqlite skompilowane bez R*Tree
+            rtree_enabled = False
+            return
+
+    rtree_enabled = True
+    if not exists:
+        rebuild_geo_index(engine)
+
+
+def rebuild_geo_index(engine):
+    with engine.begin() as conn:
+        conn.execute(text(f"DELETE FROM {RTREE_TABLE}"))
+        rows = conn.execute(text("SELECT ad_id, lat, lon FROM ad WHERE lat IS NOT NULL AND lon IS NOT NULL"))
+        batch = []
+        for ad_id, lat, lon in rows:
+            batch.append({"id": ad_id, "lat": lat, "lon": lon})
+            if len(batch) >= 5000:
+                _insert_rows(conn, batch)
+                batch = []
+        if batch:
+            _insert_rows(conn, batch)
+
+
+def business_points(session, bp_ids) -> dict:
+    if not bp_ids:
+        return {}
+    rows = session.execute(
+        select(BusinessProfile.bp_id, BusinessProfile.lat, BusinessProfile.lon)
+        .where(BusinessProfile.bp_id.in_(list(bp_ids)), BusinessProfile.lat.is_not(None))
+    ).tuples()
+    return {bp_id: (lat, lon) for bp_id, lat, lon in rows}
+
+
+def unindex_ads(session, ad_ids):
+    # masowe usuwanie omija zdarzenia mappera; ad_ids może być listą albo podzapytaniem
+    if rtree_enabled:
+        session.execute(delete(geo_table).where(geo_table.c.id.in_(ad_ids)))
+
+
+def index_ads(session, ads):
+    # masowe wstawianie też omija zdarzenia mappera; ads: (ad_id, lat, lon)
+    if rtree_enabled:
+        rows = [{"id": ad_id, "lat": lat, "lon": lon} for ad_id, lat, lon in ads if lat is not None]
+        if rows:
+            _insert_rows(session, rows)
+
+
+def _insert_rows(conn, rows):
+    conn.execute(
+        text(f"INSERT INTO {RTREE_TABLE}(id, min_lat, max_lat, min_lon, max_lon) VALUES (:id, :lat, :lat, :lon, :lon)"),
+        rows,
+    )
+
+
+def _delete_row(conn, ad_id):
+    conn.execute(text(f"DELETE FROM {RTREE_TABLE} WHERE id = :id"), {"id": ad_id})
+
+
+def _locate_ad(connection, target):
+    # własny adres ogłoszenia, a jeśli go brak - firma, do której należy
+    point = geocode(target.address)
+    if point is None and target.bp_id is not None:
+        point = connection.execute(
+            select(BusinessProfile.lat, BusinessProfile.lon)
+            .where(BusinessProfile.bp_id == target.bp_id, BusinessProfile.lat.is_not(None))
+        ).first()
+    target.lat, target.lon = point if point else (None, None)
+
+
+def _coordinates_set(state) -> bool:
+    return state.attrs.lat.history.has_changes() or state.attrs.lon.history.has_changes()
+
+
+@event.listens_for(BusinessProfile, "before_insert")
+def _geocode_new_business(mapper, connection, target):
+    if target.lat is None or target.lon is None:
+        target.lat, target.lon = geocode(target.address) or (None, None)
+
+
+@event.listens_for(BusinessProfile, "before_update")
+def _geocode_business(mapper, connection, target):
+    state = inspect(target)
+    if state.attrs.address.history.has_changes() and not _coordinates_set(state):
+        target.lat, target.lon = geocode(target.address) or (None, None)
+
+
+@event.listens_for(Ad, "before_insert")
+def _geocode_new_ad(mapper, connection, target):
+    # współrzędne wysłane przez klienta (np. z przeglądarki) zostają
+    if target.lat is None or target.lon is None:
+        _locate_ad(connection, target)
+
+
+@event.listens_for(Ad, "before_update")
+def _geocode_ad(mapper, connection, target):
+    state = inspect(target)
+    if state.attrs.address.history.has_changes() and not _coordinates_set(state):
+        _locate_ad(connection, target)
+
+
+@event.listens_for(Ad, "after_insert")
+def _index_new_ad(mapper, connection, target):
+    if rtree_enabled and target.lat is not None and target.lon is not None:
+        _insert_rows(connection, [{"id": target.ad_id, "lat": target.lat, "lon": target.lon}])
+
+
+@event.listens_for(Ad, "after_update")
+def _reindex_ad(mapper, connection, target):
+    if rtree_enabled and _coordinates_set(inspect(target)):
+        _delete_row(connection, target.ad_id)
+        if target.lat is not None and target.lon is not None:
+            _insert_rows(connection, [{"id": target.ad_id, "lat": target.lat, "lon": target.lon}])
+
+
+@event.listens_for(Ad, "after_delete")
+def _unindex_ad(mapper, connection, target):
+    if rtree_enabled:
+        _delete_row(connection, target.ad_id)
@@ -0,0 +1,175 @@
+from datetime import datetime
+
+from sqlalchemy import JSON, Column, DateTime, Integer, MetaData, String, Table, inspect, select, update
+from sqlmodel import SQLModel, Session
+
+# Proste migracje schematu, tylko do przodu.
+# create_all() tworzy jedynie brakujące tabele, więc zmiany w istniejących
+# (nowe indeksy, nowe kolumny) są wypisane tutaj i stosowane raz na bazę;
+# id wykonanych migracji trzymamy w tabeli schema_migrations.
+
+_migrations_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations", _migrations_metadata,
+    Column("migration_id", String, primary_key=True),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+MIGRATIONS = []
+
+
+def migration(migration_id: str):
+    def register(func):
+        MIGRATIONS.append((migration_id, func))
+        return func
+    return register
+
+
+def add_missing_indexes(conn):
+    # każdy Index zadeklarowany w modelach (index=True / __table_args__); indeksy na
+    # kolumnach, które doda dopiero późniejsza migracja, zostają dla niej
+    inspector = inspect(conn)
+    existing_tables = set(inspector.get_table_names())
+    for table in SQLModel.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_columns = {c["name"] for c in inspector.get_columns(table.name)}
+        for index in table.indexes:
+            if all(column.name in existing_columns for column in index.columns):
+                index.create(conn, checkfirst=True)
+
+
+def add_missing_column(conn, table_name: str, column_name: str):
+    # ALTER TABLE ... ADD COLUMN na podstawie definicji w modelu; nowe kolumny NOT NULL
+    # potrzebują server_default, żeby istniejące wiersze dostały wartość
+    if column_name in {c["name"] for c in inspect(conn).get_columns(table_name)}:
+        return
+    column = SQLModel.metadata.tables[table_name].columns[column_name]
+    preparer = conn.dialect.identifier_preparer
+    ddl = (f"ALTER TABLE {preparer.quote(table_name)} ADD COLUMN {preparer.quote(column_name)} "
+           f"{column.type.compile(conn.dialect)}")
+    if column.server_default is not None:
+        ddl += f" DEFAULT {column.server_default.arg}"
+    if not column.nullable:
+        ddl += " NOT NULL"
+    conn.exec_driver_sql(ddl)
+
+
+@migration("0001_secondary_indexes")
+def _secondary_indexes(conn):
+    add_missing_indexes(conn)
+
+
+@migration("0002_user_token_version")
+def _user_token_version(conn):
+    add_missing_column(conn, "user", "token_version")
+
+
+@migration("0003_ad_images_out_of_row")
+def _ad_images_out_of_row(conn):
+    # obrazy wklejone jako base64 trafiają do magazynu obrazów, w Ad.images zostają ich URL-e
+    import images
+
+    # tabela taka, jaka była w tym momencie, a nie obecny model - jego onupdate
+    # zapisywałby updated_at, które dodaje dopiero 0004
+    ad_table = Table("ad", MetaData(), Column("ad_id", Integer, primary_key=True), Column("images", JSON))
+    session = Session(bind=conn)
+    rows = conn.execute(select(ad_table.c.ad_id, ad_table.c.images)
+                        .where(ad_table.c.images.like("%data:image%"))).all()
+    for ad_id, ad_images in rows:
+        moved = images.normalize_images(session, ad_images)
+        session.flush()
+        conn.execute(update(ad_table).where(ad_table.c.ad_id == ad_id).values(images=moved))
+    # samej sesji nie commitujemy, zapis idzie razem z połączeniem migracji
+    images.write_files(session)
+
+
+@migration("0004_updated_at")
+def _updated_at(conn):
+    # istniejące wiersze dostają created_at (opinie go nie mają - dostają czas migracji)
+    now = datetime.utcnow()
+    for table_name in ("user", "businessprofile", "categories", "ad", "reviews"):
+        add_missing_column(conn, table_name, "updated_at")
+        table = SQLModel.metadata.tables[table_name]
+        conn.execute(update(table).where(table.c.updated_at.is_(None)).values(
+            updated_at=table.c.created_at if "created_at" in table.c else now
+        ))
+    add_missing_indexes(conn)
+
+
+
+@migration("0005_ad_moderation")
+def _ad_moderation(conn):
+    for column_name in ("rejected_at", "claimed_by", "claim_expires_at"):
+        add_missing_column(conn, "ad", column_name)
+
+
+@migration("0006_geocoding")
+def _geocoding(conn):
+    # najpierw firmy - ogłoszenia bez znanego adresu biorą położenie swojej firmy
+    from database import geo
+
+    for table_name in ("businessprofile", "ad"):
+        add_missing_column(conn, table_name, "lat")
+        add_missing_column(conn, table_name, "lon")
+    add_missing_indexes(conn)
+
+    bp_table = SQLModel.metadata.tables["businessprofile"]
+    points = {}
+    for bp_id, address in conn.execute(select(bp_table.c.bp_id, bp_table.c.address)).all():
+        point = geo.geocode(address)
+        if point:
+            points[bp_id] = point
+            conn.execute(update(bp_table).where(bp_table.c.bp_id == bp_id).values(lat=point[0], lon=point[1]))
+
+    ad_table = SQLModel.metadata.tables["ad"]
+    rows = conn.execute(select(ad_table.c.ad_id, ad_table.c.bp_id, ad_table.c.address)
+                        .where(ad_table.c.lat.is_(None))).all()
+    for ad_id, bp_id, address in rows:
+        point = geo.geocode(address) or points.get(bp_id)
+        if point:
+            conn.execute(update(ad_table).where(ad_table.c.ad_id == ad_id).values(lat=point[0], lon=point[1]))
+
+
+@migration("0007_typed_ad_fields")
+def _typed_ad_fields(conn):
+    # kolumny tekstowe zostają; typowane kopie są z nich parsowane
+    from database.ad_fields import typed_values
+
+    for column_name in ("price_amount", "price_currency", "post_on", "due_on", "expired_at"):
+        add_missing_column(conn, "ad", column_name)
+    add_missing_indexes(conn)
+
+    ad_table = SQLModel.metadata.tables["ad"]
+    rows = conn.execute(select(ad_table.c.ad_id, ad_table.c.price, ad_table.c.post_date, ad_table.c.due_date)).all()
+    for ad_id, price, post_date, due_date in rows:
+        conn.execute(update(ad_table).where(ad_table.c.ad_id == ad_id)
+                     .values(**typed_values(price, post_date, due_date)))
+
+
+def applied_migrations(conn) -> set:
+    _migrations_metadata.create_all(conn)
+    return set(conn.execute(select(schema_migrations.c.migration_id)).scalars())
+
+
+def pending_migrations(engine) -> list:
+    with engine.begin() as conn:
+        applied = applied_migrations(conn)
+    return [migration_id for migration_id, _ in MIGRATIONS if migration_id not in applied]
+
+
+def run_migrations(engine) -> list:
+    done = []
+    with engine.begin() as conn:
+        applied = applied_migrations(conn)
+    for migration_id, func in MIGRATIONS:
+        if migration_id in applied:
+            continue
+        # każda migracja jest commitowana razem ze swoim wierszem w schema_migrations
+        with engine.begin() as conn:
+            func(conn)
+            conn.execute(schema_migrations.insert().values(
+                migration_id=migration_id, applied_at=datetime.utcnow()
+            ))
+        done.append(migration_id)
+    return done
@@ -1,6 +1,6 @@
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional
-from sqlmodel import SQLModel, Field, Relationship, Column, JSON
+from sqlmodel import SQLModel, Field, Relationship, Column, JSON, Index
 from typing import List
 
 class User(SQLModel, table=True):
@@ -11,18 +11,28 @@ class User(SQLModel, table=True):
     hashed_password: str = Field(nullable=False)
     role: str = Field(nullable=False)
     created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
+    # zwiększane przy zmianie roli albo hasła; tokeny ze starszą wersją są odrzucane
+    token_version: int = Field(default=0, nullable=False, sa_column_kwargs={"server_default": "0"})
+    # ustawiane przy każdym UPDATE przez ORM/Core, używane przez eksporty przyrostowe (updated_since)
+    updated_at: Optional[datetime] = Field(default_factory=datetime.utcnow, index=True,
+                                           sa_column_kwargs={"onupdate": datetime.utcnow})
 
     businesses: list["BusinessProfile"] = Relationship(back_populates="user")
 
 
 class BusinessProfile(SQLModel, table=True):
     bp_id: int | None = Field(default=None, primary_key=True)
-    user_id: int = Field(nullable=False, foreign_key="user.user_id")
+    user_id: int = Field(nullable=False, foreign_key="user.user_id", index=True)
     bp_name: str = Field(nullable=False)
     description: Optional[str] = None
     address: str = Field(nullable=False)
     phone: str = Field(nullable=False)
     created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
+    updated_at: Optional[datetime] = Field(default_factory=datetime.utcnow, index=True,
+                                           sa_column_kwargs={"onupdate": datetime.utcnow})
+    # geokodowane z adresu przy zapisie (database/geo.py)
+    lat: Optional[float] = None
+    lon: Optional[float] = None
 
     user: "User" = Relationship(back_populates="businesses")
     ads: list["Ad"] = Relationship(back_populates="business_profile")
@@ -32,22 +42,50 @@ class Categories(SQLModel, table=True):
     category_id: int | None = Field(default=None, primary_key=True)
     category_name: str = Field(nullable=False)
     created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
+    updated_at: Optional[datetime] = Field(default_factory=datetime.utcnow, index=True,
+                                           sa_column_kwargs={"onupdate": datetime.utcnow})
 
     category: list["AdCategory"] = Relationship(back_populates="ad_category2")
 
 
 class Ad(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_ad_status_created_at", "status", "created_at"),
+        # wyszukiwanie w promieniu bez R*Tree z SQLite (database/geo.py)
+        Index("ix_ad_lat_lon", "lat", "lon"),
+        # active_only (status) + zakres cen / "wkrótce się kończy" (database/ad_fields.py)
+        Index("ix_ad_status_price_amount", "status", "price_amount"),
+        Index("ix_ad_status_due_on", "status", "due_on"),
+    )
+
     ad_id: int | None = Field(default=None, primary_key=True)
     ad_title: str = Field(nullable=False)
-    bp_id: int = Field(nullable=False, foreign_key="businessprofile.bp_id")
+    bp_id: int = Field(nullable=False, foreign_key="businessprofile.bp_id", index=True)
     description: Optional[str] = None
     images: List[str] = Field(sa_column=Column(JSON, nullable=False))
     price: str = Field(nullable=False)
     address: str = Field(nullable=False)
     post_date: str
     due_date: str
-    status: bool
-    created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
+    status: bool = Field(index=True)
+    created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False, index=True)
+    updated_at: Optional[datetime] = Field(default_factory=datetime.utcnow, index=True,
+                                           sa_column_kwargs={"onupdate": datetime.utcnow})
+    # moderacja: odrzucone ogłoszenia mają dalej status=False, ale wychodzą z kolejki; moderator
+    # bierze oczekujące ogłoszenia w dzierżawę (claimed_by do claim_expires_at), żeby nikt nie oceniał ich dwa razy
+    rejected_at: Optional[datetime] = None
+    claimed_by: Optional[int] = None
+    claim_expires_at: Optional[datetime] = None
+    # geokodowane z adresu (albo brane z firmy), chyba że wysłał je klient
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+    # parsowane z price / post_date / due_date przy każdym zapisie; price_amount w groszach
+    price_amount: Optional[int] = Field(default=None, index=True)
+    price_currency: Optional[str] = None
+    post_on: Optional[date] = None
+    due_on: Optional[date] = Field(default=None, index=True)
+    # ustawiane przez ad_fields.expire_ads, gdy minie due_on
+    expired_at: Optional[datetime] = None
 
     business_profile: "BusinessProfile" = Relationship(back_populates="ads")
     ad_category: list["AdCategory"] = Relationship(back_populates="ads2")
@@ -55,6 +93,11 @@ class Ad(SQLModel, table=True):
 
 
 class AdCategory(SQLModel, table=True):
+    # klucz główny (ad_id, category_id) obsługuje wyszukiwanie po ogłoszeniu
+    __table_args__ = (
+        Index("ix_adcategory_category_id_ad_id", "category_id", "ad_id"),
+    )
+
     ad_id: int = Field(primary_key=True, foreign_key="ad.ad_id")
     category_id: int = Field(primary_key=True, foreign_key="categories.category_id")
     created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
@@ -64,9 +107,83 @@ class AdCategory(SQLModel, table=True):
 
 class Reviews(SQLModel, table=True):
     review_id: int = Field(default=None, primary_key=True)
-    ad_id: int = Field(nullable=False, foreign_key="ad.ad_id")
+    ad_id: int = Field(nullable=False, foreign_key="ad.ad_id", index=True)
     title: str = Field(nullable=False)
     description: str = Field(nullable=False)
     rating: float = Field(nullable=False)
+    updated_at: Optional[datetime] = Field(default_factory=datetime.utcnow, index=True,
+                                           sa_column_kwargs={"onupdate": datetime.utcnow})
 
     ads3: "Ad" = Relationship(back_populates="reviews")
+
+
+# Zagregowane oceny, aktualizowane w tej samej transakcji co zapisy Reviews
+class AdRating(SQLModel, table=True):
+    ad_id: int = Field(primary_key=True, foreign_key="ad.ad_id")
+    rating_count: int = Field(default=0, nullable=False)
+    rating_sum: float = Field(default=0, nullable=False)
+    stars_1: int = Field(default=0, nullable=False)
+    stars_2: int = Field(default=0, nullable=False)
+    stars_3: int = Field(default=0, nullable=False)
+    stars_4: int = Field(default=0, nullable=False)
+    stars_5: int = Field(default=0, nullable=False)
+
+
+class BusinessRating(SQLModel, table=True):
+    bp_id: int = Field(primary_key=True, foreign_key="businessprofile.bp_id")
+    rating_count: int = Field(default=0, nullable=False)
+    rating_sum: float = Field(default=0, nullable=False)
+    stars_1: int = Field(default=0, nullable=False)
+    stars_2: int = Field(default=0, nullable=False)
+    stars_3: int = Field(default=0, nullable=False)
+    stars_4: int = Field(default=0, nullable=False)
+    stars_5: int = Field(default=0, nullable=False)
+
+
+# Widoczne (zatwierdzone, niewygaszone) ogłoszenia w kategorii, aktualizowane przez database/facets.py
+class CategoryCount(SQLModel, table=True):
+    category_id: int = Field(primary_key=True, foreign_key="categories.category_id")
+    ad_count: int = Field(default=0, nullable=False)
+
+
+# Indeks "podobnych ogłoszeń", aktualizowany przez database/similar.py: waga TF-IDF każdego
+# terminu (rdzenia słowa albo kategorii) ogłoszenia, znormalizowana (L2) w obrębie ogłoszenia
+class AdTerm(SQLModel, table=True):
+    __table_args__ = (
+        # listy wystąpień, najsilniejsze ogłoszenia dla terminu najpierw
+        Index("ix_adterm_term_weight", "term", "weight"),
+    )
+
+    ad_id: int = Field(primary_key=True, foreign_key="ad.ad_id")
+    term: str = Field(primary_key=True)
+    weight: float = Field(nullable=False)
+
+
+# Częstości dokumentowe terminów AdTerm z ostatniego rebuild_similar()
+class TermStat(SQLModel, table=True):
+    term: str = Field(primary_key=True)
+    doc_count: int = Field(nullable=False)
+
+
+# Dziennik zmian, dopisywany przez database/changes.py w tej samej transakcji co
+# zapis: jeden wiersz na utworzenie / edycję / zatwierdzenie / usunięcie ogłoszenia, użytkownika albo opinii
+class ChangeEvent(SQLModel, table=True):
+    # AUTOINCREMENT: seq nigdy nie jest używany ponownie, także po usunięciu starych zdarzeń
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    seq: int | None = Field(default=None, primary_key=True)
+    entity: str = Field(nullable=False)
+    entity_id: int = Field(nullable=False)
+    action: str = Field(nullable=False)
+    # wiersz taki, jak zwraca go API (AdRead / UserRead / ReviewRead), brak dla usunięć
+    data: Optional[dict] = Field(default=None, sa_column=Column(JSON))
+    created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False, index=True)
+
+
+# Magazyn obrazów adresowany treścią: pliki leżą w IMAGE_STORAGE_DIR pod nazwą z sha256
+class StoredImage(SQLModel, table=True):
+    image_hash: str = Field(primary_key=True)
+    content_type: str = Field(nullable=False)
+    byte_size: int = Field(nullable=False)
+    has_thumbnail: bool = Field(default=False, nullable=False)
+    created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
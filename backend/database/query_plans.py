@@ -0,0 +1,77 @@
+import re
+
+from sqlalchemy import func
+from sqlmodel import select, col
+from database.models import BusinessProfile, Ad, AdCategory, AdTerm, Reviews
+from database.ad_queries import AD_SORT_OPTIONS, filter_ads, feed_statement
+from pagination import DEFAULT_PAGE_SIZE, PageParams, apply_keyset
+import moderation
+
+# Zapytania z filtrami za najczęściej wołanymi endpointami z main.py. Na SQLite
+# każde musi iść przez indeks - `python manage.py explain` kończy się błędem,
+# gdy EXPLAIN QUERY PLAN pokazuje zwykły skan tabeli. Listy ogłoszeń budują te
+# same funkcje co handlery (database/ad_queries.py, apply_keyset), więc
+# sprawdzane jest dokładnie to zapytanie, które wykonuje endpoint.
+
+
+def _page(statement, sort=None, sort_options=AD_SORT_OPTIONS, default_sort=None):
+    # pierwsza strona, z sortowaniem i limitem jak w paginate() / GET /feed
+    page = PageParams(limit=DEFAULT_PAGE_SIZE, sort=sort)
+    return apply_keyset(statement, page, [Ad.__table__.c.ad_id], sort_options, default_sort)[0]
+
+
+def _ads(base=None, sort=None, search=None, category_id=None, **filters):
+    statement, sort_options, default_sort = filter_ads(select(Ad) if base is None else base, search,
+                                                       category_id, **filters)
+    return _page(statement, sort, sort_options, default_sort)
+
+
+HOT_QUERIES = {
+    "GET /businesses/user/{user_id}": select(BusinessProfile).where(BusinessProfile.user_id == 1),
+    "GET /businesses/{bp_id}/ads": _page(select(Ad).where(Ad.bp_id == 1)),
+    "GET /ads/user/{user_id}": _page(
+        select(Ad).join(BusinessProfile, col(BusinessProfile.bp_id) == col(Ad.bp_id))
+        .where(BusinessProfile.user_id == 1)
+    ),
+    "GET /users/{user_id}/dashboard (ads)": select(
+        Ad.ad_id, func.row_number().over(partition_by=Ad.bp_id, order_by=col(Ad.created_at).desc())
+    ).where(col(Ad.bp_id).in_(select(BusinessProfile.bp_id).where(BusinessProfile.user_id == 1))),
+    "GET /ads/status/{status}?sort=created_at": _page(select(Ad).where(Ad.status == False), "created_at"),
+    "GET /ads/pending": _page(moderation.pending(select(Ad)), default_sort="created_at"),
+    "GET /feed": _ads(feed_statement()),
+    "GET /feed?category_id=": _ads(feed_statement(), category_id=1),
+    "GET /ads?category_id=": _ads(category_id=1),
+    "GET /ads?lat=&lon=&radius_km=": _ads(near=(50.06, 19.94, 10)),
+    "GET /ads?active_only=true&sort=due_date": _ads(sort="due_date", active_only=True),
+    "GET /ads?min_price=&max_price=&sort=price": _ads(sort="price", min_price=10, max_price=50),
+    "expire-ads": select(Ad.ad_id).where(col(Ad.expired_at).is_(None), col(Ad.due_on) < "2026-01-01"),
+    "GET /ad_categories/by_category/{category_id}": select(AdCategory).where(AdCategory.category_id == 1),
+    "GET /ad_categories/by_ad/{ad_id}": select(AdCategory).where(AdCategory.ad_id == 1),
+    "GET /reviews/ad/{ad_id}": select(Reviews).where(Reviews.ad_id == 1),
+    "GET /ads/{ad_id}/similar (terms)": (
+        select(AdTerm.term, AdTerm.weight).where(AdTerm.ad_id == 1).order_by(col(AdTerm.weight).desc())
+    ),
+    "GET /ads/{ad_id}/similar (postings)": (
+        select(AdTerm.ad_id, AdTerm.weight).where(AdTerm.term == "koszen").order_by(col(AdTerm.weight).desc())
+    ),
+    "DELETE /businesses/{bp_id} (reviews)": select(Reviews.review_id).where(
+        col(Reviews.ad_id).in_(select(Ad.ad_id).where(Ad.bp_id == 1))
+    ),
+}
+
+_FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+
+
+def explain(conn, statement) -> list[str]:
+    sql = str(statement.compile(conn, compile_kwargs={"literal_binds": True}))
+    return [row[-1] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql)]
+
+
+def check_query_plans(engine) -> list[tuple[str, list[str], bool]]:
+    results = []
+    with engine.connect() as conn:
+        for name, statement in HOT_QUERIES.items():
+            plan = explain(conn, statement)
+            uses_index = not any(_FULL_SCAN.match(step) for step in plan)
+            results.append((name, plan, uses_index))
+    return results
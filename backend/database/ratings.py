@@ -0,0 +1,135 @@
+from sqlalchemy import case, delete, func, insert, update
+from sqlmodel import Session, select
+from database.models import Ad, AdRating, BusinessRating, Reviews
+
+# Zagregowane oceny ogłoszeń i firm (liczba, suma, rozkład gwiazdek).
+# Handlery wołają record_review/forget_review przed commitem, więc agregaty
+# zmieniają się w tej samej transakcji co sam wiersz Reviews.
+# rebuild_ratings() przelicza wszystko od nowa z Reviews, żeby wykryć/naprawić rozjazd.
+
+STAR_COLUMNS = ["stars_1", "stars_2", "stars_3", "stars_4", "stars_5"]
+AGGREGATE_COLUMNS = ["rating_count", "rating_sum"] + STAR_COLUMNS
+
+
+def star_bucket(rating: float) -> int:
+    # te same progi co _star_case() niżej
+    for stars, upper in enumerate((1.5, 2.5, 3.5, 4.5), start=1):
+        if rating < upper:
+            return stars
+    return 5
+
+
+def summary(aggregate) -> dict:
+    if aggregate is None:
+        return {"average": 0, "count": 0, "sum": 0, "histogram": {str(i): 0 for i in range(1, 6)}}
+    count = aggregate.rating_count
+    return {
+        "average": aggregate.rating_sum / count if count else 0,
+        "count": count,
+        "sum": aggregate.rating_sum,
+        "histogram": {str(i): getattr(aggregate, f"stars_{i}") for i in range(1, 6)},
+    }
+
+
+def _bump(session: Session, model, key_column, key, deltas: dict):
+    values = {name: getattr(model, name) + delta for name, delta in deltas.items()}
+    result = session.execute(update(model).where(key_column == key).values(values))
+    if result.rowcount == 0:
+        session.execute(insert(model).values({key_column.key: key, **deltas}))
+
+
+def _apply(session: Session, ad_id: int, rating: float, sign: int):
+    ad = session.get(Ad, ad_id)
+    if ad is None:
+        return
+    deltas = {"rating_count": sign, "rating_sum": sign * rating, f"stars_{star_bucket(rating)}": sign}
+    _bump(session, AdRating, AdRating.ad_id, ad_id, deltas)
+    _bump(session, BusinessRating, BusinessRating.bp_id, ad.bp_id, deltas)
+
+
+def record_review(session: Session, ad_id: int, rating: float):
+    _apply(session, ad_id, rating, 1)
+
+
+def forget_review(session: Session, ad_id: int, rating: float):
+    _apply(session, ad_id, rating, -1)
+
+
+def move_ad_ratings(session: Session, ad_id: int, old_bp_id: int, new_bp_id: int):
+    aggregate = session.get(AdRating, ad_id)
+    if aggregate is None or old_bp_id == new_bp_id:
+        return
+    deltas = {name: getattr(aggregate, name) for name in AGGREGATE_COLUMNS}
+    _bump(session, BusinessRating, BusinessRating.bp_id, old_bp_id, {k: -v for k, v in deltas.items()})
+    _bump(session, BusinessRating, BusinessRating.bp_id, new_bp_id, deltas)
+
+
+def drop_ad_ratings(session: Session, ad_ids: list[int]):
+    # ogłoszenia są usuwane razem z ich opiniami
+    aggregates = session.exec(select(AdRating, Ad.bp_id).join(Ad, Ad.ad_id == AdRating.ad_id)
+                              .where(AdRating.ad_id.in_(ad_ids))).all()
+    for aggregate, bp_id in aggregates:
+        deltas = {name: -getattr(aggregate, name) for name in AGGREGATE_COLUMNS}
+        _bump(session, BusinessRating, BusinessRating.bp_id, bp_id, deltas)
+    session.execute(delete(AdRating).where(AdRating.ad_id.in_(ad_ids)))
+
+
+def drop_business_ratings(session: Session, bp_ids: list[int]):
+    ad_ids = select(Ad.ad_id).where(Ad.bp_id.in_(bp_ids))
+    session.execute(delete(AdRating).where(AdRating.ad_id.in_(ad_ids)))
+    session.execute(delete(BusinessRating).where(BusinessRating.bp_id.in_(bp_ids)))
+
+
+def _star_case(stars: int):
+    bucket = case(
+        (Reviews.rating < 1.5, 1), (Reviews.rating < 2.5, 2),
+        (Reviews.rating < 3.5, 3), (Reviews.rating < 4.5, 4),
+        else_=5,
+    )
+    return func.coalesce(func.sum(case((bucket == stars, 1), else_=0)), 0)
+
+
+def _computed(session: Session, key_column, statement):
+    columns = [func.count(Reviews.review_id), func.coalesce(func.sum(Reviews.rating), 0.0)]
+    columns += [_star_case(stars) for stars in range(1, 6)]
+    rows = session.execute(statement.add_columns(*columns).group_by(key_column)).all()
+    return {row[0]: dict(zip(AGGREGATE_COLUMNS, row[1:])) for row in rows}
+
+
+def _stored(session: Session, model, key_column):
+    return {
+        getattr(row, key_column.key): {name: getattr(row, name) for name in AGGREGATE_COLUMNS}
+        for row in session.exec(select(model)).all()
+    }
+
+
+def _drift(expected: dict, stored: dict) -> list:
+    zero = dict.fromkeys(AGGREGATE_COLUMNS, 0)
+    drifted = []
+    for key in expected.keys() | stored.keys():
+        want = expected.get(key, zero)
+        have = stored.get(key, zero)
+        if any(abs(want[name] - have[name]) > 1e-6 for name in AGGREGATE_COLUMNS):
+            drifted.append(key)
+    return sorted(drifted)
+
+
+def rebuild_ratings(session: Session, repair: bool = True) -> dict:
+    expected_ads = _computed(session, Reviews.ad_id, select(Reviews.ad_id))
+    expected_bps = _computed(
+        session, Ad.bp_id, select(Ad.bp_id).join(Reviews, Reviews.ad_id == Ad.ad_id)
+    )
+    drift = {
+        "ads": _drift(expected_ads, _stored(session, AdRating, AdRating.ad_id)),
+        "businesses": _drift(expected_bps, _stored(session, BusinessRating, BusinessRating.bp_id)),
+    }
+
+    if repair and (drift["ads"] or drift["businesses"]):
+        session.execute(delete(AdRating))
+        session.execute(delete(BusinessRating))
+        if expected_ads:
+            session.execute(insert(AdRating), [{"ad_id": k, **v} for k, v in expected_ads.items()])
+        if expected_bps:
+            session.execute(insert(BusinessRating), [{"bp_id": k, **v} for k, v in expected_bps.items()])
+        session.commit()
+    return drift
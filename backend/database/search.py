@@ -0,0 +1,144 @@
+import re
+
+from sqlalchemy import column, delete, event, inspect, table, text, Float, Integer
+from sqlalchemy.exc import OperationalError
+from database.models import Ad
+
+# Wyszukiwanie pełnotekstowe po Ad.ad_title / Ad.description.
+# Na SQLite tekst jest indeksowany w wirtualnej tabeli FTS5 (rowid == ad_id),
+# aktualizowanej przez zdarzenia mappera niżej, w tej samej transakcji co zapis.
+# Inne bazy (albo SQLite bez FTS5) używają ILIKE w main.py.
+
+FTS_TABLE = "ad_fts"
+fts_table = table(FTS_TABLE, column("rowid"))
+
+# ł/Ł nie mają rozkładu w unicode, więc remove_diacritics z unicode61 ich nie
+# zamieni - sami usuwamy polskie znaki przed indeksowaniem i wyszukiwaniem.
+_POLISH_FOLD = str.maketrans("ąćęłńóśźżĄĆĘŁŃÓŚŹŻ", "acelnoszzACELNOSZZ")
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+fts_enabled = False
+
+
+def fold(value: str | None) -> str:
+    if not value:
+        return ""
+    return value.translate(_POLISH_FOLD).lower()
+
+
+def build_match_query(search: str) -> str | None:
+    # każde słowo musi pasować, ostatnie także jako prefiks ("kwi" -> kwiaty)
+    tokens = _TOKEN_RE.findall(fold(search))
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens[:-1]]
+    terms.append(f'"{tokens[-1]}"*')
+    return " ".join(terms)
+
+
+def create_search_index(engine):
+    global fts_enabled
+    if engine.dialect.name != "sqlite":
+        fts_enabled = False
+        return
+
+    with engine.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": FTS_TABLE},
+        ).first()
+        try:
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                "ad_title, description, "
+                "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+            ))
+        except OperationalError:
+            # sqlite skompilowane bez FTS5
+            fts_enabled = False
+            return
+
+    fts_enabled = True
+    if not exists:
+        rebuild_search_index(engine)
+
+
+def rebuild_search_index(engine):
+    with engine.begin() as conn:
+        conn.execute(text(f"DELETE FROM {FTS_TABLE}"))
+        rows = conn.execute(text("SELECT ad_id, ad_title, description FROM ad"))
+        batch = []
+        for ad_id, title, description in rows:
+            batch.append({"id": ad_id, "title": fold(title), "description": fold(description)})
+            if len(batch) >= 5000:
+                _insert_rows(conn, batch)
+                batch = []
+        if batch:
+            _insert_rows(conn, batch)
+
+
+def search_subquery(search: str):
+    # (ad_id, rank) pasujących ogłoszeń; niższy rank == lepsze dopasowanie, tytuł waży więcej
+    match = build_match_query(search)
+    if match is None:
+        return None
+    return text(
+        f"SELECT rowid AS ad_id, bm25({FTS_TABLE}, 10.0, 1.0) AS rank "
+        f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match"
+    ).bindparams(match=match).columns(ad_id=Integer, rank=Float).subquery("ad_search")
+
+
+def unindex_ads(session, ad_ids):
+    # masowe usuwanie omija zdarzenia mappera; ad_ids może być listą albo podzapytaniem
+    if fts_enabled:
+        session.execute(delete(fts_table).where(fts_table.c.rowid.in_(ad_ids)))
+
+
+def index_ads(session, ads):
+    # masowe wstawianie też omija zdarzenia mappera; ads: (ad_id, ad_title, description)
+    if fts_enabled and ads:
+        _insert_rows(session, [
+            {"id": ad_id, "title": fold(title), "description": fold(description)}
+            for ad_id, title, description in ads
+        ])
+
+
+def _insert_rows(conn, rows):
+    conn.execute(
+        text(f"INSERT INTO {FTS_TABLE}(rowid, ad_title, description) VALUES (:id, :title, :description)"),
+        rows,
+    )
+
+
+def _delete_row(conn, ad_id):
+    conn.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {"id": ad_id})
+
+
+@event.listens_for(Ad, "after_insert")
+def _index_new_ad(mapper, connection, target):
+    if fts_enabled:
+        _insert_rows(connection, [{
+            "id": target.ad_id,
+            "title": fold(target.ad_title),
+            "description": fold(target.description),
+        }])
+
+
+@event.listens_for(Ad, "after_update")
+def _reindex_ad(mapper, connection, target):
+    state = inspect(target)
+    changed = (state.attrs.ad_title.history.has_changes()
+               or state.attrs.description.history.has_changes())
+    if fts_enabled and changed:
+        _delete_row(connection, target.ad_id)
+        _insert_rows(connection, [{
+            "id": target.ad_id,
+            "title": fold(target.ad_title),
+            "description": fold(target.description),
+        }])
+
+
+@event.listens_for(Ad, "after_delete")
+def _unindex_ad(mapper, connection, target):
+    if fts_enabled:
+        _delete_row(connection, target.ad_id)
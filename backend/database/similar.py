@@ -0,0 +1,247 @@
+import math
+import re
+from collections import Counter
+from functools import lru_cache
+
+from decouple import config
+from sqlalchemy import delete, event, insert, inspect, select, text, Float, Integer
+from sqlmodel import Session, col
+from database.models import Ad, AdCategory, AdTerm, Categories, TermStat
+from database.facets import visible
+from database.search import fold
+
+# "Podobne ogłoszenia" (GET /ads/{ad_id}/similar): każde ogłoszenie to rzadki wektor
+# TF-IDF po rdzeniach słów z tytułu i opisu oraz po jego kategoriach, zapisany
+# jako jeden wiersz AdTerm na termin i znormalizowany (L2), więc iloczyn skalarny
+# dwóch ogłoszeń to ich podobieństwo cosinusowe. Zapisy Ad i AdCategory przez ORM
+# indeksują ogłoszenie na nowo w zdarzeniach mappera niżej, w tej samej transakcji;
+# zapisy zbiorowe (import, kaskady) same wołają index_ads / reindex_ads / unindex_ads.
+# Częstości dokumentowe (TermStat) to migawka z ostatniego rebuild_similar() -
+# nowe i edytowane ogłoszenia są nią ważone, okresowe przeliczenie ją odświeża.
+# Wyszukanie czyta tylko SIMILAR_POSTING_LIMIT najsilniejszych wpisów dla
+# SIMILAR_QUERY_TERMS najsilniejszych terminów ogłoszenia, więc jego koszt nie
+# rośnie z liczbą ogłoszeń. Indeksujemy wszystkie, widoczność sprawdzamy przy wyszukaniu.
+
+SIMILAR_MAX_TERMS = config("SIMILAR_MAX_TERMS", cast=int, default=24)
+SIMILAR_QUERY_TERMS = config("SIMILAR_QUERY_TERMS", cast=int, default=8)
+SIMILAR_POSTING_LIMIT = config("SIMILAR_POSTING_LIMIT", cast=int, default=250)
+# ilu kandydatów na jedno zwracane ogłoszenie sprawdzamy pod kątem widoczności (ukryte pomijamy)
+SIMILAR_CANDIDATE_FACTOR = config("SIMILAR_CANDIDATE_FACTOR", cast=int, default=5)
+SIMILAR_REBUILD_CHUNK_SIZE = config("SIMILAR_REBUILD_CHUNK_SIZE", cast=int, default=2000)
+
+# prymitywne obcinanie końcówek fleksyjnych: koszenie / koszenia / koszeniem -> koszen
+STEM_LENGTH = 6
+TITLE_WEIGHT = 2
+CATEGORY_WEIGHT = 2
+# wiersz TermStat z liczbą ogłoszeń, z których policzono częstości
+DOC_COUNT_TERM = ""
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_BULK = {"synchronize_session": False}
+# terminów na jedno IN (...) - sporo poniżej limitu parametrów SQLite
+_IN_CHUNK_SIZE = 500
+
+
+def category_term(category_id: int) -> str:
+    # słowa nigdy nie zawierają '#'
+    return f"#{category_id}"
+
+
+def _stems(value: str | None):
+    for token in _TOKEN_RE.findall(fold(value)):
+        if len(token) >= 3 and not token.isdigit():
+            yield token[:STEM_LENGTH]
+
+
+def term_counts(title: str | None, description: str | None, category_ids) -> Counter:
+    counts = Counter()
+    for stem in _stems(title):
+        counts[stem] += TITLE_WEIGHT
+    counts.update(_stems(description))
+    for category_id in category_ids:
+        counts[category_term(category_id)] += CATEGORY_WEIGHT
+    return counts
+
+
+def weights(counts: Counter, doc_counts: dict, total: int) -> dict:
+    # logarytmiczne tf * wygładzone idf (terminy nieznane migawce liczą się jako najrzadsze),
+    # SIMILAR_MAX_TERMS najsilniejszych terminów, znormalizowane do długości 1
+    scored = {
+        term: (1 + math.log(count)) * (math.log((1 + total) / (1 + doc_counts.get(term, 0))) + 1)
+        for term, count in counts.items()
+    }
+    strongest = sorted(scored.items(), key=lambda item: (-item[1], item[0]))[:SIMILAR_MAX_TERMS]
+    norm = math.sqrt(sum(weight * weight for _, weight in strongest))
+    return {term: weight / norm for term, weight in strongest} if norm else {}
+
+
+def _load_counts(conn, ad_ids: list[int]) -> dict:
+    # ad_id -> liczności terminów, odczytane z bazy
+    categories = {}
+    for ad_id, category_id in conn.execute(
+        select(AdCategory.ad_id, AdCategory.category_id).where(col(AdCategory.ad_id).in_(ad_ids))
+    ).tuples():
+        categories.setdefault(ad_id, []).append(category_id)
+    rows = conn.execute(select(Ad.ad_id, Ad.ad_title, Ad.description).where(col(Ad.ad_id).in_(ad_ids))).tuples()
+    return {ad_id: term_counts(title, description, categories.get(ad_id, ())) for ad_id, title, description in rows}
+
+
+def _doc_counts(conn, terms: set) -> tuple[dict, int]:
+    doc_counts = {}
+    terms = sorted(terms | {DOC_COUNT_TERM})
+    for start in range(0, len(terms), _IN_CHUNK_SIZE):
+        doc_counts.update(conn.execute(
+            select(TermStat.term, TermStat.doc_count).where(col(TermStat.term).in_(terms[start:start + _IN_CHUNK_SIZE]))
+        ).tuples().all())
+    return doc_counts, doc_counts.pop(DOC_COUNT_TERM, 0)
+
+
+def _replace(conn, vectors: dict, doc_counts: dict, total: int):
+    # vectors: ad_id -> liczności terminów; zapisane terminy tych ogłoszeń są podmieniane
+    if not vectors:
+        return
+    conn.execute(delete(AdTerm).where(col(AdTerm.ad_id).in_(list(vectors))), execution_options=_BULK)
+    rows = [
+        {"ad_id": ad_id, "term": term, "weight": weight}
+        for ad_id, counts in vectors.items()
+        for term, weight in weights(counts, doc_counts, total).items()
+    ]
+    if rows:
+        conn.execute(insert(AdTerm), rows)
+
+
+def _write(conn, vectors: dict):
+    doc_counts, total = _doc_counts(conn, {term for counts in vectors.values() for term in counts})
+    _replace(conn, vectors, doc_counts, total)
+
+
+def index_ads(session: Session, ads):
+    # masowe wstawianie omija zdarzenia mappera; ads: (ad_id, ad_title, description, category_ids)
+    _write(session, {ad_id: term_counts(title, description, category_ids)
+                     for ad_id, title, description, category_ids in ads})
+
+
+def reindex_ads(session: Session, ad_ids):
+    # po zbiorowych zmianach kategorii ogłoszeń
+    _write(session, _load_counts(session, list(ad_ids)))
+
+
+def unindex_ads(session: Session, ad_ids):
+    # ad_ids może być listą albo podzapytaniem
+    session.execute(delete(AdTerm).where(col(AdTerm.ad_id).in_(ad_ids)), execution_options=_BULK)
+
+
+def _ad_chunks(session: Session):
+    last = 0
+    while True:
+        ad_ids = session.execute(
+            select(Ad.ad_id).where(Ad.ad_id > last).order_by(col(Ad.ad_id)).limit(SIMILAR_REBUILD_CHUNK_SIZE)
+        ).scalars().all()
+        if not ad_ids:
+            return
+        yield _load_counts(session, ad_ids)
+        last = ad_ids[-1]
+
+
+def rebuild_similar(session: Session) -> int:
+    # Dwa przebiegi: częstości dokumentowe, potem na ich podstawie wagi każdego ogłoszenia.
+    # Każda porcja ogłoszeń to osobna krótka transakcja, żeby nie blokować zapisów
+    # na cały czas przeliczania. Zwraca liczbę zaindeksowanych ogłoszeń.
+    doc_counts, total = Counter(), 0
+    for vectors in _ad_chunks(session):
+        for counts in vectors.values():
+            doc_counts.update(counts.keys())
+        total += len(vectors)
+
+    session.execute(delete(TermStat))
+    stats = [{"term": term, "doc_count": count} for term, count in doc_counts.items()]
+    stats.append({"term": DOC_COUNT_TERM, "doc_count": total})
+    for start in range(0, len(stats), 10_000):
+        session.execute(insert(TermStat), stats[start:start + 10_000])
+    session.commit()
+
+    for vectors in _ad_chunks(session):
+        _replace(session, vectors, doc_counts, total)
+        session.commit()
+    # terminy ogłoszeń usuniętych w międzyczasie
+    session.execute(delete(AdTerm).where(col(AdTerm.ad_id).not_in(select(Ad.ad_id))), execution_options=_BULK)
+    session.commit()
+    return total
+
+
+def query_terms_statement(ad_id: int):
+    # (termin, waga) najsilniejszych terminów ad_id
+    return (
+        select(AdTerm.term, AdTerm.weight)
+        .where(AdTerm.ad_id == ad_id)
+        .order_by(col(AdTerm.weight).desc())
+        .limit(SIMILAR_QUERY_TERMS)
+    )
+
+
+@lru_cache(maxsize=None)
+def _scores_sql(term_count: int):
+    # Zwykły SQL, jedno zapytanie na każdą liczbę terminów: budowanie zagnieżdżonych
+    # selectów przez expression API trwało tyle co ich wykonanie. LIMIT wewnątrz
+    # złożonego selecta musi na SQLite siedzieć w podzapytaniu.
+    postings = " UNION ALL ".join(
+        f"SELECT * FROM (SELECT ad_id, weight * :weight_{i} AS score FROM {AdTerm.__tablename__} "
+        f"WHERE term = :term_{i} ORDER BY weight DESC LIMIT :posting_limit)"
+        for i in range(term_count)
+    )
+    return text(
+        f"SELECT ad_id, SUM(score) AS score FROM ({postings}) AS postings WHERE ad_id != :ad_id "
+        "GROUP BY ad_id ORDER BY score DESC LIMIT :candidates"
+    )
+
+
+def similar_statement(ad_id: int, query_terms: list[tuple[str, float]], limit: int):
+    # (Ad, score) widocznych ogłoszeń najbardziej podobnych do ad_id, najlepsze najpierw;
+    # score to podobieństwo cosinusowe ograniczone do terminów zapytania. Widoczność
+    # sprawdzamy tylko u najlepszych kandydatów.
+    params = {"ad_id": ad_id, "posting_limit": SIMILAR_POSTING_LIMIT, "candidates": limit * SIMILAR_CANDIDATE_FACTOR}
+    for i, (term, weight) in enumerate(query_terms):
+        params[f"term_{i}"] = term
+        params[f"weight_{i}"] = weight
+    scores = (
+        _scores_sql(len(query_terms)).bindparams(**params)
+        .columns(ad_id=Integer, score=Float).subquery("scores")
+    )
+    return (
+        select(Ad, scores.c.score)
+        .join(scores, col(Ad.ad_id) == scores.c.ad_id)
+        .where(*visible())
+        .order_by(scores.c.score.desc(), col(Ad.ad_id))
+        .limit(limit)
+    )
+
+
+@event.listens_for(Ad, "after_insert")
+def _index_new_ad(mapper, connection, target):
+    # kategorie są podpinane później, dodają je zdarzenia AdCategory niżej
+    _write(connection, {target.ad_id: term_counts(target.ad_title, target.description, ())})
+
+
+@event.listens_for(Ad, "after_update")
+def _reindex_ad(mapper, connection, target):
+    state = inspect(target)
+    if state.attrs.ad_title.history.has_changes() or state.attrs.description.history.has_changes():
+        _write(connection, _load_counts(connection, [target.ad_id]))
+
+
+@event.listens_for(Ad, "after_delete")
+def _unindex_ad(mapper, connection, target):
+    connection.execute(delete(AdTerm).where(AdTerm.ad_id == target.ad_id))
+
+
+@event.listens_for(AdCategory, "after_insert")
+@event.listens_for(AdCategory, "after_update")
+@event.listens_for(AdCategory, "after_delete")
+def _ad_categories_changed(mapper, connection, target):
+    _write(connection, _load_counts(connection, [target.ad_id]))
+
+
+@event.listens_for(Categories, "after_delete")
+def _category_deleted(mapper, connection, target):
+    # jej powiązania usunięto zbiorowo; pozostałe wagi znormalizuje następne przeliczenie
+    connection.execute(delete(AdTerm).where(AdTerm.term == category_term(target.category_id)))
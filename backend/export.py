@@ -0,0 +1,100 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, timezone
+from typing import Iterator, Optional
+
+from decouple import config
+from sqlmodel import Session, select
+from database.models import User, BusinessProfile, Categories, Ad, AdCategory, Reviews
+from schemas import UserRead, BusinessRead, CategoryRead, AdRead, AdCategoryRead, ReviewRead
+from serialization import dumps
+
+# Eksporty strumieniowe: wiersze są pobierane po EXPORT_BATCH_SIZE z kursora
+# po stronie serwera (stream_results + yield_per) i kodowane porcja po porcji,
+# więc zużycie pamięci nie zależy od rozmiaru tabeli.
+
+EXPORT_BATCH_SIZE = config("EXPORT_BATCH_SIZE", cast=int, default=1000)
+
+# encja -> (model, schemat odczytu, kolumna dla updated_since)
+EXPORTS = {
+    "users": (User, UserRead, "updated_at"),
+    "businesses": (BusinessProfile, BusinessRead, "updated_at"),
+    "categories": (Categories, CategoryRead, "updated_at"),
+    "ads": (Ad, AdRead, "updated_at"),
+    "ad_categories": (AdCategory, AdCategoryRead, "created_at"),
+    "reviews": (Reviews, ReviewRead, "updated_at"),
+}
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+
+def _as_utc_naive(value: datetime) -> datetime:
+    # znaczniki czasu są w bazie jako UTC bez strefy
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def export_statement(entity: str, updated_since: Optional[datetime] = None):
+    model, schema, changed_column = EXPORTS[entity]
+    table = model.__table__
+    columns = [c for c in table.columns if c.name in schema.model_fields]
+    statement = select(*columns).order_by(*table.primary_key.columns)
+    if updated_since is not None:
+        statement = statement.where(table.columns[changed_column] >= _as_utc_naive(updated_since))
+    return statement, [c.name for c in columns]
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def _ndjson_batches(names: list, batches) -> Iterator[bytes]:
+    for rows in batches:
+        yield b"".join(dumps(dict(zip(names, row))) + b"\n" for row in rows)
+
+
+def _csv_batches(names: list, batches) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    for rows in batches:
+        writer.writerows([_csv_value(value) for value in row] for row in rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def _gzip(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31 = format gzip
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(engine, entity: str, fmt: str, updated_since: Optional[datetime] = None,
+                  gzip: bool = False, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    # własna sesja - generator żyje dłużej niż zależności żądania
+    statement, names = export_statement(entity, updated_since)
+
+    def generate():
+        with Session(engine) as session:
+            result = session.execute(
+                statement, execution_options={"stream_results": True, "yield_per": batch_size}
+            )
+            encode = _csv_batches if fmt == "csv" else _ndjson_batches
+            yield from encode(names, result.partitions())
+
+    return _gzip(generate()) if gzip else generate()
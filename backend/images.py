@@ -0,0 +1,199 @@
+import base64
+import binascii
+import hashlib
+import logging
+import os
+import re
+import tempfile
+from typing import Optional
+
+from decouple import config
+from fastapi import HTTPException, UploadFile
+from sqlalchemy import event
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session
+from database.models import StoredImage
+
+logger = logging.getLogger(__name__)
+
+IMAGE_STORAGE_DIR = config("IMAGE_STORAGE_DIR", default="media")
+# obrazy z naszego magazynu są w Ad.images jako pełne URL-e pod tym adresem
+IMAGE_BASE_URL = config("IMAGE_BASE_URL", default="http://localhost:8000").rstrip("/")
+IMAGE_MAX_BYTES = config("IMAGE_MAX_BYTES", cast=int, default=10 * 1024 * 1024)
+IMAGE_THUMB_SIZE = config("IMAGE_THUMB_SIZE", cast=int, default=480)
+
+# typ odczytujemy z samego pliku, nigdy nie bierzemy go od klienta
+PIL_FORMATS = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp", "GIF": "image/gif"}
+# bez Pillow: sygnatura na początku pliku
+SIGNATURES = [(b"\xff\xd8\xff", "image/jpeg"), (b"\x89PNG\r\n\x1a\n", "image/png"),
+              (b"GIF87a", "image/gif"), (b"GIF89a", "image/gif")]
+
+# pliki sesji czekają w tmp/, aż ona się zacommituje (patrz _files_committed)
+_PENDING_FILES = "image_files"
+
+_HOSTED_RE = re.compile(r"/images/([0-9a-f]{64})(/thumb)?$")
+_DATA_URI_RE = re.compile(r"^data:(image/[\w.+-]+);base64,(.*)$", re.DOTALL)
+
+try:
+    from PIL import Image as PILImage
+except ImportError:  # miniatury są opcjonalne, bez nich serwujemy oryginały
+    PILImage = None
+
+
+def original_path(image_hash: str) -> str:
+    return os.path.join(IMAGE_STORAGE_DIR, "originals", image_hash[:2], image_hash[2:4], image_hash)
+
+
+def thumbnail_path(image_hash: str) -> str:
+    return os.path.join(IMAGE_STORAGE_DIR, "thumbs", str(IMAGE_THUMB_SIZE), image_hash[:2], image_hash[2:4],
+                        image_hash + ".jpg")
+
+
+def image_url(image_hash: str) -> str:
+    return f"{IMAGE_BASE_URL}/images/{image_hash}"
+
+
+def thumbnail_url(url: str) -> str:
+    # zewnętrzne URL-e przechodzą bez zmian
+    match = _HOSTED_RE.search(url)
+    return image_url(match.group(1)) + "/thumb" if match else url
+
+
+def thumbnail_urls(images: Optional[list]) -> list:
+    return [thumbnail_url(url) for url in images or []]
+
+
+def detect_type(path: str) -> Optional[str]:
+    # None - żaden z obsługiwanych formatów obrazu
+    if PILImage is not None:
+        try:
+            with PILImage.open(path) as image:
+                return PIL_FORMATS.get(image.format)
+        except (OSError, ValueError, PILImage.DecompressionBombError):
+            return None
+    with open(path, "rb") as file:
+        head = file.read(12)
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return next((content_type for signature, content_type in SIGNATURES if head.startswith(signature)), None)
+
+
+def _store_file(session: Session, tmp_path: str, image_hash: str, size: int) -> StoredImage:
+    content_type = detect_type(tmp_path)
+    if content_type is None:
+        os.remove(tmp_path)
+        raise HTTPException(status_code=415, detail="Nieobsługiwany format obrazu")
+
+    # ta sama zawartość zawsze trafia pod tę samą ścieżkę, więc duplikaty się nie mnożą;
+    # plik jest tam przenoszony, gdy wiersz StoredImage zostanie zacommitowany
+    session.info.setdefault(_PENDING_FILES, []).append((tmp_path, original_path(image_hash)))
+    stored = session.get(StoredImage, image_hash)
+    if stored is None:
+        stored = StoredImage(image_hash=image_hash, content_type=content_type, byte_size=size)
+        session.add(stored)
+    return stored
+
+
+def write_files(session: Session):
+    # przenosi pliki sesji na miejsce; wołane po commicie (i przez migracje,
+    # których sesja jest commitowana razem z połączeniem)
+    for tmp_path, path in session.info.pop(_PENDING_FILES, []):
+        if os.path.exists(path):
+            os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _files_committed(session):
+    if _PENDING_FILES in session.info:
+        write_files(session)
+
+
+@event.listens_for(OrmSession, "after_transaction_end")
+def _files_discarded(session, transaction):
+    # wycofana albo zamknięta bez commita - nie ma wierszy, więc nie ma też plików
+    if transaction.parent is None:
+        for tmp_path, _ in session.info.pop(_PENDING_FILES, []):
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+def _temp_file():
+    os.makedirs(os.path.join(IMAGE_STORAGE_DIR, "tmp"), exist_ok=True)
+    return tempfile.NamedTemporaryFile(dir=os.path.join(IMAGE_STORAGE_DIR, "tmp"), delete=False)
+
+
+def save_upload(session: Session, upload: UploadFile) -> StoredImage:
+    digest = hashlib.sha256()
+    size = 0
+    with _temp_file() as tmp:
+        while chunk := upload.file.read(1024 * 1024):
+            size += len(chunk)
+            if size > IMAGE_MAX_BYTES:
+                tmp.close()
+                os.remove(tmp.name)
+                raise HTTPException(status_code=413, detail="Plik jest za duży")
+            digest.update(chunk)
+            tmp.write(chunk)
+    return _store_file(session, tmp.name, digest.hexdigest(), size)
+
+
+def save_bytes(session: Session, data: bytes) -> StoredImage:
+    if len(data) > IMAGE_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Plik jest za duży")
+    with _temp_file() as tmp:
+        tmp.write(data)
+    return _store_file(session, tmp.name, hashlib.sha256(data).hexdigest(), len(data))
+
+
+def normalize_images(session: Session, images: Optional[list]) -> list:
+    # Ad.images trzyma tylko URL-e: wklejone data: URI trafiają do magazynu obrazów,
+    # a URL-e miniatur (np. skopiowane z listy) zamieniamy z powrotem na oryginały
+    normalized = []
+    for value in images or []:
+        data_uri = _DATA_URI_RE.match(value)
+        if data_uri:
+            try:
+                data = base64.b64decode(data_uri.group(2), validate=False)
+            except (binascii.Error, ValueError):
+                raise HTTPException(status_code=400, detail="Nieprawidłowe dane obrazu")
+            stored = save_bytes(session, data)
+            normalized.append(image_url(stored.image_hash))
+            continue
+        hosted = _HOSTED_RE.search(value)
+        normalized.append(image_url(hosted.group(1)) if hosted else value)
+    return normalized
+
+
+def make_thumbnail(image_hash: str) -> bool:
+    if PILImage is None:
+        return False
+    target = thumbnail_path(image_hash)
+    if os.path.exists(target):
+        return True
+    try:
+        with PILImage.open(original_path(image_hash)) as image:
+            image.thumbnail((IMAGE_THUMB_SIZE, IMAGE_THUMB_SIZE))
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with _temp_file() as tmp:
+                image.save(tmp, "JPEG", quality=80, optimize=True)
+            os.replace(tmp.name, target)
+        return True
+    except (OSError, ValueError) as e:
+        logger.warning("Could not create thumbnail for %s: %s", image_hash, e)
+        return False
+
+
+def generate_thumbnail(engine, image_hash: str):
+    # zadanie w tle - wykonuje się po wysłaniu odpowiedzi na upload
+    if make_thumbnail(image_hash):
+        with Session(engine) as session:
+            stored = session.get(StoredImage, image_hash)
+            if stored is not None and not stored.has_thumbnail:
+                stored.has_thumbnail = True
+                session.add(stored)
+                session.commit()
@@ -1,36 +1,186 @@
+import asyncio
+import hashlib
+import logging
+
+import anyio
 import uvicorn
-from fastapi import FastAPI, Depends, HTTPException
+import os
+
+from fastapi import FastAPI, BackgroundTasks, Depends, File, HTTPException, Query, Request, Response, UploadFile
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Optional
+from datetime import datetime
+from typing import List, Literal, Optional
 
 from fastapi.security import OAuth2PasswordRequestForm
 from pydantic import BaseModel
 from sqlmodel import Session, select, col
-from database.database import create_db_and_tables, get_session
-from database.models import User, BusinessProfile, Categories, Ad, AdCategory, Reviews
-from schemas import Token, UserCreate, UserRead
+from sqlmodel.ext.asyncio.session import AsyncSession
+from database.database import create_db_and_tables, get_session, get_async_session, dispose_async_engine, engine
+from database.models import (
+    User, BusinessProfile, Categories, Ad, AdCategory, Reviews, AdRating, BusinessRating, StoredImage
+)
+from database import ratings, cascade, geo, ad_fields, facets, similar, changes
+from database.ad_queries import AD_SORT_OPTIONS, filter_ads, feed_statement
+from schemas import (
+    Token, UserCreate, UserRead, BusinessRead, CategoryRead, AdRead, AdCategoryRead, ReviewRead,
+    ModerationAdRead, AdIdList, ModerationDecision
+)
+from pagination import (
+    PageParams, page_params, paginate, paginate_async, apply_keyset, next_page, NEXT_CURSOR_HEADER, MAX_PAGE_SIZE
+)
 import security
-from sqlalchemy import or_
+import images
+import cache
+import export
+import bulk
+import moderation
+import dashboard
+import metrics
+import ratelimit
+import change_feed
+from serialization import FastJSONResponse, RawJSONResponse, dumps
+from sqlalchemy import delete, func
+from starlette.concurrency import run_in_threadpool
 from decouple import config
 
-app = FastAPI()
+logging.basicConfig(level=config("LOG_LEVEL", default="INFO"))
+logger = logging.getLogger(__name__)
+
+app = FastAPI(default_response_class=FastJSONResponse)
+
+
+# co ile sekund wygaszać ogłoszenia po due_date (0 = wyłączone, np. gdy robi to cron: manage.py expire-ads)
+AD_EXPIRY_INTERVAL_SECONDS = config("AD_EXPIRY_INTERVAL_SECONDS", cast=int, default=3600)
+# co ile sekund przeliczać od zera indeks podobnych ogłoszeń (0 = wyłączone, np. cron: manage.py rebuild-similar)
+SIMILAR_REBUILD_INTERVAL_SECONDS = config("SIMILAR_REBUILD_INTERVAL_SECONDS", cast=int, default=86400)
+# co ile sekund usuwać z dziennika zmian wpisy starsze niż CHANGES_RETENTION_DAYS (0 = wyłączone)
+CHANGES_PRUNE_INTERVAL_SECONDS = config("CHANGES_PRUNE_INTERVAL_SECONDS", cast=int, default=3600)
+_background_jobs = []
+# wątki dla synchronicznych endpointów (zapisy, admin); odczyty katalogu są async
+THREADPOOL_WORKERS = config("THREADPOOL_WORKERS", cast=int, default=40)
+
+
+def expire_due_ads() -> int:
+    with Session(engine) as session:
+        expired = ad_fields.expire_ads(session)
+    if expired:
+        cache.invalidate(*{tag for ad_id, bp_id in expired for tag in (cache.ad_tag(ad_id), cache.business_tag(bp_id))})
+        logger.info("Wygaszono %d ogłoszeń po terminie", len(expired))
+    return len(expired)
+
+
+def rebuild_similar_index() -> int:
+    with Session(engine) as session:
+        indexed = similar.rebuild_similar(session)
+    logger.info("Przeliczono indeks podobnych ogłoszeń (%d ogłoszeń)", indexed)
+    return indexed
+
+
+def prune_change_log() -> int:
+    with Session(engine) as session:
+        pruned = changes.prune_changes(session)
+    if pruned:
+        logger.info("Usunięto %d starych wpisów z dziennika zmian", pruned)
+    return pruned
+
+
+async def run_periodically(job, interval: int, delay: float = 0):
+    await asyncio.sleep(delay)
+    while True:
+        try:
+            await run_in_threadpool(job)
+        except Exception:
+            logger.exception("Błąd w %s", job.__name__)
+        await asyncio.sleep(interval)
 
 
 @app.on_event("startup")
-def on_startup():
-    create_db_and_tables()
+async def on_startup():
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_WORKERS
+    await run_in_threadpool(create_db_and_tables)
+    if AD_EXPIRY_INTERVAL_SECONDS > 0:
+        _background_jobs.append(asyncio.create_task(run_periodically(expire_due_ads, AD_EXPIRY_INTERVAL_SECONDS)))
+    if SIMILAR_REBUILD_INTERVAL_SECONDS > 0:
+        # przy starcie indeks jest aktualny (zdarzenia zapisu), pierwsze przeliczenie po interwale
+        _background_jobs.append(asyncio.create_task(run_periodically(
+            rebuild_similar_index, SIMILAR_REBUILD_INTERVAL_SECONDS, delay=SIMILAR_REBUILD_INTERVAL_SECONDS
+        )))
+    if CHANGES_PRUNE_INTERVAL_SECONDS > 0:
+        _background_jobs.append(asyncio.create_task(run_periodically(prune_change_log, CHANGES_PRUNE_INTERVAL_SECONDS)))
+    await change_feed.feed.start()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    for job in _background_jobs:
+        job.cancel()
+    _background_jobs.clear()
+    await change_feed.feed.stop()
+    await dispose_async_engine()
 
 
 
 origins = config("CORS_ORIGINS").split(",")
 
+# limity przed CORS (odpowiedzi 429/503 też mają nagłówki CORS), metryki najbardziej na zewnątrz
+app.add_middleware(ratelimit.RateLimitMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag", "Retry-After"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
+
+
+async def cached_response(request: Request, tags, load, schema=None):
+    # GET-y czytane przy prawie każdym widoku strony idą przez cache odpowiedzi,
+    # handlery zapisu unieważniają tagi (cache.invalidate). W cache trzymamy gotowy JSON.
+    # load zwraca awaitable - czyta z bazy przez AsyncSession
+    key = cache.request_key(request)
+    entry = cache.response_cache.get(key)
+    if entry is not None:
+        return RawJSONResponse(entry["body"].encode(), headers={**entry["headers"], "X-Cache": "HIT"})
+
+    value = await load()
+    if value is None:
+        # brak wiersza nie trafia do cache - za chwilę może zostać utworzony
+        return RawJSONResponse(b"null", headers={"X-Cache": "MISS"})
+    headers = {}
+    if isinstance(value, Response):
+        # lista z paginate() - już zakodowana
+        body = value.body
+        if NEXT_CURSOR_HEADER.lower() in value.headers:
+            headers[NEXT_CURSOR_HEADER] = value.headers[NEXT_CURSOR_HEADER]
+    else:
+        body = dumps(schema.model_validate(value) if schema is not None else value)
+    tags = tags(value) if callable(tags) else tags
+    cache.response_cache.set(key, {"body": body.decode(), "headers": headers}, tags)
+    return RawJSONResponse(body, headers={**headers, "X-Cache": "MISS"})
+
+
+@app.get("/cache/stats")
+def get_cache_stats():
+    return cache.stats()
+
+
+def _cache_metrics() -> list[str]:
+    stats = cache.stats()
+    lines = []
+    for name in ("hits", "misses", "evictions", "invalidations"):
+        lines += [f"# TYPE response_cache_{name}_total counter", f"response_cache_{name}_total {stats[name]}"]
+    return lines
+
+
+metrics.collectors.append(_cache_metrics)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 
 # AUTH ENDPOINTS
@@ -54,7 +204,7 @@ def register(user_data: UserCreate, session: Session = Depends(get_session)):
     return new_user
 
 
-@app.get("/me")
+@app.get("/me", response_model=UserRead)
 async def read_me(current_user: User = Depends(security.get_current_user)):
     return current_user
 
@@ -67,16 +217,28 @@ class LoginRequest(BaseModel):
 @app.post("/login", response_model=Token)
 def login(request: LoginRequest, session: Session = Depends(get_session)):
     user = session.exec(select(User).where(User.email == request.email)).first()
+    if not user:
+        raise HTTPException(status_code=400, detail="Invalid credentials")
+    # nie trzymamy połączenia z bazą na czas liczenia hasha
+    session.close()
 
-    if not user or not security.verify_password(request.password, user.hashed_password):
+    valid, new_hash = security.verify_and_update_password(request.password, user.hashed_password)
+    if not valid:
         raise HTTPException(status_code=400, detail="Invalid credentials")
 
-    token = security.create_access_token({"sub": str(user.user_id)})
+    if new_hash:
+        # zmieniły się parametry argon2 - zapisujemy hash z nowymi
+        user.hashed_password = new_hash
+        session.add(user)
+        session.commit()
+        session.refresh(user)
+
+    token = security.create_user_token(user)
 
     return {"access_token": token, "token_type": "bearer"}
 
 
-@app.post("/users")
+@app.post("/users", response_model=UserRead)
 def create_user(user: User, session: Session = Depends(get_session)):
     user.hashed_password = security.hash_password(user.hashed_password)
     session.add(user)
@@ -87,100 +249,128 @@ def create_user(user: User, session: Session = Depends(get_session)):
 
 @app.get("/users")
 def get_all_users(
+        response: Response,
+        page: PageParams = Depends(page_params),
         session: Session = Depends(get_session)
 ):
-    return session.exec(select(User)).all()
+    return paginate(session, select(User), User, page, response,
+                    sort_options={"created_at": User.created_at}, schema=UserRead)
 
 
-@app.get("/users/{user_id}")
-def get_user(user_id: int, session: Session = Depends(get_session)):
-    user = session.get(User, user_id)
+@app.get("/users/{user_id}", response_model=Optional[UserRead])
+async def get_user(user_id: int, session: AsyncSession = Depends(get_async_session)):
+    user = await session.get(User, user_id)
     return user
 
 
+# Panel właściciela (ProfilePage): firmy z licznikami i ocenami oraz ich najnowsze ogłoszenia
+# z kategoriami, stanem i ocenami - kilka stałych zapytań niezależnie od liczby firm i ogłoszeń.
+# Dalsze ogłoszenia firmy: /businesses/{bp_id}/ads?sort=-created_at&cursor=<next_cursor>
+@app.get("/users/{user_id}/dashboard")
+async def get_user_dashboard(user_id: int, ads_per_business: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+                             session: AsyncSession = Depends(get_async_session)):
+    user = await session.get(User, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="Użytkownik nie znaleziony")
+    businesses = await dashboard.load_dashboard(session, user_id, ads_per_business)
+    return RawJSONResponse(dumps({"user": UserRead.model_validate(user).model_dump(), "businesses": businesses}))
+
+
 @app.get("/businesses/user/{user_id}")
-def get_businesses_by_user(user_id: int, session: Session = Depends(get_session)):
-    businesses = session.exec(
-        select(BusinessProfile).where(BusinessProfile.user_id == user_id)
-    ).all()
-    return businesses
+async def get_businesses_by_user(user_id: int, response: Response, page: PageParams = Depends(page_params),
+                                 session: AsyncSession = Depends(get_async_session)):
+    statement = select(BusinessProfile).where(BusinessProfile.user_id == user_id)
+    return await paginate_async(session, statement, BusinessProfile, page, response,
+                                sort_options={"created_at": BusinessProfile.created_at}, schema=BusinessRead)
 
 
-@app.put("/users/{user_id}", response_model=User)
+@app.put("/users/{user_id}", response_model=UserRead)
 def update_user(user_id: int, updated_user: User, session: Session = Depends(get_session)):
     db_user = session.get(User, user_id)
-    for key, value in updated_user.dict(exclude_unset=True).items():
+    update_data = updated_user.dict(exclude_unset=True, exclude={"token_version"})
+    if any(key in update_data and update_data[key] != getattr(db_user, key) for key in ("role", "hashed_password")):
+        # wcześniej wydane tokeny przestają być ważne
+        db_user.token_version += 1
+    for key, value in update_data.items():
         setattr(db_user, key, value)
     session.add(db_user)
     session.commit()
     session.refresh(db_user)
+    security.invalidate_user(user_id)
     return db_user
 
 
 @app.delete("/users/{user_id}")
-def delete_user(user_id: int, session: Session = Depends(get_session)):
+def delete_user(user_id: int, response: Response, background_tasks: BackgroundTasks,
+                background: bool = False, session: Session = Depends(get_session)):
     db_user = session.get(User, user_id)
     if not db_user:
         raise HTTPException(status_code=404, detail="Użytkownik nie znaleziony")
 
-    bps = session.exec(select(BusinessProfile).where(BusinessProfile.user_id == user_id)).all()
-
-    for bp in bps:
-        ads = session.exec(select(Ad).where(Ad.bp_id == bp.bp_id)).all()
-        for ad in ads:
-            ad_categories = session.exec(select(AdCategory).where(AdCategory.ad_id == ad.ad_id)).all()
-            for ad_category in ad_categories:
-                session.delete(ad_category)
-
-            ad_reviews = session.exec(select(Reviews).where(Reviews.ad_id == ad.ad_id)).all()
-            for ad_review in ad_reviews:
-                session.delete(ad_review)
-
-            session.delete(ad)
-        session.delete(bp)
+    if background:
+        bp_ids = list(session.exec(select(BusinessProfile.bp_id).where(BusinessProfile.user_id == user_id)).all())
+        background_tasks.add_task(cascade.delete_in_batches, engine, bp_ids, user_id)
+        background_tasks.add_task(security.invalidate_user, user_id)
+        background_tasks.add_task(cache.invalidate, *map(cache.business_tag, bp_ids))
+        response.status_code = 202
+        return {"message": "Usuwanie użytkownika zostało zlecone"}
 
-    session.delete(db_user)
+    bp_ids = session.exec(select(BusinessProfile.bp_id).where(BusinessProfile.user_id == user_id)).all()
+    cascade.delete_user(session, user_id)
     session.commit()
+    security.invalidate_user(user_id)
+    cache.invalidate(*map(cache.business_tag, bp_ids))
     return {"message": "Użytkownik usunięty pomyślnie"}
 
 
 # Business CRUD
-@app.post("/businesses", response_model=BusinessProfile)
+@app.post("/businesses", response_model=BusinessRead)
 def create_business(business: BusinessProfile, session: Session = Depends(get_session)):
     session.add(business)
     session.commit()
     session.refresh(business)
+    cache.invalidate(cache.business_tag(business.bp_id))
     return business
 
 
-@app.get("/businesses", response_model=List[BusinessProfile])
-def get_all_businesses(session: Session = Depends(get_session)):
-    return session.exec(select(BusinessProfile)).all()
+@app.get("/businesses")
+async def get_all_businesses(response: Response, page: PageParams = Depends(page_params),
+                             session: AsyncSession = Depends(get_async_session)):
+    return await paginate_async(session, select(BusinessProfile), BusinessProfile, page, response,
+                                sort_options={"created_at": BusinessProfile.created_at,
+                                              "bp_name": BusinessProfile.bp_name},
+                                schema=BusinessRead)
 
 
-@app.get("/businesses/{bp_id}")
-def get_business(bp_id: int, session: Session = Depends(get_session)):
-    return session.get(BusinessProfile, bp_id)
+@app.get("/businesses/{bp_id}", response_model=Optional[BusinessRead])
+async def get_business(bp_id: int, request: Request, session: AsyncSession = Depends(get_async_session)):
+    return await cached_response(request, [cache.business_tag(bp_id)],
+                                 lambda: session.get(BusinessProfile, bp_id), schema=BusinessRead)
 
 
 @app.get("/businesses/{bp_id}/ads")
-def get_ads_by_business(bp_id: int, session: Session = Depends(get_session)):
-    try:
-        business = session.get(BusinessProfile, bp_id)
+async def get_ads_by_business(bp_id: int, request: Request, response: Response,
+                              page: PageParams = Depends(page_params),
+                              session: AsyncSession = Depends(get_async_session)):
+    async def load():
+        business = await session.get(BusinessProfile, bp_id)
         if not business:
             raise HTTPException(status_code=404, detail="Firma nie znaleziona")
 
-        ads = session.exec(
-            select(Ad).where(Ad.bp_id == bp_id)
-        ).all()
+        statement = select(Ad).where(Ad.bp_id == bp_id)
+        return await paginate_async(session, statement, Ad, page, response,
+                                    sort_options=AD_SORT_OPTIONS, transform=ad_list_item, schema=AdRead)
 
-        return ads
+    try:
+        return await cached_response(request, [cache.business_tag(bp_id)], load)
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Błąd w get_ads_by_business: {str(e)}")
+        logger.exception("Błąd w get_ads_by_business")
         raise HTTPException(status_code=500, detail=f"Błąd pobierania ogłoszeń: {str(e)}")
 
 
-@app.put("/businesses/{bp_id}")
+@app.put("/businesses/{bp_id}", response_model=BusinessRead)
 def update_business(bp_id: int, updated_buisiness: BusinessProfile, session: Session = Depends(get_session)):
     db_bp = session.get(BusinessProfile, bp_id)
     for key, value in updated_buisiness.dict().items():
@@ -188,114 +378,269 @@ def update_business(bp_id: int, updated_buisiness: BusinessProfile, session: Ses
     session.add(db_bp)
     session.commit()
     session.refresh(db_bp)
+    cache.invalidate(cache.business_tag(bp_id))
     return db_bp
 
 
 @app.delete("/businesses/{bp_id}")
-def delete_business(bp_id: int, session: Session = Depends(get_session)):
+def delete_business(bp_id: int, response: Response, background_tasks: BackgroundTasks,
+                    background: bool = False, session: Session = Depends(get_session)):
     db_bp = session.get(BusinessProfile, bp_id)
     if not db_bp:
         raise HTTPException(status_code=404, detail="Profil biznesowy nie znaleziony")
 
-    ads = session.exec(select(Ad).where(Ad.bp_id == bp_id)).all()
-
-    for ad in ads:
-        ad_categories = session.exec(select(AdCategory).where(AdCategory.ad_id == ad.ad_id)).all()
-        for ad_category in ad_categories:
-            session.delete(ad_category)
+    if background:
+        background_tasks.add_task(cascade.delete_in_batches, engine, [bp_id])
+        background_tasks.add_task(cache.invalidate, cache.business_tag(bp_id))
+        response.status_code = 202
+        return {"message": "Usuwanie profilu biznesowego zostało zlecone"}
 
-        ad_reviews = session.exec(select(Reviews).where(Reviews.ad_id == ad.ad_id)).all()
-        for ad_review in ad_reviews:
-            session.delete(ad_review)
-
-        session.delete(ad)
-
-    session.delete(db_bp)
+    cascade.delete_businesses(session, [bp_id])
     session.commit()
+    cache.invalidate(cache.business_tag(bp_id))
     return {"message": "Profil biznesowy usunięty pomyślnie"}
 
 
 # AD CRUD
+def ad_list_item(item: dict) -> dict:
+    # listy zwracają miniatury zamiast oryginałów
+    if "images" in item:
+        item["images"] = images.thumbnail_urls(item["images"])
+    return item
+
+
 # Endpoint do tworzenia ogłoszenia
-@app.post("/ads", response_model=Ad)
+@app.post("/ads", response_model=AdRead)
 def create_ad(ad: Ad, session: Session = Depends(get_session)):
     ad.status = False
+    ad.images = images.normalize_images(session, ad.images)
     session.add(ad)
     session.commit()
     session.refresh(ad)
+    cache.invalidate(cache.business_tag(ad.bp_id))
     return ad
 
 
-@app.get("/ads/user/{user_id}")
-def get_ads_by_user(user_id: int, session: Session = Depends(get_session)):
-    try:
-        businesses = session.exec(
-            select(BusinessProfile).where(BusinessProfile.user_id == user_id)
-        ).all()
+# Import wielu ogłoszeń naraz, z kategoriami (category_ids). JSON: lista obiektów,
+# albo Content-Type: application/x-ndjson - jeden obiekt w linii, dla dużych plików
+@app.post("/ads/bulk")
+async def bulk_create_ads(request: Request):
+    return await bulk.handle_bulk(request, bulk.import_ads)
 
-        if not businesses:
-            return []
 
-        business_ids = [b.bp_id for b in businesses]
-        print(business_ids)
-        all_ads = []
-        for bp_id in business_ids:
-            ads_for_business = session.exec(
-                select(Ad).where(Ad.bp_id == bp_id)
-            ).all()
-            all_ads.extend(ads_for_business)
-        print(all_ads)
-        return all_ads
+@app.get("/ads/user/{user_id}")
+async def get_ads_by_user(user_id: int, response: Response, page: PageParams = Depends(page_params),
+                          session: AsyncSession = Depends(get_async_session)):
+    try:
+        statement = (
+            select(Ad)
+            .join(BusinessProfile, col(BusinessProfile.bp_id) == col(Ad.bp_id))
+            .where(BusinessProfile.user_id == user_id)
+        )
+        return await paginate_async(session, statement, Ad, page, response,
+                                    sort_options=AD_SORT_OPTIONS, transform=ad_list_item, schema=AdRead)
 
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Błąd w get_ads_by_user: {str(e)}")
+        logger.exception("Błąd w get_ads_by_user")
         raise HTTPException(status_code=500, detail=f"Błąd pobierania ogłoszeń: {str(e)}")
 
 
-@app.get("/ads", response_model=List[Ad])
-def get_all_ads(
-        session: Session = Depends(get_session),
+def near_params(
+        lat: Optional[float] = Query(None, ge=-90, le=90),
+        lon: Optional[float] = Query(None, ge=-180, le=180),
+        radius_km: Optional[float] = Query(None, gt=0, le=geo.GEO_MAX_RADIUS_KM)
+) -> Optional[tuple]:
+    if lat is None and lon is None:
+        if radius_km is not None:
+            raise HTTPException(status_code=400, detail="radius_km wymaga lat i lon")
+        return None
+    if lat is None or lon is None:
+        raise HTTPException(status_code=400, detail="Podaj jednocześnie lat i lon")
+    return lat, lon, radius_km or geo.GEO_DEFAULT_RADIUS_KM
+
+
+def with_distance(near: tuple, transform):
+    lat, lon, _ = near
+
+    def add_distance(item: dict) -> dict:
+        item = transform(item)
+        if item.get("lat") is not None and item.get("lon") is not None:
+            item["distance_km"] = round(geo.distance_km(lat, lon, item["lat"], item["lon"]), 2)
+        return item
+    return add_distance
+
+
+@app.get("/ads")
+async def get_all_ads(
+        response: Response,
+        page: PageParams = Depends(page_params),
+        session: AsyncSession = Depends(get_async_session),
+        search: Optional[str] = None,
+        category_id: Optional[int] = None,
+        near: Optional[tuple] = Depends(near_params),
+        min_price: Optional[float] = Query(None, ge=0),
+        max_price: Optional[float] = Query(None, ge=0),
+        active_only: bool = False
+):
+    # ?lat=&lon=&radius_km= - ogłoszenia w promieniu, posortowane po odległości (distance_km)
+    # ?active_only=true - tylko zatwierdzone i przed due_date
+    statement, sort_options, default_sort = filter_ads(select(Ad), search, category_id, near,
+                                                       min_price, max_price, active_only)
+    transform = with_distance(near, ad_list_item) if near else ad_list_item
+    return await paginate_async(session, statement, Ad, page, response, sort_options=sort_options,
+                                default_sort=default_sort, transform=transform, schema=AdRead)
+
+
+# Strona główna: zatwierdzone ogłoszenia razem z kategoriami, nazwą firmy i ocenami
+@app.get("/feed")
+async def get_feed(
+        request: Request,
+        response: Response,
+        page: PageParams = Depends(page_params),
+        session: AsyncSession = Depends(get_async_session),
         search: Optional[str] = None,
         category_id: Optional[int] = None
 ):
-    statement = select(Ad)
-
-    if search:
-        search_filter = f"%{search}%"
-        statement = statement.where(
-            or_(
-                col(Ad.ad_title).ilike(search_filter),
-                col(Ad.description).ilike(search_filter)
-            )
-        )
-
-    if category_id:
-        statement = statement.join(AdCategory).where(AdCategory.category_id == category_id)
+    statement, sort_options, default_sort = filter_ads(feed_statement(), search, category_id)
+    statement, sort, key_count = apply_keyset(
+        statement, page, [Ad.__table__.c.ad_id], sort_options, default_sort
+    )
+    rows = next_page((await session.exec(statement)).all(), page, sort, key_count, response)
+
+    feed = [
+        {
+            "ad_id": ad.ad_id,
+            "ad_title": ad.ad_title,
+            "description": ad.description,
+            "images": images.thumbnail_urls(ad.images),
+            "price": ad.price,
+            "address": ad.address,
+            "post_date": ad.post_date,
+            "due_date": ad.due_date,
+            "status": ad.status,
+            "created_at": ad.created_at,
+            "bp_id": ad.bp_id,
+            "bp_name": ad.business_profile.bp_name if ad.business_profile else None,
+            "category_ids": [link.category_id for link in ad.ad_category],
+            "rating_average": rating_sum / count if count else 0,
+            "rating_count": count or 0,
+        }
+        for ad, rating_sum, count, *_ in rows
+    ]
+
+    body = dumps(feed)
+    etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if NEXT_CURSOR_HEADER in response.headers:
+        headers[NEXT_CURSOR_HEADER] = response.headers[NEXT_CURSOR_HEADER]
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return RawJSONResponse(body, headers=headers)
+
+
+# Moderacja - kolejka oczekujących ogłoszeń, od najstarszych.
+# Musi być zadeklarowane przed /ads/{ad_id}, inaczej "pending" trafia do get_ad.
+@app.get("/ads/pending")
+def get_pending_ads(response: Response, page: PageParams = Depends(page_params),
+                    session: Session = Depends(get_session)):
+    return paginate(session, moderation.pending(select(Ad)), Ad, page, response, sort_options=AD_SORT_OPTIONS,
+                    default_sort="created_at", transform=ad_list_item, schema=ModerationAdRead)
+
+
+# Moderator bierze paczkę ogłoszeń na MODERATION_LEASE_SECONDS, inni ich nie dostaną
+@app.post("/moderation/claim", response_model=List[ModerationAdRead])
+def claim_pending_ads(limit: int = Query(20, ge=1, le=moderation.MODERATION_CLAIM_MAX),
+                      admin: User = Depends(security.require_admin),
+                      session: Session = Depends(get_session)):
+    return [ad_list_item(ModerationAdRead.model_validate(ad).model_dump())
+            for ad in moderation.claim_ads(session, admin.user_id, limit)]
+
+
+@app.post("/moderation/release")
+def release_pending_ads(body: AdIdList, admin: User = Depends(security.require_admin),
+                        session: Session = Depends(get_session)):
+    return {"released": moderation.release_ads(session, admin.user_id, body.ad_ids)}
+
+
+@app.patch("/ads/approve")
+def approve_ads(decision: ModerationDecision, admin: User = Depends(security.require_admin),
+                session: Session = Depends(get_session)):
+    changed = moderation.decide(session, admin.user_id, decision.ad_ids, decision.action == "approve")
+    cache.invalidate(*[cache.ad_tag(ad_id) for ad_id, _ in changed],
+                     *{cache.business_tag(bp_id) for _, bp_id in changed})
+    updated = {ad_id for ad_id, _ in changed}
+    return {
+        "updated": sorted(updated),
+        # już rozpatrzone, nieistniejące albo zajęte przez innego moderatora
+        "skipped": [ad_id for ad_id in dict.fromkeys(decision.ad_ids) if ad_id not in updated],
+    }
+
+
+def ad_tags(ad: Ad) -> list:
+    # bp:ID pozwala unieważnić wszystkie ogłoszenia usuwanej firmy jednym tagiem
+    return [cache.ad_tag(ad.ad_id), cache.business_tag(ad.bp_id)]
+
+
+@app.get("/ads/{ad_id}", response_model=AdRead)
+async def get_ad(ad_id: int, request: Request, session: AsyncSession = Depends(get_async_session)):
+    async def load():
+        ad = await session.get(Ad, ad_id)
+        if not ad:
+            raise HTTPException(status_code=404, detail="Ogłoszenie nie znalezione")
+        return ad
 
-    return session.exec(statement).all()
+    return await cached_response(request, ad_tags, load, schema=AdRead)
 
 
-@app.get("/ads/{ad_id}")
-def get_ad(ad_id: int, session: Session = Depends(get_session)):
-    ad = session.get(Ad, ad_id)
-    if not ad:
-        raise HTTPException(status_code=404, detail="Ogłoszenie nie znalezione")
-    return ad
+# Podobne ogłoszenia (TF-IDF po tytule, opisie i kategoriach, database/similar.py), tylko widoczne
+@app.get("/ads/{ad_id}/similar")
+async def get_similar_ads(ad_id: int, request: Request,
+                          limit: int = Query(6, ge=1, le=50),
+                          session: AsyncSession = Depends(get_async_session)):
+    async def load():
+        query_terms = (await session.execute(similar.query_terms_statement(ad_id))).tuples().all()
+        if not query_terms:
+            if not await session.get(Ad, ad_id):
+                raise HTTPException(status_code=404, detail="Ogłoszenie nie znalezione")
+            return []
+        rows = (await session.execute(similar.similar_statement(ad_id, query_terms, limit))).tuples().all()
+        categories = await dashboard.categories_by_ad(session, [ad.ad_id for ad, _ in rows])
+        return [
+            {
+                **ad_list_item(AdRead.model_validate(ad).model_dump()),
+                "categories": categories.get(ad.ad_id, []),
+                "score": round(score, 4),
+            }
+            for ad, score in rows
+        ]
+
+    # zmiana ogłoszenia (lub któregoś z podobnych) unieważnia wpis, nowe ogłoszenia dochodzą po TTL
+    return await cached_response(
+        request, lambda items: [cache.ad_tag(ad_id), *(cache.ad_tag(item["ad_id"]) for item in items)], load
+    )
 
 
-@app.put("/ads/{ad_id}")
+@app.put("/ads/{ad_id}", response_model=AdRead)
 def update_ad(ad_id: int, updated_ad: Ad, session: Session = Depends(get_session)):
     db_ad = session.get(Ad, ad_id)
     if not db_ad:
         raise HTTPException(status_code=404, detail="Ogłoszenie nie znalezione")
 
     update_data = updated_ad.dict(exclude_unset=True)
+    if "images" in update_data:
+        update_data["images"] = images.normalize_images(session, update_data["images"])
+    if "bp_id" in update_data:
+        ratings.move_ad_ratings(session, ad_id, db_ad.bp_id, update_data["bp_id"])
+    old_bp_id = db_ad.bp_id
     for key, value in update_data.items():
         setattr(db_ad, key, value)
 
     session.add(db_ad)
     session.commit()
     session.refresh(db_ad)
+    cache.invalidate(cache.ad_tag(ad_id), cache.business_tag(old_bp_id), cache.business_tag(db_ad.bp_id))
     return db_ad
 
 
@@ -305,64 +650,91 @@ def delete_ad(ad_id: int, session: Session = Depends(get_session)):
     if not ad:
         raise HTTPException(status_code=404, detail="Ogłoszenie nie znalezione")
 
-    ad_categories = session.exec(select(AdCategory).where(AdCategory.ad_id == ad_id)).all()
-
-    ad_reviews = session.exec(select(Reviews).where(Reviews.ad_id == ad_id)).all()
-
-    for ad_category in ad_categories:
-        session.delete(ad_category)
-
-    for ad_review in ad_reviews:
-        session.delete(ad_review)
-
-    session.delete(ad)
+    bp_id = ad.bp_id
+    cascade.delete_ads(session, [ad_id])
     session.commit()
+    cache.invalidate(cache.ad_tag(ad_id), cache.business_tag(bp_id))
     return {"message": "Ogłoszenie usunięte pomyślnie"}
 
 
-@app.get("/ads/pending")
-def get_pending_ads(session: Session = Depends(get_session)):
-    return session.exec(select(Ad).where(Ad.status == False)).all()
-
-
 @app.get("/ads/status/{status}")
-def get_ads_by_status(status: bool, session: Session = Depends(get_session)):
-    return session.exec(select(Ad).where(Ad.status == status)).all()
+def get_ads_by_status(status: bool, response: Response, page: PageParams = Depends(page_params),
+                      session: Session = Depends(get_session)):
+    return paginate(session, select(Ad).where(Ad.status == status), Ad, page, response,
+                    sort_options=AD_SORT_OPTIONS, transform=ad_list_item, schema=AdRead)
 
 
-@app.patch("/ads/{ad_id}/approve")
-def approve_ad(ad_id: int, session: Session = Depends(get_session)):
+@app.patch("/ads/{ad_id}/approve", response_model=AdRead)
+def approve_ad(ad_id: int, admin: User = Depends(security.require_admin), session: Session = Depends(get_session)):
     ad = session.get(Ad, ad_id)
     if not ad:
         raise HTTPException(status_code=404, detail="Ogłoszenie nie znalezione")
     ad.status = True
+    ad.rejected_at = None
+    ad.claimed_by = None
+    ad.claim_expires_at = None
     session.add(ad)
     session.commit()
     session.refresh(ad)
+    cache.invalidate(cache.ad_tag(ad_id), cache.business_tag(ad.bp_id))
     return ad
 
 
 # Categories CRUD
-@app.post("/categories")
+@app.post("/categories", response_model=CategoryRead)
 def create_category(category: Categories, session: Session = Depends(get_session)):
     session.add(category)
     session.commit()
     session.refresh(category)
+    cache.invalidate(cache.CATEGORIES_TAG)
     return category
 
 
 @app.get("/categories")
-def get_all_categories(session: Session = Depends(get_session)):
-    return session.exec(select(Categories)).all()
-
-
-@app.get("/categories/{category_id}")
-def get_category(category_id: int, session: Session = Depends(get_session)):
-    category = session.get(Categories, category_id)
+async def get_all_categories(request: Request, response: Response, page: PageParams = Depends(page_params),
+                             session: AsyncSession = Depends(get_async_session)):
+    return await cached_response(request, [cache.CATEGORIES_TAG], lambda: paginate_async(
+        session, select(Categories), Categories, page, response,
+        sort_options={"category_name": Categories.category_name, "created_at": Categories.created_at},
+        schema=CategoryRead
+    ))
+
+
+# Liczba widocznych (zatwierdzonych, przed due_date - ad_fields.active()) ogłoszeń w każdej kategorii.
+# Bez search - gotowe liczniki z CategoryCount minus ogłoszenia po terminie, których expire_ads
+# jeszcze nie ukrył; z search - jeden GROUP BY po dopasowanych ogłoszeniach.
+@app.get("/categories/facets")
+async def get_category_facets(session: AsyncSession = Depends(get_async_session), search: Optional[str] = None):
+    if search:
+        statement = (
+            select(AdCategory.category_id, func.count())
+            .join(Ad, col(Ad.ad_id) == col(AdCategory.ad_id))
+            .where(*ad_fields.active())
+        )
+        statement, _, _ = filter_ads(statement, search, None)
+        counts = dict((await session.execute(statement.group_by(AdCategory.category_id))).tuples().all())
+    else:
+        counts = dict((await session.execute(facets.counts_statement())).tuples().all())
+        lagging = (await session.execute(facets.lagging_statement())).tuples().all()
+        for category_id, count in lagging:
+            counts[category_id] = counts.get(category_id, 0) - count
+
+    categories = (await session.execute(
+        select(Categories.category_id, Categories.category_name).order_by(col(Categories.category_name))
+    )).tuples()
+    return [
+        {"category_id": category_id, "category_name": name, "ad_count": counts.get(category_id, 0)}
+        for category_id, name in categories
+    ]
+
+
+@app.get("/categories/{category_id}", response_model=Optional[CategoryRead])
+async def get_category(category_id: int, session: AsyncSession = Depends(get_async_session)):
+    category = await session.get(Categories, category_id)
     return category
 
 
-@app.put("/categories/{category_id}", response_model=Categories)
+@app.put("/categories/{category_id}", response_model=CategoryRead)
 def update_category(category_id: int, updated_category: Categories, session: Session = Depends(get_session)):
     db_category = session.get(Categories, category_id)
     for key, value in updated_category.dict().items():
@@ -370,48 +742,66 @@ def update_category(category_id: int, updated_category: Categories, session: Ses
     session.add(db_category)
     session.commit()
     session.refresh(db_category)
+    cache.invalidate(cache.CATEGORIES_TAG)
     return db_category
 
 
 @app.delete("/categories/{category_id}")
 def delete_category(category_id: int, session: Session = Depends(get_session)):
     db_category = session.get(Categories, category_id)
+    # powiązania z ogłoszeniami idą razem z kategorią (licznik usuwa database/facets.py)
+    session.execute(delete(AdCategory).where(AdCategory.category_id == category_id),
+                    execution_options={"synchronize_session": False})
     session.delete(db_category)
     session.commit()
+    cache.invalidate(cache.CATEGORIES_TAG)
     return
 
 
 # AdCategories CRUD
-@app.post("/ad_categories")
+@app.post("/ad_categories", response_model=AdCategoryRead)
 def create_ad_category(ad_category: AdCategory, session: Session = Depends(get_session)):
     session.add(ad_category)
     session.commit()
     session.refresh(ad_category)
+    # /ads/{id} i /ads/{id}/similar zawierają kategorie ogłoszenia
+    cache.invalidate(cache.ad_tag(ad_category.ad_id))
     return ad_category
 
 
+@app.post("/ad_categories/bulk")
+async def bulk_create_ad_categories(request: Request):
+    return await bulk.handle_bulk(request, bulk.import_ad_categories)
+
+
 @app.get("/ad_categories")
-def get_all_ad_categories(session: Session = Depends(get_session)):
-    return session.exec(select(AdCategory)).all()
+async def get_all_ad_categories(response: Response, page: PageParams = Depends(page_params),
+                                session: AsyncSession = Depends(get_async_session)):
+    return await paginate_async(session, select(AdCategory), AdCategory, page, response, schema=AdCategoryRead)
 
 
 @app.get("/ad_categories/by_ad/{ad_id}")
-def get_ad_categories_by_ad(ad_id: int, session: Session = Depends(get_session)):
-    return session.exec(select(AdCategory).where(AdCategory.ad_id == ad_id)).all()
+async def get_ad_categories_by_ad(ad_id: int, response: Response, page: PageParams = Depends(page_params),
+                                  session: AsyncSession = Depends(get_async_session)):
+    statement = select(AdCategory).where(AdCategory.ad_id == ad_id)
+    return await paginate_async(session, statement, AdCategory, page, response, schema=AdCategoryRead)
 
 
 @app.get("/ad_categories/by_category/{category_id}")
-def get_ad_categories_by_category(category_id: int, session: Session = Depends(get_session)):
-    return session.exec(select(AdCategory).where(AdCategory.category_id == category_id)).all()
+async def get_ad_categories_by_category(category_id: int, response: Response,
+                                        page: PageParams = Depends(page_params),
+                                        session: AsyncSession = Depends(get_async_session)):
+    statement = select(AdCategory).where(AdCategory.category_id == category_id)
+    return await paginate_async(session, statement, AdCategory, page, response, schema=AdCategoryRead)
 
 
-@app.get("/ad_categories/{ad_id}/{category_id}")
-def get_ad_category(category_id: int, ad_id: int, session: Session = Depends(get_session)):
-    category = session.get(AdCategory, (ad_id, category_id))
+@app.get("/ad_categories/{ad_id}/{category_id}", response_model=Optional[AdCategoryRead])
+async def get_ad_category(category_id: int, ad_id: int, session: AsyncSession = Depends(get_async_session)):
+    category = await session.get(AdCategory, (ad_id, category_id))
     return category
 
 
-@app.put("/ad_categories/{ad_id}/{category_id}", response_model=AdCategory)
+@app.put("/ad_categories/{ad_id}/{category_id}", response_model=AdCategoryRead)
 def update_ad_category(category_id: int, ad_id: int, updated_ad_category: AdCategory,
                        session: Session = Depends(get_session)):
     db_ad_category = session.get(AdCategory, (ad_id, category_id))
@@ -420,6 +810,7 @@ def update_ad_category(category_id: int, ad_id: int, updated_ad_category: AdCate
     session.add(db_ad_category)
     session.commit()
     session.refresh(db_ad_category)
+    cache.invalidate(cache.ad_tag(ad_id), cache.ad_tag(db_ad_category.ad_id))
     return db_ad_category
 
 
@@ -428,76 +819,86 @@ def delete_ad_category(category_id: int, ad_id: int, session: Session = Depends(
     db_category = session.get(AdCategory, (ad_id, category_id))
     session.delete(db_category)
     session.commit()
+    cache.invalidate(cache.ad_tag(ad_id))
     return
 
 #Reviews CRUD
 @app.get("/reviews/ad/{ad_id}")
-def get_reviews_by_ad(ad_id: int, session: Session = Depends(get_session)):
+async def get_reviews_by_ad(ad_id: int, response: Response, page: PageParams = Depends(page_params),
+                            session: AsyncSession = Depends(get_async_session)):
     try:
-        ad = session.get(Ad, ad_id)
+        ad = await session.get(Ad, ad_id)
         if not ad:
             raise HTTPException(status_code=404, detail="Ogłoszenie nie znalezione")
 
-        reviews = session.exec(
-            select(Reviews).where(Reviews.ad_id == ad_id)
-        ).all()
-
-        reviews_with_user = []
-        for review in reviews:
-            review_dict = review.dict()
-            reviews_with_user.append(review_dict)
-
-        return reviews_with_user
+        statement = select(Reviews).where(Reviews.ad_id == ad_id)
+        return await paginate_async(session, statement, Reviews, page, response,
+                                    sort_options={"rating": Reviews.rating}, schema=ReviewRead)
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Błąd w get_reviews_by_ad: {str(e)}")
+        logger.exception("Błąd w get_reviews_by_ad")
         raise HTTPException(status_code=500, detail=f"Błąd pobierania recenzji: {str(e)}")
 
 
 @app.get("/reviews/ad/{ad_id}/average")
-def get_average_rating(ad_id: int, session: Session = Depends(get_session)):
+async def get_average_rating(ad_id: int, session: AsyncSession = Depends(get_async_session)):
     try:
-        reviews = session.exec(
-            select(Reviews).where(Reviews.ad_id == ad_id)
-        ).all()
+        summary = ratings.summary(await session.get(AdRating, ad_id))
+        return {"average": summary["average"], "count": summary["count"]}
+    except Exception as e:
+        logger.exception("Błąd w get_average_rating")
+        raise HTTPException(status_code=500, detail=f"Błąd obliczania średniej oceny: {str(e)}")
 
-        if not reviews:
-            return {"average": 0, "count": 0}
 
-        total_rating = sum(review.rating for review in reviews)
-        average = total_rating / len(reviews)
+# Zagregowane oceny wielu ogłoszeń naraz, np. /ratings/ads?ad_ids=1&ad_ids=2
+@app.get("/ratings/ads")
+async def get_ad_ratings(ad_ids: List[int] = Query(...), session: AsyncSession = Depends(get_async_session)):
+    if len(ad_ids) > MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"Maksymalnie {MAX_PAGE_SIZE} ogłoszeń naraz")
+    found = {
+        aggregate.ad_id: aggregate
+        for aggregate in (await session.exec(select(AdRating).where(col(AdRating.ad_id).in_(ad_ids)))).all()
+    }
+    return [{"ad_id": ad_id, **ratings.summary(found.get(ad_id))} for ad_id in dict.fromkeys(ad_ids)]
 
-        return {"average": average, "count": len(reviews)}
-    except Exception as e:
-        print(f"Błąd w get_average_rating: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Błąd obliczania średniej oceny: {str(e)}")
+
+@app.get("/ratings/businesses/{bp_id}")
+async def get_business_rating(bp_id: int, session: AsyncSession = Depends(get_async_session)):
+    return {"bp_id": bp_id, **ratings.summary(await session.get(BusinessRating, bp_id))}
 
 
 # Dodaj ten endpoint do istniejącego /reviews/{review_id}
-@app.get("/reviews/{review_id}")
-def get_review(review_id: int, session: Session = Depends(get_session)):
-    review = session.get(Reviews, review_id)
+@app.get("/reviews/{review_id}", response_model=ReviewRead)
+async def get_review(review_id: int, session: AsyncSession = Depends(get_async_session)):
+    review = await session.get(Reviews, review_id)
     if not review:
         raise HTTPException(status_code=404, detail="Recenzja nie znaleziona")
     return review
 
-@app.post("/reviews")
+@app.post("/reviews", response_model=ReviewRead)
 def create_review(review: Reviews, session: Session = Depends(get_session)):
     session.add(review)
+    ratings.record_review(session, review.ad_id, review.rating)
     session.commit()
     session.refresh(review)
     return review
 
 
 @app.get("/reviews")
-def get_all_reviews(session: Session = Depends(get_session)):
-    return session.exec(select(Reviews)).all()
+async def get_all_reviews(response: Response, page: PageParams = Depends(page_params),
+                          session: AsyncSession = Depends(get_async_session)):
+    return await paginate_async(session, select(Reviews), Reviews, page, response,
+                                sort_options={"rating": Reviews.rating}, schema=ReviewRead)
 
-@app.put("/reviews/{review_id}", response_model=Reviews)
+@app.put("/reviews/{review_id}", response_model=ReviewRead)
 def update_review(review_id: int, updated_review: Reviews, session: Session = Depends(get_session)):
     db_review = session.get(Reviews, review_id)
+    ratings.forget_review(session, db_review.ad_id, db_review.rating)
     for key, value in updated_review.dict().items():
         setattr(db_review, key, value)
     session.add(db_review)
+    ratings.record_review(session, db_review.ad_id, db_review.rating)
     session.commit()
     session.refresh(db_review)
     return db_review
@@ -506,10 +907,129 @@ def update_review(review_id: int, updated_review: Reviews, session: Session = De
 @app.delete("/reviews/{review_id}")
 def delete_review(review_id: int,session: Session = Depends(get_session)):
     db_review = session.get(Reviews, review_id)
+    ratings.forget_review(session, db_review.ad_id, db_review.rating)
     session.delete(db_review)
     session.commit()
     return
 
 
+# Images
+@app.post("/images")
+def upload_image(background_tasks: BackgroundTasks, file: UploadFile = File(...),
+                 session: Session = Depends(get_session)):
+    stored = images.save_upload(session, file)
+    session.commit()
+    if not stored.has_thumbnail:
+        background_tasks.add_task(images.generate_thumbnail, engine, stored.image_hash)
+    url = images.image_url(stored.image_hash)
+    return {"image_hash": stored.image_hash, "url": url, "thumbnail_url": images.thumbnail_url(url)}
+
+
+def _image_response(request: Request, path: str, image_hash: str, media_type: str, variant: str):
+    etag = f'"{image_hash}-{variant}"'
+    # nosniff - przeglądarka nie zgaduje typu, obraz nie wykona się jako HTML/skrypt
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable",
+               "X-Content-Type-Options": "nosniff"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    # FileResponse obsługuje nagłówek Range
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+
+@app.get("/images/{image_hash}")
+def get_image(image_hash: str, request: Request, session: Session = Depends(get_session)):
+    stored = session.get(StoredImage, image_hash)
+    if not stored or not os.path.exists(images.original_path(image_hash)):
+        raise HTTPException(status_code=404, detail="Obraz nie znaleziony")
+    return _image_response(request, images.original_path(image_hash), image_hash, stored.content_type, "original")
+
+
+@app.get("/images/{image_hash}/thumb")
+def get_image_thumbnail(image_hash: str, request: Request, session: Session = Depends(get_session)):
+    stored = session.get(StoredImage, image_hash)
+    if not stored or not os.path.exists(images.original_path(image_hash)):
+        raise HTTPException(status_code=404, detail="Obraz nie znaleziony")
+    if not stored.has_thumbnail:
+        # miniatura jeszcze nie gotowa (albo brak Pillow) - robimy ją teraz lub oddajemy oryginał
+        if not images.make_thumbnail(image_hash):
+            return _image_response(request, images.original_path(image_hash), image_hash,
+                                   stored.content_type, "original")
+        stored.has_thumbnail = True
+        session.add(stored)
+        session.commit()
+    return _image_response(request, images.thumbnail_path(image_hash), image_hash, "image/jpeg", "thumb")
+
+
+# Eksport całych tabel (panel admina, nocne joby analityczne)
+@app.get("/export/{entity}")
+def export_entity(
+        entity: str,
+        request: Request,
+        format: Literal["ndjson", "csv"] = "ndjson",
+        updated_since: Optional[datetime] = None,
+        admin: User = Depends(security.require_admin)
+):
+    if entity not in export.EXPORTS:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Nieznany eksport: {entity}. Dostępne: {', '.join(sorted(export.EXPORTS))}"
+        )
+    gzip = "gzip" in request.headers.get("accept-encoding", "")
+    headers = {"Content-Disposition": f'attachment; filename="{entity}.{format}"', "Vary": "Accept-Encoding"}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        export.stream_export(engine, entity, format, updated_since, gzip=gzip),
+        media_type=export.MEDIA_TYPES[format],
+        headers=headers,
+    )
+
+
+# Dziennik zmian ogłoszeń, użytkowników i opinii (panel admina). GET /changes bez since
+# zwraca tylko bieżącą pozycję - klient pobiera ją przed wczytaniem list, potem
+# słucha /changes/stream od tej pozycji; po zerwaniu połączenia nadrabia przez since.
+CHANGES_PAGE_MAX = config("CHANGES_PAGE_MAX", cast=int, default=1000)
+
+
+@app.get("/changes")
+async def get_changes(since: Optional[int] = Query(None, ge=0),
+                      limit: int = Query(500, ge=1, le=CHANGES_PAGE_MAX),
+                      admin: User = Depends(security.require_admin),
+                      session: AsyncSession = Depends(get_async_session)):
+    oldest, latest = (await session.execute(changes.bounds_statement())).one()
+    if since is None:
+        return {"changes": [], "last_seq": latest or 0, "has_more": False}
+    if changes.missed(since, oldest, latest):
+        raise HTTPException(status_code=410, detail="Historia zmian jest niepełna, pobierz listy ponownie")
+    rows = (await session.execute(changes.since_statement(since, limit + 1))).scalars().all()
+    page = rows[:limit]
+    return {
+        "changes": [changes.as_dict(change) for change in page],
+        "last_seq": page[-1].seq if page else since,
+        "has_more": len(rows) > limit,
+    }
+
+
+# EventSource nie wysyła nagłówka Authorization - przed otwarciem strumienia klient
+# pobiera krótko ważny bilet i podaje go w ?ticket= (token dostępu nie trafia do logów)
+@app.post("/changes/ticket")
+def create_changes_ticket(admin: User = Depends(security.require_admin)):
+    return {"ticket": security.create_stream_ticket(admin), "expires_in": security.STREAM_TICKET_SECONDS}
+
+
+@app.get("/changes/stream")
+async def stream_changes(request: Request, since: Optional[int] = Query(None, ge=0),
+                         admin: User = Depends(security.require_admin_stream)):
+    # EventSource po ponownym połączeniu sam wysyła Last-Event-ID - ma pierwszeństwo przed since
+    last_event_id = request.headers.get("last-event-id", "")
+    if last_event_id.isdigit():
+        since = int(last_event_id)
+    return StreamingResponse(
+        change_feed.feed.stream(since),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 if __name__ == "__main__":
     uvicorn.run(app, host="localhost", port=8000)
\ No newline at end of file
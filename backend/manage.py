@@ -0,0 +1,144 @@
+# Narzędzia administracyjne, uruchamiane z katalogu backend:
+#   python manage.py migrate [--status]
+#   python manage.py explain
+#   python manage.py rebuild-ratings [--check]
+#   python manage.py rebuild-facets [--check]
+#   python manage.py expire-ads            (np. z crona, raz na godzinę)
+#   python manage.py rebuild-similar       (np. z crona, raz na dobę)
+#   python manage.py prune-changes         (np. z crona, raz na godzinę)
+#   python manage.py seed --ads 1000000    (syntetyczne dane do testów obciążeniowych)
+import argparse
+import sys
+import time
+
+from sqlmodel import Session
+from database.database import engine, create_db_and_tables
+from database.migrations import pending_migrations, run_migrations
+from database.query_plans import check_query_plans
+from database.ratings import rebuild_ratings
+from database.facets import rebuild_facets
+from database.similar import rebuild_similar
+from database.ad_fields import expire_ads
+from database.changes import prune_changes
+import seed
+
+
+def cmd_migrate(args):
+    if args.status:
+        pending = pending_migrations(engine)
+        print("pending: " + (", ".join(pending) if pending else "none"))
+        return 0
+    applied = run_migrations(engine)
+    print("applied: " + (", ".join(applied) if applied else "nothing to do"))
+    return 0
+
+
+def cmd_explain(args):
+    if engine.dialect.name != "sqlite":
+        print("explain is only implemented for SQLite")
+        return 0
+    failed = 0
+    for name, plan, uses_index in check_query_plans(engine):
+        failed += not uses_index
+        print(f"[{'ok' if uses_index else 'FULL SCAN'}] {name}")
+        for step in plan:
+            print(f"    {step}")
+    return 1 if failed else 0
+
+
+def cmd_rebuild_ratings(args):
+    with Session(engine) as session:
+        drift = rebuild_ratings(session, repair=not args.check)
+    for kind in ("ads", "businesses"):
+        print(f"{kind}: {len(drift[kind])} out of sync {drift[kind][:20]}")
+    if args.check and (drift["ads"] or drift["businesses"]):
+        return 1
+    return 0
+
+
+def cmd_rebuild_facets(args):
+    with Session(engine) as session:
+        drift = rebuild_facets(session, repair=not args.check)
+    print(f"categories: {len(drift)} out of sync {drift[:20]}")
+    return 1 if args.check and drift else 0
+
+
+def cmd_expire_ads(args):
+    # odpowiedzi z cache serwera wygasną same po RESPONSE_CACHE_TTL
+    with Session(engine) as session:
+        expired = expire_ads(session)
+    print(f"expired: {len(expired)} ads")
+    return 0
+
+
+def cmd_rebuild_similar(args):
+    start = time.perf_counter()
+    with Session(engine) as session:
+        indexed = rebuild_similar(session)
+    print(f"similar: {indexed} ads indexed in {time.perf_counter() - start:.1f} s")
+    return 0
+
+
+def cmd_prune_changes(args):
+    with Session(engine) as session:
+        pruned = prune_changes(session)
+    print(f"changes: {pruned} events pruned")
+    return 0
+
+
+def cmd_seed(args):
+    start = time.perf_counter()
+    with Session(engine) as session:
+        counts = seed.seed(session, users=args.users, businesses=args.businesses, ads=args.ads,
+                           reviews=args.reviews, categories=args.categories, random_seed=args.random_seed,
+                           progress=print)
+    print(", ".join(f"{name}: {count}" for name, count in counts.items()))
+    print(f"seeded in {time.perf_counter() - start:.1f} s, password of every user: {seed.SEED_PASSWORD}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OtoBiznes - narzędzia administracyjne")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate = commands.add_parser("migrate", help="zastosuj oczekujące migracje schematu")
+    migrate.add_argument("--status", action="store_true", help="tylko pokaż oczekujące migracje")
+    migrate.set_defaults(handler=cmd_migrate, setup=False)
+
+    explain = commands.add_parser("explain", help="sprawdź, czy gorące zapytania używają indeksów")
+    explain.set_defaults(handler=cmd_explain)
+
+    rebuild = commands.add_parser("rebuild-ratings", help="przelicz agregaty ocen od zera")
+    rebuild.add_argument("--check", action="store_true", help="tylko wykryj rozbieżności, nie naprawiaj")
+    rebuild.set_defaults(handler=cmd_rebuild_ratings)
+
+    facets = commands.add_parser("rebuild-facets", help="przelicz liczniki ogłoszeń w kategoriach od zera")
+    facets.add_argument("--check", action="store_true", help="tylko wykryj rozbieżności, nie naprawiaj")
+    facets.set_defaults(handler=cmd_rebuild_facets)
+
+    expire = commands.add_parser("expire-ads", help="wygaś ogłoszenia po terminie (due_date)")
+    expire.set_defaults(handler=cmd_expire_ads)
+
+    similar = commands.add_parser("rebuild-similar", help="przelicz indeks podobnych ogłoszeń (wagi TF-IDF) od zera")
+    similar.set_defaults(handler=cmd_rebuild_similar)
+
+    prune = commands.add_parser("prune-changes", help="usuń z dziennika zmian wpisy starsze niż CHANGES_RETENTION_DAYS")
+    prune.set_defaults(handler=cmd_prune_changes)
+
+    fill = commands.add_parser("seed", help="dopisz syntetyczne dane (użytkownicy, firmy, ogłoszenia, opinie)")
+    fill.add_argument("--users", type=int, default=1000)
+    fill.add_argument("--businesses", type=int, default=2000)
+    fill.add_argument("--ads", type=int, default=20000)
+    fill.add_argument("--reviews", type=int, default=50000)
+    fill.add_argument("--categories", type=int, default=len(seed.CATEGORY_SERVICES))
+    fill.add_argument("--random-seed", type=int, default=1)
+    fill.set_defaults(handler=cmd_seed)
+
+    args = parser.parse_args()
+    if getattr(args, "setup", True):
+        create_db_and_tables()
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
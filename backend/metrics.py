@@ -0,0 +1,237 @@
+import logging
+import threading
+import time
+from collections import Counter as StatementCounter
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+from decouple import config
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Pomiary żądań i SQL, wystawiane w formacie tekstowym Prometheusa na /metrics.
+# Zapytania SQL liczymy per żądanie przez zdarzenia kursora na każdym Engine;
+# żądanie znajdujemy przez ContextVar, który FastAPI kopiuje do puli wątków
+# wykonującej synchroniczne handlery.
+
+METRICS_SLOW_REQUEST_MS = config("METRICS_SLOW_REQUEST_MS", cast=float, default=500)
+# więcej zapytań w jednym żądaniu to najpewniej pętla N+1
+METRICS_N_PLUS_ONE_QUERIES = config("METRICS_N_PLUS_ONE_QUERIES", cast=int, default=20)
+# ile zapytań na żądanie zapamiętujemy do logów o wolnych żądaniach/N+1
+METRICS_MAX_LOGGED_STATEMENTS = config("METRICS_MAX_LOGGED_STATEMENTS", cast=int, default=50)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (100, 1000, 10_000, 100_000, 1_000_000, 10_000_000)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict = {}
+        self._lock = threading.Lock()
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = dict(self._values)
+        return self.header() + [f"{self.name}{_labels(self.labelnames, k)} {v}" for k, v in sorted(values.items())]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            # dla każdego zestawu etykiet: licznik na każdy przedział, potem count i sum
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = {labels: list(series) for labels, series in self._values.items()}
+        lines = self.header()
+        for labels, series in sorted(values.items()):
+            *buckets, count, total = series
+            for bound, bucket in zip(self.buckets + ("+Inf",), buckets + [count]):
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {bucket}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+REQUEST_LABELS = ("method", "route")
+
+request_latency = Histogram("http_request_duration_seconds", "Request latency", REQUEST_LABELS + ("status",))
+response_size = Histogram("http_response_size_bytes", "Response body size", REQUEST_LABELS, SIZE_BUCKETS)
+requests_in_flight = Gauge("http_requests_in_flight", "Requests being handled right now")
+sql_queries = Histogram("http_request_sql_queries", "SQL statements per request", REQUEST_LABELS,
+                        QUERY_COUNT_BUCKETS)
+sql_seconds = Counter("http_request_sql_seconds_total", "Time spent in SQL statements", REQUEST_LABELS)
+n_plus_one = Counter("http_request_n_plus_one_total",
+                     f"Requests with more than {METRICS_N_PLUS_ONE_QUERIES} SQL statements", REQUEST_LABELS)
+slow_requests = Counter("http_slow_requests_total",
+                        f"Requests slower than {METRICS_SLOW_REQUEST_MS:g} ms", REQUEST_LABELS)
+
+METRICS = [request_latency, response_size, requests_in_flight, sql_queries, sql_seconds, n_plus_one, slow_requests]
+
+# dodatkowe linie na końcu /metrics (np. liczniki cache odpowiedzi), rejestrowane przez inne moduły
+collectors: list[Callable[[], list[str]]] = []
+
+
+def render() -> str:
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    for collect in collectors:
+        lines.extend(collect())
+    return "\n".join(lines) + "\n"
+
+
+class RequestStats:
+    def __init__(self):
+        # ustawiane po wysłaniu odpowiedzi - zadań w tle nie liczymy
+        self.done = False
+        self.queries = 0
+        self.sql_time = 0.0
+        self.statements: list[tuple[str, float]] = []
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    stats = _current.get()
+    if stats is None or stats.done:
+        return
+    stats.queries += 1
+    stats.sql_time += elapsed
+    if len(stats.statements) < METRICS_MAX_LOGGED_STATEMENTS:
+        stats.statements.append((statement, elapsed))
+
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    # zapytania zakończone błędem nie dochodzą do after_cursor_execute
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_start"):
+        conn.info["query_start"].pop()
+
+
+def _statement_summary(stats: RequestStats) -> str:
+    return "\n".join(f"  {elapsed * 1000:7.2f} ms  {' '.join(sql.split())[:300]}" for sql, elapsed in stats.statements)
+
+
+class MetricsMiddleware:
+    # czysty middleware ASGI, więc nie przeszkadza odpowiedziom strumieniowym ani zadaniom w tle
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        end = None
+        status = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size, end
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if (b"content-type", b"text/event-stream") in (
+                        (name.lower(), value.split(b";")[0]) for name, value in message.get("headers", ())):
+                    # strumienie zdarzeń są otwarte minutami - ich czas to czas do wysłania nagłówków
+                    end = time.perf_counter()
+                    stats.done = True
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+                if not message.get("more_body", False) and end is None:
+                    end = time.perf_counter()
+                    stats.done = True
+            await send(message)
+
+        requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            requests_in_flight.dec()
+            _current.reset(token)
+            self._record(scope, stats, status, size, (end or time.perf_counter()) - start)
+
+    def _record(self, scope, stats: RequestStats, status: int, size: int, elapsed: float):
+        # szablon ścieżki, nie surowa ścieżka - jedna seria na endpoint
+        route = scope.get("route")
+        labels = (scope["method"], getattr(route, "path", "unmatched"))
+        request_latency.observe(elapsed, *labels, str(status))
+        response_size.observe(size, *labels)
+        sql_queries.observe(stats.queries, *labels)
+        sql_seconds.inc(*labels, amount=stats.sql_time)
+
+        if stats.queries > METRICS_N_PLUS_ONE_QUERIES:
+            n_plus_one.inc(*labels)
+            statement, repeats = StatementCounter(sql for sql, _ in stats.statements).most_common(1)[0]
+            logger.warning("Possible N+1 in %s %s: %d SQL statements, most repeated (%dx): %s",
+                           *labels, stats.queries, repeats, " ".join(statement.split())[:300])
+        if elapsed * 1000 > METRICS_SLOW_REQUEST_MS:
+            slow_requests.inc(*labels)
+            logger.warning("Slow request %s %s: %.0f ms, %d SQL statements (%.0f ms)\n%s",
+                           *labels, elapsed * 1000, stats.queries, stats.sql_time * 1000,
+                           _statement_summary(stats))
@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+
+from decouple import config
+from sqlalchemy import and_, or_, update
+from sqlmodel import Session, select, col
+from database.models import Ad
+from database import changes, facets
+
+# Kolejka moderacji: oczekujące ogłoszenia od najstarszych. Moderator bierze porcję
+# na MODERATION_LEASE_SECONDS; porcja nierozpatrzona na czas wygasa i ogłoszenia
+# wracają do kolejki. Branie i decyzja to pojedyncze UPDATE-y, które ponownie
+# sprawdzają dzierżawę, więc dwóch moderatorów nigdy nie dostanie tego samego ogłoszenia.
+
+MODERATION_LEASE_SECONDS = config("MODERATION_LEASE_SECONDS", cast=int, default=300)
+MODERATION_CLAIM_MAX = config("MODERATION_CLAIM_MAX", cast=int, default=100)
+
+_BULK = {"synchronize_session": False}
+
+
+def pending(statement):
+    return statement.where(Ad.status == False, col(Ad.rejected_at).is_(None))
+
+
+def _available_to(moderator_id: int, now: datetime):
+    # niewzięte, dzierżawa wygasła albo już nasze
+    return or_(
+        col(Ad.claimed_by).is_(None),
+        col(Ad.claim_expires_at) < now,
+        col(Ad.claimed_by) == moderator_id,
+    )
+
+
+def claim_ads(session: Session, moderator_id: int, limit: int) -> list[Ad]:
+    # ogłoszenia już wzięte przez tego moderatora wliczają się do limitu i dostają przedłużoną dzierżawę
+    now = datetime.utcnow()
+    candidates = (
+        pending(select(Ad.ad_id))
+        .where(_available_to(moderator_id, now))
+        .order_by(col(Ad.created_at), col(Ad.ad_id))
+        .limit(min(limit, MODERATION_CLAIM_MAX))
+    )
+    claimed = session.execute(
+        update(Ad)
+        .where(col(Ad.ad_id).in_(candidates), _available_to(moderator_id, now))
+        .values(claimed_by=moderator_id, claim_expires_at=now + timedelta(seconds=MODERATION_LEASE_SECONDS))
+        .returning(Ad.ad_id),
+        execution_options=_BULK,
+    ).scalars().all()
+    session.commit()
+    if not claimed:
+        return []
+    return list(session.exec(
+        select(Ad).where(col(Ad.ad_id).in_(claimed)).order_by(col(Ad.created_at), col(Ad.ad_id))
+    ).all())
+
+
+def release_ads(session: Session, moderator_id: int, ad_ids: list[int]) -> list[int]:
+    released = session.execute(
+        update(Ad)
+        .where(col(Ad.ad_id).in_(ad_ids), col(Ad.claimed_by) == moderator_id)
+        .values(claimed_by=None, claim_expires_at=None)
+        .returning(Ad.ad_id),
+        execution_options=_BULK,
+    ).scalars().all()
+    session.commit()
+    return list(released)
+
+
+def decide(session: Session, moderator_id: int, ad_ids: list[int], approve: bool) -> list[tuple[int, int]]:
+    # jeden UPDATE dla całej porcji; ogłoszenia już nieoczekujące albo wzięte przez
+    # innego moderatora są pomijane. Zwraca (ad_id, bp_id) zmienionych ogłoszeń.
+    now = datetime.utcnow()
+    changed = session.execute(
+        pending(update(Ad))
+        .where(and_(col(Ad.ad_id).in_(ad_ids), _available_to(moderator_id, now)))
+        .values(
+            status=approve,
+            rejected_at=None if approve else now,
+            claimed_by=None,
+            claim_expires_at=None,
+        )
+        .returning(Ad.ad_id, Ad.bp_id),
+        execution_options=_BULK,
+    ).tuples().all()
+    if approve and changed:
+        facets.add_ads(session, [ad_id for ad_id, _ in changed])
+    # zatwierdzenie to w dzienniku zmian "approve", odrzucenie to zwykłe "update"
+    changes.record(session, "ad", "approve" if approve else "update", [ad_id for ad_id, _ in changed])
+    session.commit()
+    return list(changed)
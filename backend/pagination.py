@@ -0,0 +1,182 @@
+import base64
+import json
+from datetime import date, datetime
+from typing import Callable, Optional
+
+from decouple import config
+from fastapi import HTTPException, Query, Response
+from pydantic import BaseModel
+from sqlalchemy import or_, tuple_
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from serialization import RawJSONResponse, encode_rows
+
+DEFAULT_PAGE_SIZE = config("PAGE_SIZE_DEFAULT", cast=int, default=100)
+MAX_PAGE_SIZE = config("PAGE_SIZE_MAX", cast=int, default=1000)
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class PageParams(BaseModel):
+    limit: int
+    cursor: Optional[str] = None
+    sort: Optional[str] = None
+    fields: Optional[str] = None
+
+
+def page_params(
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = None,
+        sort: Optional[str] = None,
+        fields: Optional[str] = None
+) -> PageParams:
+    return PageParams(limit=limit, cursor=cursor, sort=sort, fields=fields)
+
+
+def encode_cursor(sort: str, values: list) -> str:
+    # datetime też jest date (created_at, due_on)
+    payload = [sort, [v.isoformat() if isinstance(v, date) else v for v in values]]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str, key_exprs: list) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, values = json.loads(raw)
+        if cursor_sort != sort or len(values) != len(key_exprs):
+            raise ValueError
+        return [_from_json(expr, value) for expr, value in zip(key_exprs, values)]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Nieprawidłowy kursor")
+
+
+def _from_json(expr, value):
+    try:
+        python_type = expr.type.python_type
+    except NotImplementedError:
+        return value
+    if value is not None and python_type is datetime:
+        return datetime.fromisoformat(value)
+    if value is not None and python_type is date:
+        return date.fromisoformat(value)
+    return value
+
+
+def apply_keyset(statement, page: PageParams, pk_columns: list, sort_options: Optional[dict] = None,
+                 default_sort: Optional[str] = None):
+    # Paginacja po kluczu: wiersze są sortowane po (kolumna sortowania, klucz główny),
+    # a następna strona zaczyna się zaraz za ostatnim zwróconym kluczem, więc każda
+    # strona to zakres na indeksie zamiast OFFSET po całej tabeli.
+    # Wiersze z NULL w kolumnie sortowania (np. cena, której nie da się odczytać)
+    # są na końcu w obu kierunkach, posortowane po kluczu głównym.
+    # Kolumny klucza są dodawane do selecta jako _key0.._keyN dla next_page().
+    sort_options = dict(sort_options or {})
+    for column in pk_columns:
+        sort_options.setdefault(column.name, column)
+    sort = page.sort or default_sort or pk_columns[0].name
+    descending = sort.startswith("-")
+    sort_name = sort.lstrip("-")
+    if sort_name not in sort_options:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Nieobsługiwane sortowanie: {sort_name}. Dozwolone: {', '.join(sorted(sort_options))}"
+        )
+
+    sort_expr = sort_options[sort_name]
+    key_exprs = [sort_expr] + [c for c in pk_columns if c is not sort_expr]
+    nullable = getattr(sort_expr, "nullable", False)
+    statement = statement.add_columns(*[expr.label(f"_key{i}") for i, expr in enumerate(key_exprs)])
+
+    def after(exprs, values):
+        return tuple_(*exprs) < tuple_(*values) if descending else tuple_(*exprs) > tuple_(*values)
+
+    if page.cursor:
+        values = decode_cursor(page.cursor, sort, key_exprs)
+        if not nullable:
+            statement = statement.where(after(key_exprs, values))
+        elif values[0] is None:
+            # już wśród wierszy bez wartości
+            statement = statement.where(sort_expr.is_(None), after(key_exprs[1:], values[1:]))
+        else:
+            # NULL nie jest ani większy, ani mniejszy, te wiersze idą po wszystkich innych
+            statement = statement.where(or_(after(key_exprs, values), sort_expr.is_(None)))
+
+    order = [expr.desc() if descending else expr.asc() for expr in key_exprs]
+    if nullable:
+        order.insert(0, sort_expr.is_(None).asc())
+    statement = statement.order_by(None).order_by(*order).limit(page.limit + 1)
+    return statement, sort, len(key_exprs)
+
+
+def next_page(rows: list, page: PageParams, sort: str, key_count: int, response: Response) -> list:
+    if len(rows) <= page.limit:
+        return rows
+    rows = rows[:page.limit]
+    last = rows[-1]._mapping
+    response.headers[NEXT_CURSOR_HEADER] = encode_cursor(sort, [last[f"_key{i}"] for i in range(key_count)])
+    return rows
+
+
+def _page_statement(statement, model, page: PageParams, sort_options: Optional[dict],
+                    default_sort: Optional[str], schema: Optional[type[BaseModel]]):
+    # Wybieramy tylko kolumny schematu odczytu, a wiersze kodujemy prosto do JSON -
+    # bez obiektów ORM i bez jsonable_encoder po drodze.
+    table = model.__table__
+    readable = [c.name for c in table.columns if schema is None or c.name in schema.model_fields]
+
+    if page.fields:
+        field_names = [f.strip() for f in page.fields.split(",") if f.strip()]
+        unknown = [f for f in field_names if f not in readable]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Nieznane pola: {', '.join(unknown)}")
+    else:
+        field_names = readable
+
+    statement = statement.with_only_columns(*[table.columns[name] for name in field_names])
+    statement, sort, key_count = apply_keyset(
+        statement, page, list(table.primary_key.columns), sort_options, default_sort
+    )
+    return statement, field_names, sort, key_count
+
+
+def _page_response(rows: list, page: PageParams, sort: str, key_count: int, field_names: list,
+                   response: Response, transform: Optional[Callable[[dict], dict]]) -> RawJSONResponse:
+    rows = next_page(rows, page, sort, key_count, response)
+    headers = {k: v for k, v in response.headers.items() if k not in ("content-length", "content-type")}
+    return RawJSONResponse(encode_rows(rows, field_names, transform), headers=headers)
+
+
+def paginate(
+        session: Session,
+        statement,
+        model,
+        page: PageParams,
+        response: Response,
+        sort_options: Optional[dict] = None,
+        default_sort: Optional[str] = None,
+        transform: Optional[Callable[[dict], dict]] = None,
+        schema: Optional[type[BaseModel]] = None
+) -> RawJSONResponse:
+    statement, field_names, sort, key_count = _page_statement(statement, model, page, sort_options,
+                                                              default_sort, schema)
+    rows = session.execute(statement).all()
+    return _page_response(rows, page, sort, key_count, field_names, response, transform)
+
+
+async def paginate_async(
+        session: AsyncSession,
+        statement,
+        model,
+        page: PageParams,
+        response: Response,
+        sort_options: Optional[dict] = None,
+        default_sort: Optional[str] = None,
+        transform: Optional[Callable[[dict], dict]] = None,
+        schema: Optional[type[BaseModel]] = None
+) -> RawJSONResponse:
+    # paginate() dla handlerów działających w pętli zdarzeń (database.get_async_session)
+    statement, field_names, sort, key_count = _page_statement(statement, model, page, sort_options,
+                                                              default_sort, schema)
+    rows = (await session.execute(statement)).all()
+    return _page_response(rows, page, sort, key_count, field_names, response, transform)
@@ -0,0 +1,272 @@
+import asyncio
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from urllib.parse import parse_qs
+
+from decouple import config
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from starlette.routing import compile_path
+import metrics
+import security
+
+logger = logging.getLogger(__name__)
+
+# Limity żądań i odrzucanie nadmiaru przed handlerami. Każdy klient ma
+# kubełek żetonów - na użytkownika, gdy żądanie ma poprawny token, a w przeciwnym
+# razie na IP - i żądanie zabiera tyle żetonów, ile kosztuje jego ścieżka
+# (ROUTE_COSTS: hashowanie argon2 i listy bez filtrów kosztują więcej); pusty
+# kubełek odpowiada 429 z Retry-After. Niezależnie od tego naraz wykonuje się
+# najwyżej ADMISSION_MAX_CONCURRENT żądań, do ADMISSION_MAX_QUEUE czeka na miejsce,
+# a każde kolejne od razu dostaje 503 z Retry-After.
+
+# memory (domyślnie, osobno w każdym procesie), redis (wspólny dla workerów) albo none
+RATE_LIMIT_BACKEND = config("RATE_LIMIT_BACKEND", default="memory")
+# żetonów na sekundę i pojemność kubełka
+RATE_LIMIT_IP_RATE = config("RATE_LIMIT_IP_RATE", cast=float, default=10)
+RATE_LIMIT_IP_BURST = config("RATE_LIMIT_IP_BURST", cast=float, default=60)
+RATE_LIMIT_USER_RATE = config("RATE_LIMIT_USER_RATE", cast=float, default=20)
+RATE_LIMIT_USER_BURST = config("RATE_LIMIT_USER_BURST", cast=float, default=120)
+# IP klienta z X-Forwarded-For - tylko za proxy, które ten nagłówek ustawia
+RATE_LIMIT_TRUST_FORWARDED = config("RATE_LIMIT_TRUST_FORWARDED", cast=bool, default=False)
+# ile kubełków trzymamy w pamięci; najdawniej używane są usuwane (= znowu pełne)
+RATE_LIMIT_MAX_KEYS = config("RATE_LIMIT_MAX_KEYS", cast=int, default=100_000)
+REDIS_URL = config("REDIS_URL", default="redis://localhost:6379/0")
+RATE_LIMIT_REDIS_PREFIX = config("RATE_LIMIT_REDIS_PREFIX", default="bitehack:ratelimit:")
+
+# 0 wyłącza globalny limit
+ADMISSION_MAX_CONCURRENT = config("ADMISSION_MAX_CONCURRENT", cast=int, default=200)
+ADMISSION_MAX_QUEUE = config("ADMISSION_MAX_QUEUE", cast=int, default=1000)
+ADMISSION_QUEUE_TIMEOUT = config("ADMISSION_QUEUE_TIMEOUT", cast=float, default=10)
+ADMISSION_RETRY_AFTER = config("ADMISSION_RETRY_AFTER", cast=int, default=1)
+
+# nigdy nie limitowane ani nie kolejkowane (monitoring)
+EXEMPT_PATHS = {"/metrics"}
+# długo otwarte strumienie: limitowane przy połączeniu, ale zajmowałyby miejsce
+# przez minuty, choć między zdarzeniami nic nie kosztują
+STREAMING_PATHS = {"/changes/stream"}
+
+_AD_FILTERS = {"search", "category_id", "lat", "min_price", "max_price"}
+
+
+def _ad_listing_cost(query: dict) -> int:
+    # listy z filtrami to zakresy na indeksach, lista bez filtrów przechodzi przez całą tabelę
+    return 2 if _AD_FILTERS & query.keys() else 5
+
+
+# (metoda, ścieżka) -> żetony albo funkcja parametrów zapytania; pozostałe ścieżki kosztują 1
+ROUTE_COSTS = {
+    ("POST", "/login"): 10,
+    ("POST", "/register"): 10,
+    ("POST", "/users"): 10,
+    ("PUT", "/users/{user_id}"): 10,
+    ("POST", "/reviews"): 5,
+    ("POST", "/images"): 5,
+    ("POST", "/ads/bulk"): 20,
+    ("POST", "/ad_categories/bulk"): 20,
+    ("GET", "/ads"): _ad_listing_cost,
+    ("GET", "/export/{entity}"): 20,
+}
+
+_compiled_costs = [(method, compile_path(path)[0], cost) for (method, path), cost in ROUTE_COSTS.items()]
+
+rate_limited = metrics.Counter("http_rate_limited_total", "Requests rejected by the rate limiter", ("client",))
+shed = metrics.Counter("http_requests_shed_total", "Requests rejected by admission control", ("reason",))
+queued = metrics.Gauge("http_requests_queued", "Requests waiting for an admission slot")
+metrics.collectors.append(lambda: rate_limited.render() + shed.render() + queued.render())
+
+
+def route_cost(scope) -> int:
+    for method, regex, cost in _compiled_costs:
+        if scope["method"] == method and regex.match(scope["path"]):
+            return cost(parse_qs(scope.get("query_string", b"").decode("latin-1"))) if callable(cost) else cost
+    return 1
+
+
+def client_key(scope) -> tuple[str, str, float, float]:
+    # (rodzaj, klucz, tempo, pojemność)
+    headers = dict(scope.get("headers") or [])
+    authorization = headers.get(b"authorization", b"").decode("latin-1")
+    if authorization[:7].lower() == "bearer ":
+        try:
+            claims = security.get_token_claims(authorization[7:])
+            return "user", str(claims.user_id), RATE_LIMIT_USER_RATE, RATE_LIMIT_USER_BURST
+        except HTTPException:
+            pass  # handler odpowie 401, żądanie i tak liczy się do limitu IP
+    forwarded = headers.get(b"x-forwarded-for")
+    if RATE_LIMIT_TRUST_FORWARDED and forwarded:
+        ip = forwarded.decode("latin-1").split(",")[0].strip()
+    else:
+        ip = scope["client"][0] if scope.get("client") else "unknown"
+    return "ip", ip, RATE_LIMIT_IP_RATE, RATE_LIMIT_IP_BURST
+
+
+class MemoryBuckets:
+    # Kubełki żetonów jako GCRA: dla każdego klucza trzymamy tylko "teoretyczny czas
+    # przybycia" - moment, w którym kubełek znowu jest pełny. Osobno w każdym procesie.
+    backend = "memory"
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._tat: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def take(self, key: str, cost: float, rate: float, burst: float, now: Optional[float] = None) -> float:
+        # 0, gdy żetony zostały pobrane, w przeciwnym razie sekundy do ich dostępności
+        now = time.monotonic() if now is None else now
+        interval = 1 / rate
+        with self._lock:
+            tat = max(self._tat.get(key, now), now)
+            new_tat = tat + cost * interval
+            wait = new_tat - burst * interval - now
+            if wait > 0:
+                return wait
+            self._tat[key] = new_tat
+            self._tat.move_to_end(key)
+            while len(self._tat) > self.max_keys:
+                self._tat.popitem(last=False)
+        return 0.0
+
+
+# ten sam GCRA w jednym atomowym kroku po stronie Redisa; klucz wygasa, gdy kubełek jest pełny
+_GCRA_SCRIPT = """
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local burst = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local tat = tonumber(redis.call('GET', KEYS[1]) or ARGV[1])
+if tat < now then tat = now end
+local new_tat = tat + cost * interval
+local wait = new_tat - burst * interval - now
+if wait > 0 then return tostring(wait) end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000) + 1)
+return '0'
+"""
+
+
+class RedisBuckets:
+    # Wspólny dla workerów. `client` to cokolwiek z metodą eval() z redis.asyncio,
+    # więc testy mogą podać zamiennik w pamięci. Czas zegarowy, bo workery
+    # mogą działać na różnych maszynach.
+    backend = "redis"
+
+    def __init__(self, client, prefix: str = RATE_LIMIT_REDIS_PREFIX):
+        self.client = client
+        self.prefix = prefix
+
+    async def take(self, key: str, cost: float, rate: float, burst: float, now: Optional[float] = None) -> float:
+        now = time.time() if now is None else now
+        try:
+            wait = await self.client.eval(_GCRA_SCRIPT, 1, self.prefix + key, now, 1 / rate, burst, cost)
+        except Exception as e:
+            # Redis niedostępny - lepiej obsłużyć bez limitów niż wcale
+            logger.warning("Rate limiter backend failed, letting the request through: %s", e)
+            return 0.0
+        return float(wait)
+
+
+def create_buckets(backend: str = RATE_LIMIT_BACKEND):
+    if backend == "none":
+        return None
+    if backend == "redis":
+        try:
+            import redis.asyncio
+        except ImportError:
+            logger.warning("RATE_LIMIT_BACKEND=redis but the redis package is missing, using memory buckets")
+        else:
+            return RedisBuckets(redis.asyncio.Redis.from_url(REDIS_URL))
+    return MemoryBuckets()
+
+
+class Admission:
+    # globalny limit wykonywanych żądań z ograniczoną kolejką oczekujących
+    def __init__(self, max_concurrent: int, max_queue: int, timeout: float):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.waiting = 0
+        self._semaphore = None
+        self._loop = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # związane z bieżącą pętlą zdarzeń (TestClient tworzy nową dla każdego klienta)
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+            self._loop = loop
+        return self._semaphore
+
+    async def acquire(self) -> Optional[str]:
+        # None, gdy wpuszczone, w przeciwnym razie powód odmowy
+        if self.max_concurrent <= 0:
+            return None
+        semaphore = self._get_semaphore()
+        if not semaphore.locked():
+            await semaphore.acquire()
+            return None
+        if self.waiting >= self.max_queue:
+            return "queue_full"
+        self.waiting += 1
+        queued.inc()
+        try:
+            await asyncio.wait_for(semaphore.acquire(), self.timeout)
+            return None
+        except asyncio.TimeoutError:
+            return "timeout"
+        finally:
+            self.waiting -= 1
+            queued.dec()
+
+    def release(self):
+        if self.max_concurrent > 0:
+            self._semaphore.release()
+
+
+buckets = create_buckets()
+admission = Admission(ADMISSION_MAX_CONCURRENT, ADMISSION_MAX_QUEUE, ADMISSION_QUEUE_TIMEOUT)
+
+
+async def _reject(scope, receive, send, status_code: int, detail: str, retry_after: int):
+    response = JSONResponse({"detail": detail}, status_code=status_code, headers={"Retry-After": str(retry_after)})
+    await response(scope, receive, send)
+
+
+class RateLimitMiddleware:
+    # czysty middleware ASGI jak metrics.MetricsMiddleware; miejsce jest zajęte, aż
+    # wyślemy całą odpowiedź (także strumieniową)
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        if buckets is not None:
+            kind, key, rate, burst = client_key(scope)
+            wait = await buckets.take(f"{kind}:{key}", min(route_cost(scope), burst), rate, burst)
+            if wait > 0:
+                rate_limited.inc(kind)
+                await _reject(scope, receive, send, 429, "Zbyt wiele żądań, spróbuj ponownie za chwilę",
+                              math.ceil(wait))
+                return
+
+        if scope["path"] in STREAMING_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        reason = await admission.acquire()
+        if reason is not None:
+            shed.inc(reason)
+            logger.info("Admission control rejected %s %s (%s)", scope["method"], scope["path"], reason)
+            await _reject(scope, receive, send, 503, "Serwer jest przeciążony, spróbuj ponownie za chwilę",
+                          ADMISSION_RETRY_AFTER)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission.release()
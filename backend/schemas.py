@@ -1,4 +1,16 @@
-from pydantic import BaseModel, EmailStr
+from datetime import date, datetime
+from typing import List, Literal, Optional
+
+from pydantic import BaseModel, ConfigDict, Field
+
+# Schematy odczytu: co API zwraca dla każdej tabeli. Dzięki oddzieleniu ich od
+# modeli tabel wewnętrzne kolumny (hashed_password, token_version) nigdy nie wychodzą
+# poza backend, a listy wybierają tylko te kolumny (pagination.paginate).
+
+
+class ReadModel(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
 
 class UserCreate(BaseModel):
     email: str
@@ -6,13 +18,96 @@ class UserCreate(BaseModel):
     last_name: str
     password: str
 
-class UserRead(BaseModel):
+class UserRead(ReadModel):
+    user_id: int
+    email: str
+    first_name: str
+    last_name: str
+    role: str
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+class BusinessRead(ReadModel):
+    bp_id: int
     user_id: int
-    email: EmailStr
+    bp_name: str
+    description: Optional[str] = None
+    address: str
+    phone: str
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+
+class CategoryRead(ReadModel):
+    category_id: int
+    category_name: str
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+class AdRead(ReadModel):
+    ad_id: int
+    ad_title: str
+    bp_id: int
+    description: Optional[str] = None
+    images: List[str]
+    price: str
+    address: str
+    post_date: str
+    due_date: str
+    status: bool
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+    rejected_at: Optional[datetime] = None
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+    price_amount: Optional[int] = None
+    price_currency: Optional[str] = None
+    post_on: Optional[date] = None
+    due_on: Optional[date] = None
+    expired_at: Optional[datetime] = None
+
+class ModerationAdRead(AdRead):
+    claimed_by: Optional[int] = None
+    claim_expires_at: Optional[datetime] = None
+
+class AdCategoryRead(ReadModel):
+    ad_id: int
+    category_id: int
+    created_at: datetime
+
+class ReviewRead(ReadModel):
+    review_id: int
+    ad_id: int
+    title: str
+    description: str
+    rating: float
+    updated_at: Optional[datetime] = None
+
+# elementy dla POST /ads/bulk i /ad_categories/bulk
+class AdImport(BaseModel):
+    ad_title: str
+    bp_id: int
+    description: Optional[str] = None
+    images: List[str] = []
+    price: str
+    address: str
+    post_date: str
+    due_date: str
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+    category_ids: List[int] = []
+
+class AdCategoryImport(BaseModel):
+    ad_id: int
+    category_id: int
+
+class AdIdList(BaseModel):
+    ad_ids: List[int] = Field(min_length=1, max_length=1000)
 
-    class Config:
-        orm_mode = True
+class ModerationDecision(AdIdList):
+    action: Literal["approve", "reject"] = "approve"
 
 class Token(BaseModel):
     access_token: str
-    token_type: str
\ No newline at end of file
+    token_type: str
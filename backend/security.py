@@ -1,28 +1,139 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from typing import Optional
+
 from jose import jwt, JWTError
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlmodel import Session, select
+from pydantic import BaseModel
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from decouple import config
-from database.database import get_session
+from database.database import get_async_session
 from database.models import User
 
+logger = logging.getLogger(__name__)
+
 SECRET_KEY = config("SECRET_KEY")
 ALGORITHM = config("ALGORITHM", default="HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = config("ACCESS_TOKEN_EXPIRE_MINUTES", cast=int, default=60)
+USER_CACHE_SIZE = config("USER_CACHE_SIZE", cast=int, default=1024)
+USER_CACHE_TTL = config("USER_CACHE_TTL", cast=float, default=60)
+# ważność biletów otwierających strumień zdarzeń (trafiają do logów dostępu)
+STREAM_TICKET_SECONDS = config("STREAM_TICKET_SECONDS", cast=int, default=30)
+
+# koszt argon2; hashe z innymi parametrami są podmieniane przy następnym logowaniu
+ARGON2_TIME_COST = config("ARGON2_TIME_COST", cast=int, default=3)
+ARGON2_MEMORY_COST = config("ARGON2_MEMORY_COST", cast=int, default=65536)
+ARGON2_PARALLELISM = config("ARGON2_PARALLELISM", cast=int, default=4)
+# hashowanie idzie na osobnej puli: najwyżej HASH_WORKERS naraz i HASH_QUEUE_SIZE
+# w kolejce, ponad to odpowiadamy 503 zamiast odkładać kolejne żądania
+HASH_WORKERS = config("HASH_WORKERS", cast=int, default=min(4, os.cpu_count() or 1))
+HASH_QUEUE_SIZE = config("HASH_QUEUE_SIZE", cast=int, default=HASH_WORKERS * 4)
+HASH_RETRY_AFTER = config("HASH_RETRY_AFTER", cast=int, default=1)
 
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["argon2"],
+    deprecated="auto",
+    argon2__time_cost=ARGON2_TIME_COST,
+    argon2__memory_cost=ARGON2_MEMORY_COST,
+    argon2__parallelism=ARGON2_PARALLELISM,
+)
+
+_hash_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="argon2")
+_hash_slots = threading.BoundedSemaphore(HASH_WORKERS + HASH_QUEUE_SIZE)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
 
+class TokenClaims(BaseModel):
+    user_id: int
+    role: Optional[str] = None
+    email: Optional[str] = None
+    version: int = 0
+
+
+class UserCache:
+    # Mały LRU wczytanych użytkowników po (user_id, token_version), wpisy wygasają
+    # po `ttl` sekundach. Osobny w każdym procesie - handlery update/delete go unieważniają,
+    # a TTL ogranicza nieaktualność między workerami. maxsize=0 wyłącza cache.
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int, version: int) -> Optional[User]:
+        with self._lock:
+            entry = self._entries.get((user_id, version))
+            if entry is None:
+                return None
+            user, expires = entry
+            if expires < time.monotonic():
+                del self._entries[(user_id, version)]
+                return None
+            self._entries.move_to_end((user_id, version))
+            return user
+
+    def put(self, user: User):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            key = (user.user_id, user.token_version)
+            self._entries[key] = (user, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == user_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
+
+def invalidate_user(user_id: int):
+    user_cache.invalidate(user_id)
+
+
+def _run_hashing(func, *args):
+    # argon2-cffi zwalnia GIL, więc wątki puli liczą hashe równolegle
+    if not _hash_slots.acquire(blocking=False):
+        logger.info("Password hashing pool saturated, rejecting request")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Serwer jest przeciążony, spróbuj ponownie za chwilę",
+            headers={"Retry-After": str(HASH_RETRY_AFTER)},
+        )
+    try:
+        return _hash_executor.submit(func, *args).result()
+    finally:
+        _hash_slots.release()
+
+
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return _run_hashing(pwd_context.hash, password)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return _run_hashing(pwd_context.verify, plain_password, hashed_password)
+
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    # new_hash jest ustawiony, gdy zapisany hash ma nieaktualne parametry argon2
+    return _run_hashing(pwd_context.verify_and_update, plain_password, hashed_password)
 
 
 def create_access_token(data: dict, expires_delta: int = ACCESS_TOKEN_EXPIRE_MINUTES):
@@ -32,29 +143,98 @@ def create_access_token(data: dict, expires_delta: int = ACCESS_TOKEN_EXPIRE_MIN
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    session: Session = Depends(get_session)
-) -> User:
-    print(token)
-    print("gg")
-    credentials_exception = HTTPException(
+def create_user_token(user: User):
+    # dzięki role/email sprawdzenia uprawnień przy odczytach nie sięgają do bazy (get_token_claims)
+    return create_access_token({
+        "sub": str(user.user_id),
+        "role": user.role,
+        "email": user.email,
+        "ver": user.token_version,
+    })
+
+
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Invalid authentication credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    print(token)
+
+
+def _decode_claims(token: str, ticket: bool) -> TokenClaims:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
+        user_id = payload.get("sub")
+        # bilet otwiera tylko strumień zdarzeń, a token dostępu nie jest biletem
+        if user_id is None or (payload.get("typ") == "stream") != ticket:
+            raise _credentials_exception()
+        return TokenClaims(
+            user_id=int(user_id),
+            role=payload.get("role"),
+            email=payload.get("email"),
+            version=payload.get("ver", 0),
+        )
+    except (JWTError, ValueError) as e:
+        logger.debug("Rejected token: %s", e)
+        raise _credentials_exception()
+
+
+def get_token_claims(token: str = Depends(oauth2_scheme)) -> TokenClaims:
+    return _decode_claims(token, ticket=False)
+
+
+def create_stream_ticket(user: User) -> str:
+    expire = datetime.utcnow() + timedelta(seconds=STREAM_TICKET_SECONDS)
+    return jwt.encode({"sub": str(user.user_id), "ver": user.token_version, "typ": "stream", "exp": expire},
+                      SECRET_KEY, algorithm=ALGORITHM)
+
+
+def get_stream_token_claims(request: Request, ticket: Optional[str] = None) -> TokenClaims:
+    # EventSource nie wyśle nagłówka Authorization, więc strumienie zdarzeń przyjmują też
+    # ?ticket= (create_stream_ticket) - nigdy sam token dostępu, adresy URL trafiają do logów
+    scheme, _, value = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and value:
+        return _decode_claims(value, ticket=False)
+    if not ticket:
+        raise _credentials_exception()
+    return _decode_claims(ticket, ticket=True)
+
+
+async def _load_user(claims: TokenClaims, session: AsyncSession) -> User:
+    user = user_cache.get(claims.user_id, claims.version)
+    if user is not None:
+        return user
+
+    user = await session.get(User, claims.user_id)
+    if user is None or user.token_version != claims.version:
+        logger.info("Token for user %s is no longer valid", claims.user_id)
+        raise _credentials_exception()
+
+    user_cache.put(user)
+    return user
+
+
+async def get_current_user(
+    claims: TokenClaims = Depends(get_token_claims),
+    session: AsyncSession = Depends(get_async_session)
+) -> User:
+    return await _load_user(claims, session)
+
+
+async def get_stream_user(
+    claims: TokenClaims = Depends(get_stream_token_claims),
+    session: AsyncSession = Depends(get_async_session)
+) -> User:
+    return await _load_user(claims, session)
+
 
-    user = session.get(User, int(user_id))
+def require_admin(user: User = Depends(get_current_user)) -> User:
+    # rola z bazy, nie z tokenu: token zdegradowanego lub usuniętego admina
+    # przestaje działać od razu (token_version, patrz get_current_user)
+    if user.role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Brak uprawnień")
+    return user
 
-    if user is None:
-        raise credentials_exception
 
-    return user
\ No newline at end of file
+def require_admin_stream(user: User = Depends(get_stream_user)) -> User:
+    return require_admin(user)
@@ -0,0 +1,214 @@
+import csv
+import itertools
+import random
+from bisect import bisect
+from datetime import date, datetime, timedelta
+
+from decouple import config
+from sqlalchemy import func, insert, select
+from sqlmodel import Session
+from database.models import Ad, AdCategory, BusinessProfile, Categories, Reviews, User
+from database import ad_fields, facets, geo, ratings, search, similar
+import security
+
+# Syntetyczne dane do testów obciążeniowych (python manage.py seed). Rozkład jest
+# nierówny jak w prawdziwym serwisie: duże miasta mają najwięcej firm, kilka firm
+# wystawia większość ogłoszeń, kilka popularnych ogłoszeń zbiera większość opinii
+# (wagi Zipfa). Wiersze są generowane porcjami i zapisywane przez executemany z jawnymi
+# id, więc miliony ogłoszeń i opinii mieszczą się w pamięci; indeksy pomocnicze (FTS,
+# R*Tree, oceny, liczniki kategorii) są przeliczane raz na końcu, a nie dla każdego wiersza.
+
+SEED_CHUNK_SIZE = config("SEED_CHUNK_SIZE", cast=int, default=10000)
+SEED_PASSWORD = "seed"
+
+CATEGORY_SERVICES = {
+    "Ogród": ["Koszenie trawy", "Przycinanie żywopłotu", "Projekt ogrodu", "Wertykulacja trawnika"],
+    "Remonty": ["Malowanie mieszkania", "Układanie płytek", "Gładzie gipsowe", "Montaż drzwi"],
+    "Sprzątanie": ["Sprzątanie mieszkań", "Mycie okien", "Pranie dywanów", "Sprzątanie po remoncie"],
+    "Korepetycje": ["Korepetycje z matematyki", "Lekcje angielskiego", "Nauka gry na gitarze",
+                    "Przygotowanie do matury"],
+    "Transport": ["Przeprowadzki", "Transport mebli", "Wywóz gruzu", "Kurier lokalny"],
+    "Gastronomia": ["Catering na wesela", "Domowe obiady", "Torty na zamówienie", "Pieczywo na zakwasie"],
+    "Uroda": ["Strzyżenie damskie", "Manicure hybrydowy", "Makijaż okolicznościowy", "Masaż relaksacyjny"],
+    "Motoryzacja": ["Wymiana opon", "Mechanika pojazdowa", "Detailing samochodu", "Diagnostyka komputerowa"],
+    "IT": ["Naprawa laptopów", "Strony internetowe", "Konfiguracja sieci", "Odzyskiwanie danych"],
+    "Zwierzęta": ["Wyprowadzanie psów", "Hotel dla kotów", "Strzyżenie psów", "Szkolenie psów"],
+    "Zdrowie": ["Fizjoterapia", "Dietetyk", "Trening personalny", "Joga dla początkujących"],
+    "Produkty lokalne": ["Warzywa z gospodarstwa", "Miód od pszczelarza", "Jaja wiejskie", "Sery zagrodowe"],
+}
+FIRST_NAMES = ["Anna", "Piotr", "Katarzyna", "Tomasz", "Magdalena", "Paweł", "Agnieszka", "Michał", "Ewa", "Jan",
+               "Monika", "Krzysztof", "Joanna", "Marcin", "Aleksandra", "Kajetan"]
+LAST_NAMES = ["Nowak", "Kowalski", "Wiśniewski", "Wójcik", "Kowalczyk", "Kamiński", "Lewandowski", "Zieliński",
+              "Szymański", "Woźniak", "Dąbrowski", "Kozłowski", "Mazur", "Krawczyk"]
+STREETS = ["Długa", "Krótka", "Polna", "Leśna", "Słoneczna", "Kwiatowa", "Szkolna", "Ogrodowa", "Lipowa", "Mickiewicza"]
+PHRASES = ["Solidnie i terminowo.", "Wieloletnie doświadczenie.", "Dojazd do klienta w cenie.",
+           "Faktura VAT.", "Wolne terminy jeszcze w tym miesiącu.", "Własne narzędzia i materiały.",
+           "Zapraszam do kontaktu telefonicznego.", "Rabat dla stałych klientów.", "Pracujemy także w weekendy."]
+REVIEW_TITLES = {1: "Odradzam", 2: "Słabo", 3: "Może być", 4: "Dobra robota", 5: "Polecam!"}
+# rozkład ocen jak na większości portali - dużo piątek, mało jedynek
+STAR_WEIGHTS = [5, 5, 10, 30, 50]
+
+
+def _zipf_cumulative(count: int, exponent: float = 1.1) -> list[float]:
+    return list(itertools.accumulate(1 / (rank ** exponent) for rank in range(1, count + 1)))
+
+
+def _pick(rng: random.Random, cumulative: list[float]) -> int:
+    # indeks losowany z podanymi wagami skumulowanymi (random.choices bez narzutu listy)
+    return bisect(cumulative, rng.random() * cumulative[-1])
+
+
+def _cities() -> list[tuple[str, float, float]]:
+    # skorowidz wymienia miasta od największych, tak jak zakładają wagi Zipfa
+    with open(geo.GAZETTEER_PATH, newline="", encoding="utf-8") as f:
+        return [(row["key"].title(), float(row["lat"]), float(row["lon"]))
+                for row in csv.DictReader(f) if row["kind"] == "city"]
+
+
+def _next_id(session: Session, column) -> int:
+    return (session.execute(select(func.max(column))).scalar() or 0) + 1
+
+
+def _insert(session: Session, model, rows: list):
+    if rows:
+        session.execute(insert(model), rows)
+
+
+def _chunked(rows, size: int = SEED_CHUNK_SIZE):
+    iterator = iter(rows)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def _price(rng: random.Random) -> str:
+    amount = rng.choice([20, 35, 50, 80, 100, 120, 150, 200, 250, 300, 500, 800, 1200, 2500])
+    return rng.choice([f"{amount} zł", f"{amount} zł/h", f"od {amount} zł", f"{amount},00 PLN",
+                       f"{amount} zł za usługę", "do negocjacji"])
+
+
+def _seed_categories(session: Session, count: int) -> list[tuple[int, str]]:
+    existing = dict(session.execute(select(Categories.category_name, Categories.category_id)).tuples().all())
+    names = list(CATEGORY_SERVICES) + [f"Kategoria {i}" for i in range(len(CATEGORY_SERVICES) + 1, count + 1)]
+    missing = [name for name in names[:count] if name not in existing]
+    next_id = _next_id(session, Categories.category_id)
+    _insert(session, Categories, [{"category_id": next_id + i, "category_name": name}
+                                  for i, name in enumerate(missing)])
+    existing.update((name, next_id + i) for i, name in enumerate(missing))
+    return [(existing[name], name) for name in names[:count]]
+
+
+def _user_rows(rng: random.Random, first_id: int, count: int, hashed_password: str):
+    for user_id in range(first_id, first_id + count):
+        yield {"user_id": user_id, "first_name": rng.choice(FIRST_NAMES), "last_name": rng.choice(LAST_NAMES),
+               "email": f"user{user_id}@seed.example.com", "hashed_password": hashed_password,
+               "role": "business_owner"}
+
+
+def _business_rows(rng: random.Random, first_id: int, count: int, owners: list[int], cities: list, city_weights):
+    for i, bp_id in enumerate(range(first_id, first_id + count)):
+        city, lat, lon = cities[_pick(rng, city_weights)]
+        yield {"bp_id": bp_id, "user_id": owners[i % len(owners)],
+               "bp_name": f"{rng.choice(LAST_NAMES)} {rng.choice(['Usługi', 'Serwis', 'Studio', 'i Syn', 'Team'])}",
+               "description": " ".join(rng.sample(PHRASES, 2)),
+               "address": f"ul. {rng.choice(STREETS)} {rng.randint(1, 120)}, {city}",
+               "phone": f"{rng.randint(500, 899)} {rng.randint(100, 999)} {rng.randint(100, 999)}",
+               "lat": lat + rng.gauss(0, 0.03), "lon": lon + rng.gauss(0, 0.05)}
+
+
+def _ad_rows(rng: random.Random, first_id: int, count: int, businesses: list[tuple], business_weights,
+             categories: list, category_weights, today: date):
+    # (wiersz ogłoszenia, id kategorii ogłoszenia)
+    for ad_id in range(first_id, first_id + count):
+        bp_id, address, lat, lon = businesses[_pick(rng, business_weights)]
+        category_id, category_name = categories[_pick(rng, category_weights)]
+        services = CATEGORY_SERVICES.get(category_name) or [category_name]
+        price = _price(rng)
+        posted = today - timedelta(days=int(rng.expovariate(1 / 30)) % 365)
+        due = posted + timedelta(days=rng.choice([14, 30, 60, 90, 180, 365]))
+        status = rng.random() < 0.85
+        row = {
+            "ad_id": ad_id, "bp_id": bp_id, "ad_title": f"{rng.choice(services)} - {address.rsplit(', ', 1)[-1]}",
+            "description": " ".join(rng.sample(PHRASES, rng.randint(1, 4))), "images": [], "price": price,
+            "address": address, "post_date": posted.isoformat(), "due_date": due.isoformat(), "status": status,
+            "rejected_at": None if status or rng.random() < 0.6 else datetime.utcnow(),
+            "created_at": datetime.combine(posted, datetime.min.time()), "lat": lat, "lon": lon,
+        }
+        row.update(ad_fields.typed_values(price, row["post_date"], row["due_date"]))
+        extra = {categories[_pick(rng, category_weights)][0] for _ in range(rng.choice([0, 0, 1, 2]))}
+        yield row, {category_id} | extra
+
+
+def _review_rows(rng: random.Random, count: int, ad_ids: list[int], ad_weights):
+    for _ in range(count):
+        stars = rng.choices(range(1, 6), STAR_WEIGHTS)[0]
+        yield {"ad_id": ad_ids[_pick(rng, ad_weights)], "title": REVIEW_TITLES[stars],
+               "description": " ".join(rng.sample(PHRASES, 2)), "rating": float(stars)}
+
+
+def seed(session: Session, users: int, businesses: int, ads: int, reviews: int, categories: int = 12,
+         random_seed: int = 1, progress=None) -> dict:
+    # dopisuje do tego, co jest w bazie; te same argumenty na pustej bazie dają te same dane
+    if businesses and not users:
+        raise ValueError("businesses need at least one user")
+    if ads and not businesses:
+        raise ValueError("ads need at least one business")
+    rng = random.Random(random_seed)
+    progress = progress or (lambda message: None)
+    today = date.today()
+    # jeden hash argon2 dla wszystkich - hashowanie miliona haseł zajęłoby godziny
+    hashed_password = security.hash_password(SEED_PASSWORD)
+
+    category_list = _seed_categories(session, categories)
+    session.commit()
+
+    first_user = _next_id(session, User.user_id)
+    for chunk in _chunked(_user_rows(rng, first_user, users, hashed_password)):
+        _insert(session, User, chunk)
+        session.commit()
+    progress(f"users: {users}")
+
+    cities = _cities()
+    owners = list(range(first_user, first_user + users))
+    first_bp = _next_id(session, BusinessProfile.bp_id)
+    business_list = []
+    for chunk in _chunked(_business_rows(rng, first_bp, businesses, owners, cities, _zipf_cumulative(len(cities)))):
+        _insert(session, BusinessProfile, chunk)
+        session.commit()
+        business_list.extend((row["bp_id"], row["address"], row["lat"], row["lon"]) for row in chunk)
+    progress(f"businesses: {businesses}")
+
+    first_ad = _next_id(session, Ad.ad_id)
+    approved = []
+    ad_rows = _ad_rows(rng, first_ad, ads, business_list, _zipf_cumulative(len(business_list), 0.8),
+                       category_list, _zipf_cumulative(len(category_list), 0.7), today)
+    for number, chunk in enumerate(_chunked(ad_rows), 1):
+        _insert(session, Ad, [row for row, _ in chunk])
+        _insert(session, AdCategory, [{"ad_id": row["ad_id"], "category_id": category_id}
+                                      for row, category_ids in chunk for category_id in category_ids])
+        session.commit()
+        approved.extend(row["ad_id"] for row, _ in chunk if row["status"])
+        progress(f"ads: {min(number * SEED_CHUNK_SIZE, ads)}/{ads}")
+
+    if approved and reviews:
+        # popularne ogłoszenia są rozrzucone po całym zakresie id, a nie na początku
+        rng.shuffle(approved)
+        ad_weights = _zipf_cumulative(len(approved))
+        for number, chunk in enumerate(_chunked(_review_rows(rng, reviews, approved, ad_weights)), 1):
+            _insert(session, Reviews, chunk)
+            session.commit()
+            progress(f"reviews: {min(number * SEED_CHUNK_SIZE, reviews)}/{reviews}")
+
+    # indeksy pomocnicze i agregaty, raz dla wszystkiego, co wstawiono wyżej
+    expired = ad_fields.expire_ads(session, today)
+    engine = session.get_bind()
+    if search.fts_enabled:
+        search.rebuild_search_index(engine)
+    if geo.rtree_enabled:
+        geo.rebuild_geo_index(engine)
+    ratings.rebuild_ratings(session)
+    facets.rebuild_facets(session)
+    similar.rebuild_similar(session)
+    progress("indexes rebuilt")
+
+    return {"users": users, "businesses": businesses, "ads": ads, "approved": len(approved),
+            "expired": len(expired), "reviews": reviews if approved else 0, "categories": len(category_list)}
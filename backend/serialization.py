@@ -0,0 +1,45 @@
+import json
+from datetime import date, datetime
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # enkoder z biblioteki standardowej, ten sam wynik, tylko wolniej
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(value) -> bytes:
+    # zwykłe dict/list/datetime i modele pydantic, bez przechodzenia po każdej wartości jak jsonable_encoder
+    if orjson is not None:
+        return orjson.dumps(value, default=_default)
+    return json.dumps(value, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def encode_rows(rows, field_names: list, transform=None) -> bytes:
+    # Wiersze wyniku (nie obiekty ORM) prosto do JSON: jeden dict na wiersz i jedno wywołanie dumps()
+    items = (dict(zip(field_names, row)) for row in rows)
+    if transform is not None:
+        items = (transform(item) for item in items)
+    return dumps(list(items))
+
+
+class FastJSONResponse(JSONResponse):
+    # domyślna klasa odpowiedzi aplikacji (orjson, gdy jest zainstalowany)
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+class RawJSONResponse(JSONResponse):
+    # treść, która już jest zakodowanym JSON-em (listy stronicowane, odpowiedzi z cache)
+    def render(self, content) -> bytes:
+        return content
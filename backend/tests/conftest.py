@@ -0,0 +1,85 @@
+import itertools
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The app reads its configuration when it is imported: a scratch database and
+# image directory, no background jobs, no rate limiting.
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp.name, 'test.db')}"
+os.environ["IMAGE_STORAGE_DIR"] = os.path.join(_tmp.name, "media")
+os.environ["AD_EXPIRY_INTERVAL_SECONDS"] = "0"
+os.environ["SIMILAR_REBUILD_INTERVAL_SECONDS"] = "0"
+os.environ["CHANGES_PRUNE_INTERVAL_SECONDS"] = "0"
+os.environ["RATE_LIMIT_BACKEND"] = "none"
+# event streams end right after the catch-up instead of staying open
+os.environ["CHANGES_STREAM_MAX_SECONDS"] = "0"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+from sqlmodel import Session
+
+import main
+from database.models import User
+
+_ids = itertools.count(1)
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture
+def session():
+    with Session(main.engine) as session:
+        yield session
+
+
+def login(client, email: str, password: str = "haslo") -> dict:
+    response = client.post("/login", json={"email": email, "password": password})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def create_user(client, role: str = "business_owner") -> tuple[int, dict]:
+    # (user_id, auth headers); the role is set in the database, /register always gives business_owner
+    email = f"user{next(_ids)}@example.com"
+    response = client.post("/register", json={"email": email, "first_name": "Jan", "last_name": "Kowalski",
+                                               "password": "haslo"})
+    assert response.status_code == 200, response.text
+    user_id = response.json()["user_id"]
+    if role != "business_owner":
+        with Session(main.engine) as session:
+            session.execute(update(User).where(User.user_id == user_id).values(role=role))
+            session.commit()
+    return user_id, login(client, email)
+
+
+def create_business(client, headers: dict, user_id: int) -> int:
+    response = client.post("/businesses", json={"user_id": user_id, "bp_name": "Firma", "address": "Kraków",
+                                                "phone": "123"}, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()["bp_id"]
+
+
+def create_ad(client, headers: dict, bp_id: int, **fields) -> dict:
+    ad = {"bp_id": bp_id, "ad_title": "Koszenie trawy", "description": "Ogród", "price": "50 zł",
+          "post_date": "2026-01-01", "due_date": "2099-01-01", "address": "Kraków", **fields}
+    response = client.post("/ads", json=ad, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+@pytest.fixture
+def admin(client):
+    return create_user(client, role="admin")
+
+
+@pytest.fixture
+def owner(client):
+    return create_user(client)
@@ -0,0 +1,57 @@
+import pytest
+
+from conftest import create_ad, create_business, create_user
+
+
+@pytest.fixture
+def pending_ad(client, owner):
+    user_id, headers = owner
+    return create_ad(client, headers, create_business(client, headers, user_id))["ad_id"]
+
+
+def admin_requests(ad_id: int) -> list[tuple[str, str, dict]]:
+    return [
+        ("GET", "/export/users", {}),
+        ("POST", "/moderation/claim", {}),
+        ("POST", "/moderation/release", {"json": {"ad_ids": [ad_id]}}),
+        ("PATCH", "/ads/approve", {"json": {"ad_ids": [ad_id], "action": "reject"}}),
+        ("PATCH", f"/ads/{ad_id}/approve", {}),
+        ("GET", "/changes", {}),
+        ("POST", "/changes/ticket", {}),
+    ]
+
+
+def statuses(client, headers: dict, ad_id: int) -> list[int]:
+    return [client.request(method, url, headers=headers, **kwargs).status_code
+            for method, url, kwargs in admin_requests(ad_id)]
+
+
+def test_admin_routes_accept_an_admin(client, admin, pending_ad):
+    _, headers = admin
+    assert statuses(client, headers, pending_ad) == [200] * len(admin_requests(pending_ad))
+
+
+def test_admin_routes_reject_other_roles(client, owner, pending_ad):
+    _, headers = owner
+    assert statuses(client, headers, pending_ad) == [403] * len(admin_requests(pending_ad))
+
+
+def test_demoted_admin_token_is_rejected(client, admin, pending_ad):
+    user_id, headers = admin
+    ticket = client.post("/changes/ticket", headers=headers).json()["ticket"]
+    assert client.put(f"/users/{user_id}", json={"role": "user"}, headers=headers).status_code == 200
+    assert statuses(client, headers, pending_ad) == [401] * len(admin_requests(pending_ad))
+    assert client.get("/changes/stream", params={"ticket": ticket}).status_code == 401
+
+
+def test_deleted_admin_token_is_rejected(client, admin, pending_ad):
+    user_id, headers = admin
+    assert client.post("/moderation/claim", headers=headers).status_code == 200
+    assert client.delete(f"/users/{user_id}", headers=headers).status_code == 200
+    assert statuses(client, headers, pending_ad) == [401] * len(admin_requests(pending_ad))
+
+
+def test_stale_token_of_a_promoted_user_is_not_admin(client, owner):
+    user_id, headers = owner
+    assert client.put(f"/users/{user_id}", json={"role": "admin"}).status_code == 200
+    assert client.get("/changes", headers=headers).status_code == 401
@@ -0,0 +1,83 @@
+import json
+
+from conftest import create_business
+from test_facets import facet_counts
+
+
+def new_category(client) -> int:
+    return client.post("/categories", json={"category_name": "Import"}).json()["category_id"]
+
+
+def ad_item(bp_id: int, **fields) -> dict:
+    return {"bp_id": bp_id, "ad_title": "Malowanie płotu", "description": "Płot drewniany", "price": "80 zł",
+            "post_date": "2026-01-01", "due_date": "2099-01-01", "address": "Kraków", **fields}
+
+
+def links_of(client, ad_id: int) -> set:
+    return {link["category_id"] for link in client.get(f"/ad_categories/by_ad/{ad_id}").json()}
+
+
+def test_bulk_ads_get_their_links_and_counters(client, owner, admin):
+    user_id, headers = owner
+    bp_id = create_business(client, headers, user_id)
+    first, second = new_category(client), new_category(client)
+    response = client.post("/ads/bulk", json=[
+        ad_item(bp_id, category_ids=[first, second, first]),
+        ad_item(bp_id, category_ids=[second]),
+        ad_item(bp_id + 1000),
+        {"bp_id": bp_id},
+    ])
+    body = response.json()
+    assert (body["created"], body["failed"]) == (2, 2)
+    assert [result["status"] for result in body["results"]] == ["created", "created", "error", "error"]
+    ad_ids = [result["ad_id"] for result in body["results"][:2]]
+    assert links_of(client, ad_ids[0]) == {first, second}
+    assert links_of(client, ad_ids[1]) == {second}
+
+    # imported ads wait for moderation, the counters follow the approval
+    counts = facet_counts(client)
+    assert (counts[first], counts[second]) == (0, 0)
+    client.patch("/ads/approve", json={"ad_ids": ad_ids}, headers=admin[1])
+    counts = facet_counts(client)
+    assert (counts[first], counts[second]) == (1, 2)
+
+
+def test_bulk_links_update_counters_and_skip_duplicates(client, owner, admin):
+    user_id, headers = owner
+    bp_id = create_business(client, headers, user_id)
+    category_id = new_category(client)
+    ad_id = client.post("/ads/bulk", json=[ad_item(bp_id)]).json()["results"][0]["ad_id"]
+    client.patch("/ads/approve", json={"ad_ids": [ad_id]}, headers=admin[1])
+
+    lines = [{"ad_id": ad_id, "category_id": category_id}, {"ad_id": ad_id, "category_id": category_id},
+             {"ad_id": ad_id, "category_id": category_id + 1000}]
+    response = client.post("/ad_categories/bulk", content="\n".join(map(json.dumps, lines)),
+                           headers={"Content-Type": "application/x-ndjson"})
+    assert (response.headers["X-Bulk-Created"], response.headers["X-Bulk-Failed"]) == ("1", "2")
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert [result["status"] for result in results] == ["created", "error", "error"]
+    assert results[1]["errors"][0]["msg"] == "Powiązanie już istnieje"
+    assert links_of(client, ad_id) == {category_id}
+    assert facet_counts(client)[category_id] == 1
+
+
+def test_link_changes_invalidate_the_cached_ad(client, owner):
+    user_id, headers = owner
+    bp_id = create_business(client, headers, user_id)
+    category_id = new_category(client)
+    ad_id = client.post("/ads/bulk", json=[ad_item(bp_id)]).json()["results"][0]["ad_id"]
+
+    def cache_state(url: str) -> str:
+        return client.get(url).headers["X-Cache"]
+
+    writes = [
+        lambda: client.post("/ad_categories/bulk", json=[{"ad_id": ad_id, "category_id": category_id}]),
+        lambda: client.delete(f"/ad_categories/{ad_id}/{category_id}"),
+        lambda: client.post("/ad_categories", json={"ad_id": ad_id, "category_id": category_id}),
+    ]
+    for write in writes:
+        for url in (f"/ads/{ad_id}", f"/ads/{ad_id}/similar"):
+            cache_state(url)
+            assert cache_state(url) == "HIT"
+        assert write().status_code == 200
+        assert [cache_state(f"/ads/{ad_id}"), cache_state(f"/ads/{ad_id}/similar")] == ["MISS", "MISS"]
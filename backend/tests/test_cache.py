@@ -0,0 +1,43 @@
+from sqlalchemy import func
+from sqlmodel import select
+
+from conftest import create_ad, create_business
+from database.models import BusinessProfile
+
+
+def test_missing_business_is_not_cached(client, session, owner):
+    user_id, headers = owner
+    next_id = (session.exec(select(func.max(BusinessProfile.bp_id))).one() or 0) + 1
+    assert client.get(f"/businesses/{next_id}").json() is None
+
+    assert create_business(client, headers, user_id) == next_id
+    response = client.get(f"/businesses/{next_id}")
+    assert response.json()["bp_id"] == next_id
+
+
+def test_business_update_invalidates_cached_business(client, owner):
+    user_id, headers = owner
+    bp_id = create_business(client, headers, user_id)
+    client.get(f"/businesses/{bp_id}")
+    assert client.get(f"/businesses/{bp_id}").headers["X-Cache"] == "HIT"
+
+    business = {"bp_id": bp_id, "user_id": user_id, "bp_name": "Nowa nazwa", "address": "Kraków", "phone": "123"}
+    assert client.put(f"/businesses/{bp_id}", json=business, headers=headers).status_code == 200
+    response = client.get(f"/businesses/{bp_id}")
+    assert response.headers["X-Cache"] == "MISS"
+    assert response.json()["bp_name"] == "Nowa nazwa"
+
+
+def test_delete_ad(client, owner):
+    user_id, headers = owner
+    bp_id = create_business(client, headers, user_id)
+    ad_id = create_ad(client, headers, bp_id)["ad_id"]
+    # both responses cached before the delete
+    assert client.get(f"/ads/{ad_id}").status_code == 200
+    assert [ad["ad_id"] for ad in client.get(f"/businesses/{bp_id}/ads").json()] == [ad_id]
+
+    response = client.delete(f"/ads/{ad_id}", headers=headers)
+    assert response.status_code == 200, response.text
+    assert client.get(f"/ads/{ad_id}").status_code == 404
+    assert client.get(f"/businesses/{bp_id}/ads").json() == []
+    assert client.delete(f"/ads/{ad_id}", headers=headers).status_code == 404
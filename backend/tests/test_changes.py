@@ -0,0 +1,61 @@
+from sqlalchemy import create_mock_engine, event
+
+from database import changes
+import main
+import security
+
+
+def test_change_log_is_locked_on_postgresql():
+    # seq must follow commit order there, see changes._lock_log
+    executed = []
+    engine = create_mock_engine("postgresql://", lambda sql, *args, **kwargs: executed.append(str(sql)))
+    changes._lock_log(engine)
+    assert executed == ["SELECT pg_advisory_xact_lock(:key)"]
+
+
+def test_change_log_is_not_locked_on_sqlite(session):
+    # SQLite has a single writer already
+    statements = []
+
+    def collect(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(main.engine, "before_cursor_execute", collect)
+    try:
+        changes._lock_log(session)
+    finally:
+        event.remove(main.engine, "before_cursor_execute", collect)
+    assert statements == []
+
+
+def open_stream(client, headers: dict | None = None, **params):
+    return client.get("/changes/stream", params={"since": 0, **params}, headers=headers)
+
+
+def test_stream_opens_with_a_ticket(client, admin):
+    _, headers = admin
+    ticket = client.post("/changes/ticket", headers=headers).json()["ticket"]
+    response = open_stream(client, ticket=ticket)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert open_stream(client, headers=headers).status_code == 200
+
+
+def test_stream_does_not_take_access_tokens_in_the_url(client, admin):
+    _, headers = admin
+    token = headers["Authorization"][7:]
+    assert open_stream(client, ticket=token).status_code == 401
+    assert open_stream(client, token=token).status_code == 401
+
+
+def test_ticket_opens_nothing_else(client, admin):
+    _, headers = admin
+    ticket = client.post("/changes/ticket", headers=headers).json()["ticket"]
+    assert client.get("/changes", headers={"Authorization": f"Bearer {ticket}"}).status_code == 401
+
+
+def test_expired_ticket_is_rejected(client, admin, monkeypatch):
+    _, headers = admin
+    monkeypatch.setattr(security, "STREAM_TICKET_SECONDS", -1)
+    ticket = client.post("/changes/ticket", headers=headers).json()["ticket"]
+    assert open_stream(client, ticket=ticket).status_code == 401
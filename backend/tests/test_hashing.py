@@ -0,0 +1,49 @@
+import threading
+
+import pytest
+from fastapi import HTTPException
+from sqlmodel import select
+
+from database.models import User
+import security
+
+
+@pytest.fixture
+def hash_slots(monkeypatch):
+    def use(count: int) -> threading.BoundedSemaphore:
+        slots = threading.BoundedSemaphore(count)
+        monkeypatch.setattr(security, "_hash_slots", slots)
+        return slots
+    return use
+
+
+def test_saturated_pool_answers_503(client, session, hash_slots):
+    hash_slots(0)
+    response = client.post("/register", json={"email": "busy@example.com", "first_name": "Jan",
+                                               "last_name": "Kowalski", "password": "haslo"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(security.HASH_RETRY_AFTER)
+    assert session.exec(select(User).where(User.email == "busy@example.com")).first() is None
+
+
+def test_slots_are_given_back(hash_slots):
+    slots = hash_slots(1)
+    hashed = security.hash_password("haslo")
+    assert security.verify_password("haslo", hashed)
+    with pytest.raises(ValueError):
+        security.verify_password("haslo", "not a hash")
+    # the single slot is free again after a success and after a failure
+    assert slots.acquire(blocking=False)
+    slots.release()
+
+
+def test_waiting_requests_are_bounded(hash_slots):
+    # one slot held by a running hash: the next request is rejected instead of queued
+    slots = hash_slots(1)
+    assert slots.acquire(blocking=False)
+    try:
+        with pytest.raises(HTTPException) as rejected:
+            security.hash_password("haslo")
+        assert rejected.value.status_code == 503
+    finally:
+        slots.release()
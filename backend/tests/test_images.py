@@ -0,0 +1,71 @@
+import base64
+import io
+import os
+
+from PIL import Image
+
+from conftest import create_ad, create_business
+import images
+
+
+def png_bytes(color: str = "red") -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (4, 4), color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def data_uri(data: bytes, content_type: str = "image/png") -> str:
+    return f"data:{content_type};base64,{base64.b64encode(data).decode()}"
+
+
+def tmp_files() -> list:
+    tmp_dir = os.path.join(images.IMAGE_STORAGE_DIR, "tmp")
+    return os.listdir(tmp_dir) if os.path.isdir(tmp_dir) else []
+
+
+def test_upload_type_comes_from_the_file(client):
+    response = client.post("/images", files={"file": ("a.bin", png_bytes("blue"), "application/octet-stream")})
+    assert response.status_code == 200, response.text
+    image = client.get(f"/images/{response.json()['image_hash']}")
+    assert image.headers["content-type"] == "image/png"
+    assert image.headers["x-content-type-options"] == "nosniff"
+
+
+def test_upload_of_a_non_image_is_rejected(client):
+    response = client.post("/images", files={"file": ("a.png", b"<script>alert(1)</script>", "image/png")})
+    assert response.status_code == 415
+    assert tmp_files() == []
+
+
+def test_data_uri_is_checked_like_an_upload(client, owner, monkeypatch):
+    user_id, headers = owner
+    bp_id = create_business(client, headers, user_id)
+    ad = {"bp_id": bp_id, "ad_title": "Koszenie", "description": "Ogród", "price": "50 zł",
+          "post_date": "2026-01-01", "due_date": "2099-01-01", "address": "Kraków"}
+    html = data_uri(b"<html><script>alert(1)</script></html>")
+    assert client.post("/ads", json={**ad, "images": [html]}, headers=headers).status_code == 415
+
+    monkeypatch.setattr(images, "IMAGE_MAX_BYTES", 16)
+    assert client.post("/ads", json={**ad, "images": [data_uri(png_bytes())]}, headers=headers).status_code == 413
+    monkeypatch.undo()
+
+    created = create_ad(client, headers, bp_id, images=[data_uri(png_bytes("green"), "image/gif")])
+    image = client.get(created["images"][0])
+    assert image.status_code == 200
+    assert image.headers["content-type"] == "image/png"
+    assert tmp_files() == []
+
+
+def test_files_are_written_only_when_the_session_commits(session):
+    data = png_bytes("yellow")
+    stored = images.save_bytes(session, data)
+    path = images.original_path(stored.image_hash)
+    assert not os.path.exists(path)
+    session.rollback()
+    assert not os.path.exists(path)
+    assert tmp_files() == []
+
+    stored = images.save_bytes(session, data)
+    session.commit()
+    assert os.path.exists(path)
+    assert tmp_files() == []
@@ -0,0 +1,36 @@
+import base64
+import json
+import os
+import shutil
+import sqlite3
+
+from sqlalchemy import create_engine
+from sqlmodel import SQLModel
+
+from database.migrations import run_migrations
+from test_images import png_bytes
+import images
+
+BASELINE_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database.db")
+
+
+def test_baseline_database_with_inline_images_migrates(tmp_path):
+    # database.db in the repository has the schema from before the migrations
+    path = tmp_path / "baseline.db"
+    shutil.copy(BASELINE_DB, path)
+    inline = "data:image/png;base64," + base64.b64encode(png_bytes("purple")).decode()
+    with sqlite3.connect(path) as conn:
+        ad_id = conn.execute("SELECT min(ad_id) FROM ad").fetchone()[0]
+        conn.execute("UPDATE ad SET images = ? WHERE ad_id = ?", (json.dumps([inline]), ad_id))
+
+    engine = create_engine(f"sqlite:///{path}")
+    try:
+        SQLModel.metadata.create_all(engine)
+        assert "0003_ad_images_out_of_row" in run_migrations(engine)
+    finally:
+        engine.dispose()
+
+    with sqlite3.connect(path) as conn:
+        [url] = json.loads(conn.execute("SELECT images FROM ad WHERE ad_id = ?", (ad_id,)).fetchone()[0])
+    assert url.startswith(images.IMAGE_BASE_URL + "/images/")
+    assert os.path.exists(images.original_path(url.rsplit("/", 1)[1]))
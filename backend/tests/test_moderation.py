@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from conftest import create_ad, create_business, create_user
+from database.models import Ad
+import moderation
+
+
+@pytest.fixture
+def queue(client, session, owner):
+    # three fresh pending ads; whatever other tests left in the queue is leased away first
+    session.execute(moderation.pending(update(Ad)).values(
+        claimed_by=0, claim_expires_at=datetime.utcnow() + timedelta(days=1)))
+    session.commit()
+    user_id, headers = owner
+    bp_id = create_business(client, headers, user_id)
+    return [create_ad(client, headers, bp_id)["ad_id"] for _ in range(3)]
+
+
+def claim(client, headers: dict, limit: int = 100) -> list[int]:
+    response = client.post("/moderation/claim", params={"limit": limit}, headers=headers)
+    assert response.status_code == 200, response.text
+    return [ad["ad_id"] for ad in response.json()]
+
+
+def test_claimed_ads_are_not_handed_to_another_moderator(client, queue):
+    _, first = create_user(client, role="admin")
+    _, second = create_user(client, role="admin")
+    assert claim(client, first, limit=2) == queue[:2]
+    assert claim(client, second) == queue[2:]
+    assert claim(client, second) == queue[2:]
+    # claiming again renews the own lease and adds nothing new
+    assert claim(client, first, limit=2) == queue[:2]
+
+
+def test_batch_decision_skips_ads_leased_to_someone_else(client, queue):
+    _, first = create_user(client, role="admin")
+    _, second = create_user(client, role="admin")
+    claim(client, first, limit=2)
+
+    response = client.patch("/ads/approve", json={"ad_ids": queue}, headers=second)
+    assert response.json() == {"updated": [queue[2]], "skipped": queue[:2]}
+    response = client.patch("/ads/approve", json={"ad_ids": queue, "action": "reject"}, headers=first)
+    # the third one is decided already
+    assert response.json() == {"updated": queue[:2], "skipped": [queue[2]]}
+    assert [client.get(f"/ads/{ad_id}").json()["status"] for ad_id in queue] == [False, False, True]
+
+
+def test_expired_or_released_leases_return_to_the_queue(client, session, queue):
+    _, first = create_user(client, role="admin")
+    _, second = create_user(client, role="admin")
+    assert claim(client, first) == queue
+
+    session.execute(update(Ad).where(Ad.ad_id == queue[0]).values(claim_expires_at=datetime.utcnow()))
+    session.commit()
+    assert client.post("/moderation/release", json={"ad_ids": [queue[1]]}, headers=first).json() == {
+        "released": [queue[1]]}
+    assert claim(client, second) == queue[:2]
+    # a lease taken over is no longer the first moderator's to decide
+    response = client.patch("/ads/approve", json={"ad_ids": queue}, headers=first)
+    assert response.json() == {"updated": [queue[2]], "skipped": queue[:2]}
@@ -0,0 +1,68 @@
+import pytest
+
+from conftest import create_ad, create_business, create_user
+from pagination import NEXT_CURSOR_HEADER
+import main
+
+SORT_KEYS = [*main.AD_SORT_OPTIONS, "ad_id"]
+
+
+def walk(client, url: str, sort: str, limit: int = 2) -> list[dict]:
+    items, cursor = [], None
+    for _ in range(50):
+        params = {"sort": sort, "limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get(url, params=params)
+        assert response.status_code == 200, response.text
+        items += response.json()
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if not cursor:
+            return items
+    pytest.fail(f"{url}?sort={sort} did not reach the last page")
+
+
+@pytest.fixture(scope="module")
+def business_ads(client):
+    user_id, headers = create_user(client)
+    bp_id = create_business(client, headers, user_id)
+    ads = [
+        create_ad(client, headers, bp_id, price=price, due_date=due_date)
+        for price, due_date in [("50 zł", "2099-03-01"), ("20 zł", "2099-01-01"), ("50 zł", "2099-02-01"),
+                                ("120 zł/h", "2099-01-01"), ("5 zł", "2099-05-01"),
+                                # no parsable price / due date - NULL price_amount / due_on
+                                ("do uzgodnienia", "2099-04-01"), ("30 zł", ""), ("cena do uzgodnienia", "")]
+    ]
+    return user_id, bp_id, ads
+
+
+@pytest.mark.parametrize("descending", [False, True])
+@pytest.mark.parametrize("sort", SORT_KEYS)
+def test_cursor_walk_returns_every_ad_once(client, business_ads, sort, descending):
+    user_id, bp_id, ads = business_ads
+    field = main.AD_SORT_OPTIONS[sort].key if sort in main.AD_SORT_OPTIONS else sort
+    # rows without a value come last in both directions
+    present = sorted((ad for ad in ads if ad[field] is not None), key=lambda ad: (ad[field], ad["ad_id"]),
+                     reverse=descending)
+    missing = sorted((ad["ad_id"] for ad in ads if ad[field] is None), reverse=descending)
+    expected = [ad["ad_id"] for ad in present] + missing
+
+    sort = f"-{sort}" if descending else sort
+    for url in (f"/businesses/{bp_id}/ads", f"/ads/user/{user_id}"):
+        assert [item["ad_id"] for item in walk(client, url, sort)] == expected
+
+
+def test_cursor_of_another_sort_is_rejected(client, business_ads):
+    _, bp_id, _ = business_ads
+    cursor = client.get(f"/businesses/{bp_id}/ads", params={"sort": "due_date", "limit": 1}).headers[NEXT_CURSOR_HEADER]
+    response = client.get(f"/businesses/{bp_id}/ads", params={"sort": "price", "limit": 1, "cursor": cursor})
+    assert response.status_code == 400
+
+
+def test_feed_hides_ads_past_due(client, owner, admin):
+    user_id, headers = owner
+    bp_id = create_business(client, headers, user_id)
+    ad_ids = [create_ad(client, headers, bp_id, due_date=due_date)["ad_id"] for due_date in ("2099-01-01", "2020-01-01")]
+    client.patch("/ads/approve", json={"ad_ids": ad_ids}, headers=admin[1])
+    feed = {item["ad_id"] for item in walk(client, "/feed", "ad_id", limit=100)}
+    assert ad_ids[0] in feed and ad_ids[1] not in feed
@@ -0,0 +1,23 @@
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from database.query_plans import HOT_QUERIES, check_query_plans
+import main
+
+
+def test_hot_queries_use_indexes(client):
+    assert [name for name, _, uses_index in check_query_plans(main.engine) if not uses_index] == []
+
+
+def test_checked_feed_query_is_the_one_the_endpoint_runs(client):
+    statements = []
+
+    def collect(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(Engine, "before_cursor_execute", collect)
+    try:
+        assert client.get("/feed").status_code == 200
+    finally:
+        event.remove(Engine, "before_cursor_execute", collect)
+    assert str(HOT_QUERIES["GET /feed"].compile(main.engine)) in statements
@@ -0,0 +1,97 @@
+import asyncio
+
+import httpx
+import pytest
+
+import ratelimit
+
+
+def take(buckets, now: float, cost: float = 1, key: str = "ip:1.2.3.4") -> float:
+    return asyncio.run(buckets.take(key, cost, rate=1, burst=3, now=now))
+
+
+def test_gcra_allows_the_burst_then_refills_at_the_rate():
+    buckets = ratelimit.MemoryBuckets()
+    assert [take(buckets, 0) for _ in range(3)] == [0, 0, 0]
+    assert take(buckets, 0) == pytest.approx(1)
+    assert take(buckets, 0.5) == pytest.approx(0.5)
+    assert take(buckets, 1) == 0
+    # a rejected request takes nothing, another key has its own bucket
+    assert take(buckets, 1) == pytest.approx(1)
+    assert take(buckets, 1, key="ip:5.6.7.8") == 0
+
+
+def test_expensive_routes_take_more_tokens():
+    buckets = ratelimit.MemoryBuckets()
+    assert take(buckets, 0, cost=3) == 0
+    assert take(buckets, 0, cost=2) == pytest.approx(2)
+
+
+def test_redis_failure_lets_requests_through():
+    class Broken:
+        async def eval(self, *args):
+            raise ConnectionError("redis is down")
+
+    assert take(ratelimit.RedisBuckets(Broken()), 0) == 0
+
+
+@pytest.fixture
+def limited(monkeypatch):
+    monkeypatch.setattr(ratelimit, "buckets", ratelimit.MemoryBuckets())
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_IP_RATE", 0.01)
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_IP_BURST", 3)
+
+
+def test_empty_bucket_answers_429_with_retry_after(client, limited):
+    assert [client.get("/categories").status_code for _ in range(3)] == [200] * 3
+    response = client.get("/categories")
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "100"
+    # monitoring is never limited
+    assert client.get("/metrics").status_code == 200
+
+
+def test_signed_in_clients_have_their_own_bucket(client, owner, monkeypatch):
+    _, headers = owner
+    monkeypatch.setattr(ratelimit, "buckets", ratelimit.MemoryBuckets())
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_IP_RATE", 0.01)
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_IP_BURST", 1)
+    assert client.get("/categories").status_code == 200
+    assert client.get("/categories").status_code == 429
+    assert client.get("/categories", headers=headers).status_code == 200
+
+
+def run_concurrently(count: int) -> list[httpx.Response]:
+    # `count` requests at once against an app that waits until all of them have arrived
+    async def scenario():
+        release = asyncio.Event()
+
+        async def app(scope, receive, send):
+            await release.wait()
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"ok"})
+
+        transport = httpx.ASGITransport(app=ratelimit.RateLimitMiddleware(app))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            tasks = [asyncio.create_task(client.get("/feed")) for _ in range(count)]
+            await asyncio.sleep(0.1)
+            release.set()
+            return await asyncio.gather(*tasks)
+
+    return asyncio.run(scenario())
+
+
+def test_requests_over_the_queue_are_shed(monkeypatch):
+    monkeypatch.setattr(ratelimit, "buckets", None)
+    monkeypatch.setattr(ratelimit, "admission", ratelimit.Admission(max_concurrent=1, max_queue=1, timeout=5))
+    responses = run_concurrently(3)
+    assert sorted(response.status_code for response in responses) == [200, 200, 503]
+    shed = next(response for response in responses if response.status_code == 503)
+    assert shed.headers["Retry-After"] == str(ratelimit.ADMISSION_RETRY_AFTER)
+
+
+def test_queued_requests_time_out(monkeypatch):
+    monkeypatch.setattr(ratelimit, "buckets", None)
+    monkeypatch.setattr(ratelimit, "admission", ratelimit.Admission(max_concurrent=1, max_queue=5, timeout=0.01))
+    responses = run_concurrently(2)
+    assert sorted(response.status_code for response in responses) == [200, 503]
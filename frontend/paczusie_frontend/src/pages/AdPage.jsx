@@ -4,6 +4,7 @@ import FloatingLogger from '../components/FloatingLogger';
 import Navbar from '../components/Navbar';
 import api from '../services/api';
 import ReviewCard from '../components/ReviewCard';
+import AdCard from '../components/AdCard';
 import { MessageSquare, Star, Plus, Send, X, ChevronLeft, ChevronRight } from 'lucide-react';
 
 const getReviewDeclension = (count) => {
@@ -24,6 +25,7 @@ const AdPage = () => {
     const [reviewLoading, setReviewLoading] = useState(false);
     const [alert, setAlert] = useState({ type: '', message: '' });
     const [currentImageIndex, setCurrentImageIndex] = useState(0);
+    const [similarAds, setSimilarAds] = useState([]);
     const navigate = useNavigate();
 
     useEffect(() => {
@@ -40,6 +42,20 @@ const AdPage = () => {
         fetchAd();
     }, [id]);
 
+    useEffect(() => {
+        const fetchSimilarAds = async () => {
+            try {
+                // podobne ogłoszenia (tytuł, opis, kategorie) - tylko zatwierdzone
+                const response = await api.get(`/ads/${id}/similar`, { params: { limit: 6 } });
+                setSimilarAds(response.data);
+            } catch (error) {
+                console.error('Błąd pobierania podobnych ogłoszeń: ', error);
+                setSimilarAds([]);
+            }
+        };
+        fetchSimilarAds();
+    }, [id]);
+
     useEffect(() => {
         const bpId = ad?.bp_id;
 
@@ -604,6 +620,27 @@ const AdPage = () => {
                         )}
                     </div>
                 </div>
+
+                {/* Podobne ogłoszenia */}
+                {similarAds.length > 0 && (
+                    <div className="mt-8">
+                        <h2 className="text-2xl font-bold text-slate-900 mb-6">Podobne ogłoszenia</h2>
+                        <div className="grid grid-cols-1 sm:grid-cols-2 lg:grid-cols-3 gap-6">
+                            {similarAds.map((similarAd) => (
+                                <AdCard
+                                    key={similarAd.ad_id}
+                                    id={similarAd.ad_id}
+                                    title={similarAd.ad_title}
+                                    description={similarAd.description}
+                                    price={similarAd.price}
+                                    address={similarAd.address}
+                                    images={similarAd.images}
+                                    categories={similarAd.categories.map(category => category.category_name)}
+                                />
+                            ))}
+                        </div>
+                    </div>
+                )}
             </div>
 
             <FloatingLogger />
@@ -1,8 +1,21 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { userService } from '../services/userService';
 import { adService } from '../services/adService';
+import { changeService } from '../services/changeService';
 import Navbar from '../components/Navbar';
 
+// zdarzenie z dziennika zmian na liście: usunięcie, podmiana albo nowy wiersz na początku
+const applyChange = (items, key, change) => {
+    if (change.action === 'delete') {
+        return items.filter(item => item[key] !== change.entity_id);
+    }
+    if (items.some(item => item[key] === change.entity_id)) {
+        // scalone z dotychczasowym wierszem - lista ma też pola spoza zdarzenia (np. miniatury)
+        return items.map(item => item[key] === change.entity_id ? { ...item, ...change.data } : item);
+    }
+    return [change.data, ...items];
+};
+
 const AdminPage = () => {
     const [users, setUsers] = useState([]);
     const [ads, setAds] = useState([]);
@@ -11,9 +24,11 @@ const AdminPage = () => {
     const [searchTerm, setSearchTerm] = useState('');
     const [statusFilter, setStatusFilter] = useState('all');
     const [alert, setAlert] = useState({ type: '', message: '' });
+    const unsubscribe = useRef(null);
 
     useEffect(() => {
         loadData();
+        return () => unsubscribe.current && unsubscribe.current();
     }, []);
 
     const showAlert = (type, message) => {
@@ -21,15 +36,31 @@ const AdminPage = () => {
         setTimeout(() => setAlert({ type: '', message: '' }), 5000);
     };
 
+    const handleChange = (change) => {
+        if (change.entity === 'user') {
+            setUsers(prev => applyChange(prev, 'user_id', change));
+        } else if (change.entity === 'ad') {
+            setAds(prev => applyChange(prev, 'ad_id', change));
+        }
+    };
+
+    // listy pobierane raz, potem aktualizowane zdarzeniami z /changes/stream
     const loadData = async () => {
         setLoading(true);
+        if (unsubscribe.current) {
+            unsubscribe.current();
+            unsubscribe.current = null;
+        }
         try {
+            // pozycja przed listami - zmiany z czasu ich pobierania przyjdą w strumieniu
+            const since = await changeService.getPosition();
             const [userData, adData] = await Promise.all([
                 userService.getAll(),
                 adService.getAll()
             ]);
             setUsers(userData);
             setAds(adData);
+            unsubscribe.current = changeService.subscribe(since, handleChange, loadData);
         } catch (error) {
             console.error('Błąd pobierania danych: ', error);
             showAlert('error', 'Nie udało się załadować danych');
@@ -38,20 +69,9 @@ const AdminPage = () => {
         }
     };
 
-    const loadAds = async () => {
-        try {
-            const adData = await adService.getAll();
-            setAds(adData);
-        } catch (error) {
-            console.error('Błąd pobierania ogłoszeń: ', error);
-            showAlert('error', 'Nie udało się załadować ogłoszeń');
-        }
-    };
-
     const handleDeleteUser = async (userId) => {
         try {
             await userService.delete(userId);
-            loadData();
             showAlert('success', 'Użytkownik został usunięty');
         } catch (error) {
             console.error('Błąd usuwania użytkownika: ', error);
@@ -64,7 +84,6 @@ const AdminPage = () => {
             const user = users.find(u => u.user_id === userId);
             if (user) {
                 await userService.update(userId, { role: newRole });
-                loadData();
                 showAlert('success', `Rola użytkownika zmieniona na ${getRoleName(newRole)}`);
             }
         } catch (error) {
@@ -76,7 +95,6 @@ const AdminPage = () => {
     const handleApproveAd = async (adId) => {
         try {
             await adService.approveAd(adId);
-            loadAds();
             showAlert('success', 'Ogłoszenie zostało zatwierdzone');
         } catch (error) {
             console.error('Błąd zatwierdzania ogłoszenia: ', error);
@@ -87,7 +105,6 @@ const AdminPage = () => {
     const handleDeleteAd = async (adId) => {
         try {
             await adService.delete(adId);
-            loadAds();
             showAlert('success', 'Ogłoszenie zostało usunięte');
         } catch (error) {
             console.error('Błąd usuwania ogłoszenia: ', error);
@@ -2,13 +2,13 @@ import React, { useState, useEffect } from 'react';
 import Navbar from '../components/Navbar';
 import AdCard from '../components/AdCard';
 import FloatingLogger from '../components/FloatingLogger';
-import api from '../services/api';
 import { adService } from '../services/adService';
 import { categoryService } from '../services/categoryService';
 
 const HomePage = () => {
   const [ads, setAds] = useState([]);
   const [categories, setCategories] = useState([]);
+  const [categoryCounts, setCategoryCounts] = useState({});
   const [loading, setLoading] = useState(true);
   const [searchTerm, setSearchTerm] = useState("");
   const [selectedCategory, setSelectedCategory] = useState("");
@@ -17,6 +17,13 @@ const HomePage = () => {
     categoryService.getAll().then(data => { setCategories(data); });
   }, []);
 
+  useEffect(() => {
+    const params = searchTerm ? { search: searchTerm } : {};
+    categoryService.getFacets(params).then(data => {
+      setCategoryCounts(Object.fromEntries(data.map(facet => [facet.category_id, facet.ad_count])));
+    });
+  }, [searchTerm]);
+
   useEffect(() => {
     const fetchAds = async () => {
       setLoading(true);
@@ -29,22 +36,12 @@ const HomePage = () => {
           params.category_id = selectedCategory;
         }
 
-        const [adsData, categoriesData, linksData] = await Promise.all([
-          adService.getAll(params),
-          categoryService.getAll(),
-          api.get('/ad_categories').then(res => res.data)
-        ]);
-
-        // tylko wyświetlamy zatwierdzone ogłoszenia
-        const approvedAds = adsData.filter(ad => ad.status === true);
-
-        const mergedAds = approvedAds.map(ad => {
-          const relatedCategoryIds = linksData
-            .filter(link => link.ad_id === ad.ad_id)
-            .map(link => link.category_id);
+        // /feed zwraca tylko zatwierdzone ogłoszenia razem z id kategorii
+        const feedData = await adService.getFeed(params);
 
-          const adCategoryNames = categoriesData
-            .filter(cat => relatedCategoryIds.includes(cat.category_id))
+        const mergedAds = feedData.map(ad => {
+          const adCategoryNames = categories
+            .filter(cat => ad.category_ids.includes(cat.category_id))
             .map(cat => cat.category_name);
 
           return {
@@ -67,7 +64,7 @@ const HomePage = () => {
     };
 
     fetchAds();
-  }, [searchTerm, selectedCategory]);
+  }, [searchTerm, selectedCategory, categories]);
 
   return (
     <div className="bg-gradient-to-b from-[#FDF6E3] to-gray-50 min-h-screen pb-32">
@@ -113,7 +110,7 @@ const HomePage = () => {
                   <option value="">Wszystkie kategorie</option>
                   {categories.map((category) => (
                     <option key={category.category_id} value={category.category_id}>
-                      {category.category_name}
+                      {category.category_name} ({categoryCounts[category.category_id] ?? 0})
                     </option>
                   ))}
                 </select>
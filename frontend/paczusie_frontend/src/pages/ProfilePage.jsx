@@ -4,6 +4,7 @@ import { useAuth } from '../context/AuthContext';
 import { companyService } from '../services/companyService';
 import { adService } from '../services/adService';
 import { categoryService } from '../services/categoryService';
+import { userService } from '../services/userService';
 
 const getAdsDeclension = (count) => {
     const lastDigit = count % 10;
@@ -20,6 +21,13 @@ const getFirmDeclension = (count) => {
     return 'firm'
 }
 
+const AD_STATES = {
+    active: { label: '✅ Aktywne', className: 'bg-green-100 text-green-700' },
+    pending: { label: '⏳ Oczekuje na zatwierdzenie', className: 'bg-yellow-100 text-yellow-700' },
+    rejected: { label: '❌ Odrzucone', className: 'bg-red-100 text-red-700' },
+    expired: { label: '⌛ Wygasło', className: 'bg-gray-100 text-gray-600' },
+};
+
 const ProfilePage = () => {
     const { user } = useAuth();
     const [businesses, setBusinesses] = useState([]);
@@ -65,14 +73,15 @@ const ProfilePage = () => {
         setLoading(true);
         setError('');
         try {
-            const [businessesData, categoriesData, adsData] = await Promise.all([
-                companyService.getByUserId(user?.id),
-                categoryService.getAll(),
-                adService.getByUserId(user?.id)
+            // kategorie są potrzebne tylko do formularza ogłoszenia
+            const [dashboard, categoriesData] = await Promise.all([
+                userService.getDashboard(user?.id, { ads_per_business: 100 }),
+                categoryService.getAll()
             ]);
-            setBusinesses(businessesData || []);
+            const businessesData = dashboard?.businesses || [];
+            setBusinesses(businessesData);
             setCategories(categoriesData || []);
-            setAds(adsData || []);
+            setAds(businessesData.flatMap(business => business.ads));
         } catch (error) {
             console.error('Błąd pobierania danych: ', error);
             setError('Nie udało się załadować danych. Spróbuj ponownie.');
@@ -665,8 +674,8 @@ const ProfilePage = () => {
                                             <div>
                                                 <h3 className="text-xl font-bold text-slate-900">{ad.ad_title}</h3>
                                                 <div className="flex items-center mt-2">
-                                                    <span className={`text-xs font-bold px-3 py-1 rounded-full ${ad.status ? 'bg-green-100 text-green-700' : 'bg-yellow-100 text-yellow-700'}`}>
-                                                        {ad.status ? '✅ Aktywne' : '⏳ Oczekuje na zatwierdzenie'}
+                                                    <span className={`text-xs font-bold px-3 py-1 rounded-full ${AD_STATES[ad.state]?.className}`}>
+                                                        {AD_STATES[ad.state]?.label}
                                                     </span>
                                                 </div>
                                             </div>
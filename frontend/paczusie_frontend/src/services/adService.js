@@ -1,9 +1,12 @@
-import api from './api';
+import api, { getAllPages } from './api';
 
 export const adService = {
     async getAll(params = {}) {
-        const response = await api.get('/ads', { params });
-        return response.data;
+        return getAllPages('/ads', params);
+    },
+
+    async getFeed(params = {}) {
+        return getAllPages('/feed', params);
     },
 
     async getById(adId) {
@@ -27,8 +30,7 @@ export const adService = {
     },
 
     async getPendingAds() {
-        const response = await api.get('/ads/pending');
-        return response.data;
+        return getAllPages('/ads/pending');
     },
 
     async approveAd(adId) {
@@ -37,13 +39,11 @@ export const adService = {
     },
 
     async getAdsByStatus(status) {
-        const response = await api.get(`/ads/status/${status}`);
-        return response.data;
+        return getAllPages(`/ads/status/${status}`);
     },
 
     async getByUserId(userId) {
-    const response = await api.get(`/ads/user/${userId}`);
-    return response.data;
+    return getAllPages(`/ads/user/${userId}`);
 }
 };
 
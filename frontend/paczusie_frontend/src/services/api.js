@@ -25,4 +25,17 @@ api.interceptors.request.use(
     }
 );
 
+// listy z backendu są stronicowane - kolejną stronę wskazuje nagłówek X-Next-Cursor,
+// na ostatniej stronie go nie ma; pobieramy wszystkie strony i zwracamy jedną listę
+export const getAllPages = async (url, params = {}) => {
+    const items = [];
+    let cursor;
+    do {
+        const response = await api.get(url, { params: { ...params, cursor } });
+        items.push(...response.data);
+        cursor = response.headers["x-next-cursor"];
+    } while (cursor);
+    return items;
+};
+
 export default api;
\ No newline at end of file
@@ -1,8 +1,13 @@
-import api from './api';
+import api, { getAllPages } from './api';
 
 export const categoryService = {
     async getAll() {
-        const response = await api.get('/categories');
+        return getAllPages('/categories');
+    },
+
+    // liczba zatwierdzonych ogłoszeń w każdej kategorii, opcjonalnie tylko pasujących do search
+    async getFacets(params = {}) {
+        const response = await api.get('/categories/facets', { params });
         return response.data;
     },
 
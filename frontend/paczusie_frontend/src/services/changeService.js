@@ -0,0 +1,67 @@
+import api, { API_URL } from './api';
+
+// dziennik zmian (ogłoszenia, użytkownicy, opinie) - tylko dla admina
+export const changeService = {
+    // bieżąca pozycja w dzienniku - pobrać przed wczytaniem list
+    async getPosition() {
+        const response = await api.get('/changes');
+        return response.data.last_seq;
+    },
+
+    async getSince(since, params = {}) {
+        const response = await api.get('/changes', { params: { since, ...params } });
+        return response.data;
+    },
+
+    // krótko ważny bilet do /changes/stream (EventSource nie wysyła nagłówka
+    // Authorization, a token dostępu w adresie trafiłby do logów serwera)
+    async getTicket() {
+        const response = await api.post('/changes/ticket');
+        return response.data.ticket;
+    },
+
+    // zmiany na żywo od pozycji `since`. Bilet jest ważny tylko przy otwieraniu
+    // połączenia - gdy EventSource nie może się już z nim połączyć, otwieramy nowe
+    // z nowym biletem od ostatniego odebranego zdarzenia. onReset - historia
+    // niepełna, trzeba pobrać listy od nowa. Zwraca funkcję zamykającą połączenie.
+    subscribe(since, onChange, onReset) {
+        let source = null;
+        let closed = false;
+        let lastSeq = since;
+
+        const open = async () => {
+            let ticket;
+            try {
+                ticket = await changeService.getTicket();
+            } catch (error) {
+                console.error('Błąd pobierania biletu do dziennika zmian: ', error);
+                return;
+            }
+            if (closed) return;
+            const params = new URLSearchParams({ since: lastSeq, ticket });
+            source = new EventSource(`${API_URL}/changes/stream?${params}`);
+            source.onmessage = (event) => {
+                lastSeq = Number(event.lastEventId);
+                onChange(JSON.parse(event.data));
+            };
+            source.addEventListener('reset', () => {
+                source.close();
+                onReset();
+            });
+            source.onerror = () => {
+                // CONNECTING - EventSource sam ponawia; CLOSED - bilet wygasł albo serwer odmówił
+                if (source.readyState === EventSource.CLOSED && !closed) {
+                    setTimeout(open, 3000);
+                }
+            };
+        };
+
+        open();
+        return () => {
+            closed = true;
+            if (source) source.close();
+        };
+    },
+};
+
+export default changeService;
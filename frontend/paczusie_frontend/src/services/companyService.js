@@ -1,4 +1,4 @@
-import api from './api';
+import api, { getAllPages } from './api';
 
 export const companyService = {
     async getById(businessId) {
@@ -22,8 +22,7 @@ export const companyService = {
     },
 
     async getByUserId(userId) {
-    const response = await api.get(`/businesses/user/${userId}`);
-    return response.data;
+    return getAllPages(`/businesses/user/${userId}`);
 }
 };
 
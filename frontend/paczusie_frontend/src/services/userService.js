@@ -1,8 +1,13 @@
-import api from './api';
+import api, { getAllPages } from './api';
 
 export const userService = {
     async getAll() {
-        const response = await api.get('/users');
+        return getAllPages('/users');
+    },
+
+    // firmy użytkownika z ogłoszeniami (kategorie, stan, oceny) w jednym zapytaniu
+    async getDashboard(userId, params = {}) {
+        const response = await api.get(`/users/${userId}/dashboard`, { params });
         return response.data;
     },
 